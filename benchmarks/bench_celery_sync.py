@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""
+CeleryExecutor.sync 状态查询测试
+
+使用本地的键值存储模拟 celery result backend，每次请求增加固定的网络往返延迟，
+比较以下方式获取所有任务状态的耗时：
+- per_task: 逐个访问 AsyncResult.state，优化前的行为
+- threads: backend 不支持批量请求时，使用线程池并发获取
+- mget: 使用 backend.mget 批量获取
+
+python benchmarks/bench_celery_sync.py --tasks 2000 --latency 0.0005
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bench_config  # noqa: E402,F401
+
+from celery import states as celery_states  # noqa: E402
+
+from xTool.executors.celery_state_fetcher import BulkStateFetcher  # noqa: E402
+
+
+class KeyValueBackend(object):
+    """模拟 Redis 的 result backend，每次请求等待 latency 秒 ."""
+
+    task_keyprefix = 'celery-task-meta-'
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+        self.store = {}
+
+    def get_key_for_task(self, task_id):
+        return self.task_keyprefix + task_id
+
+    def decode_result(self, value):
+        return json.loads(value)
+
+    def set_status(self, task_id, status):
+        self.store[self.get_key_for_task(task_id)] = json.dumps(
+            {'task_id': task_id, 'status': status})
+
+    def get(self, key):
+        self.requests += 1
+        time.sleep(self.latency)
+        return self.store.get(key)
+
+    def mget(self, keys):
+        self.requests += 1
+        time.sleep(self.latency)
+        return [self.store.get(key) for key in keys]
+
+
+class PerTaskBackend(object):
+    """不支持批量请求的 backend ."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def get(self, key):
+        return self._backend.get(key)
+
+    def get_key_for_task(self, task_id):
+        return self._backend.get_key_for_task(task_id)
+
+    def decode_result(self, value):
+        return self._backend.decode_result(value)
+
+
+class AsyncResult(object):
+    """模拟 celery.result.AsyncResult，每次访问 state 请求一次 backend ."""
+
+    def __init__(self, task_id, backend):
+        self.task_id = task_id
+        self.backend = backend
+
+    @property
+    def state(self):
+        value = self.backend.get(self.backend.get_key_for_task(self.task_id))
+        if value is None:
+            return celery_states.PENDING
+        return self.backend.decode_result(value)['status']
+
+
+def make_tasks(backend, tasks):
+    """创建 tasks 个任务，一半成功，其余的一半失败，剩下的尚未写入 backend ."""
+    store = backend._backend if isinstance(backend, PerTaskBackend) else backend
+    async_results = {}
+    for i in range(tasks):
+        task_id = 'task-{}'.format(i)
+        if i % 2 == 0:
+            store.set_status(task_id, celery_states.SUCCESS)
+        elif i % 4 == 1:
+            store.set_status(task_id, celery_states.FAILURE)
+        async_results[('bench', task_id, 0)] = AsyncResult(task_id, backend)
+    return async_results
+
+
+def run(fetch, backend, async_results):
+    store = backend._backend if isinstance(backend, PerTaskBackend) else backend
+    store.requests = 0
+    start = time.time()
+    states = fetch(async_results)
+    elapsed = time.time() - start
+    return {
+        'seconds': round(elapsed, 4),
+        'requests': store.requests,
+        'success': sum(1 for state in states.values()
+                       if state == celery_states.SUCCESS),
+        'pending': sum(1 for state in states.values()
+                       if state == celery_states.PENDING),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.0005,
+                        help="每次请求 backend 的往返延迟（秒）")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    fetcher = BulkStateFetcher(chunk_size=args.chunk_size,
+                               max_workers=args.threads)
+    kv_backend = KeyValueBackend(args.latency)
+    per_task_backend = PerTaskBackend(KeyValueBackend(args.latency))
+
+    def per_task(async_results):
+        return dict((key, async_result.state)
+                    for key, async_result in async_results.items())
+
+    results = {
+        'per_task': run(per_task, per_task_backend,
+                        make_tasks(per_task_backend, args.tasks)),
+        'threads': run(fetcher.get_many, per_task_backend,
+                       make_tasks(per_task_backend, args.tasks)),
+        'mget': run(fetcher.get_many, kv_backend,
+                    make_tasks(kv_backend, args.tasks)),
+    }
+    print(json.dumps({
+        'tasks': args.tasks,
+        'latency': args.latency,
+        'results': results,
+    }, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
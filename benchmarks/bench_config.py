@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试脚本的公共配置
+
+执行器模块导入时读取 xTool.configuration 的全局配置，
+没有该模块时使用 XToolConfigParser 构造默认配置，配置项可以通过环境变量
+XTOOL__{SECTION}__{KEY} 覆盖，例如 XTOOL__CORE__PARALLELISM=8
+
+测试脚本在导入 xTool.executors 之前导入本模块:
+
+import bench_config  # noqa: F401
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import xTool  # noqa: E402
+from xTool.utils.configuration import XToolConfigParser  # noqa: E402
+
+
+BENCH_CONFIG = """
+[core]
+parallelism = 32
+executor = LocalExecutor
+
+[dask]
+cluster_address =
+"""
+
+try:
+    from xTool import configuration  # noqa: F401
+except ImportError:
+    configuration = XToolConfigParser(default_config=BENCH_CONFIG)
+    sys.modules['xTool.configuration'] = configuration
+    xTool.configuration = configuration
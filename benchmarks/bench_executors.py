@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+执行器吞吐量和延迟测试
+
+对每个执行器使用相同的负载：通过 queue_command 放入 N 个命令，然后循环调用 heartbeat
+直到所有命令执行完成。每个命令启动时把当前时间写入文件，用于计算调度延迟。
+
+输出的指标：
+- enqueue_us: 每次调用 queue_command 的平均耗时（微秒）
+- first_start_ms: 从第一次心跳到第一个命令开始执行的耗时（毫秒）
+- tasks_per_second: 每秒完成的命令数量
+- lag_p50_ms/lag_p99_ms: 从 heartbeat 调用 execute_async 到命令开始执行的耗时（毫秒）
+- heartbeat_p99_ms: 每次 heartbeat 调用的耗时（毫秒）
+- worker_rss_bytes: 每个工作进程的平均常驻内存，没有工作进程的执行器为 null
+- executor_rss_delta_bytes: 执行期间当前进程常驻内存的最大增长
+
+python benchmarks/bench_executors.py --tasks 200 --parallelism 4 --sleep 0
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bench_config  # noqa: E402,F401
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from xTool.executors.asyncio_executor import AsyncioExecutor  # noqa: E402
+from xTool.executors.local_executor import LocalExecutor  # noqa: E402
+from xTool.executors.sequential_executor import SequentialExecutor  # noqa: E402
+from xTool.executors.thread_executor import ThreadExecutor  # noqa: E402
+
+
+class BenchTaskInstance(object):
+    """不依赖 DB 的任务实例 ."""
+
+    pool = None
+
+    def __init__(self, dag_id, task_id, execution_date):
+        self.dag_id = dag_id
+        self.task_id = task_id
+        self.execution_date = execution_date
+        self.state = None
+
+    @property
+    def key(self):
+        return self.dag_id, self.task_id, self.execution_date
+
+    def refresh_from_db(self):
+        pass
+
+
+def percentile(values, percent):
+    """最近秩法计算百分位数 ."""
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(int(round(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def rss(pid=None):
+    """获得进程的常驻内存，没有安装 psutil 时返回 None ."""
+    if psutil is None:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except psutil.Error:
+        return None
+
+
+def sample_worker_rss(executor):
+    """获得存活工作进程的常驻内存列表 ."""
+    values = []
+    for worker in getattr(executor, 'workers', None) or []:
+        if worker.is_alive():
+            value = rss(worker.pid)
+            if value is not None:
+                values.append(value)
+    return values
+
+
+def run(executor, tasks, sleep, output_dir):
+    """执行 tasks 个命令，返回指标 ."""
+    dispatched = {}
+    execute_async = executor.execute_async
+
+    def timed_execute_async(key, command, queue=None):
+        dispatched[key] = time.time()
+        execute_async(key, command, queue=queue)
+
+    executor.execute_async = timed_execute_async
+
+    base_rss = rss()
+    executor.start()
+
+    task_instances = []
+    paths = {}
+    for i in range(tasks):
+        ti = BenchTaskInstance('bench', 'task_{}'.format(i), 0)
+        path = os.path.join(output_dir, str(i))
+        command = 'date +%s.%N > {}'.format(path)
+        if sleep:
+            command += '; sleep {}'.format(sleep)
+        task_instances.append((ti, command))
+        paths[ti.key] = path
+
+    enqueue_start = time.time()
+    for ti, command in task_instances:
+        executor.queue_command(ti, command)
+    enqueue_seconds = time.time() - enqueue_start
+
+    heartbeats = []
+    worker_rss = []
+    peak_rss = base_rss
+    start = time.time()
+    while executor.queued_tasks or executor.running:
+        heartbeat_start = time.time()
+        executor.heartbeat()
+        heartbeats.append(time.time() - heartbeat_start)
+        worker_rss.extend(sample_worker_rss(executor))
+        current_rss = rss()
+        if current_rss is not None:
+            peak_rss = max(peak_rss, current_rss)
+        time.sleep(0.001)
+    elapsed = time.time() - start
+    executor.end()
+    events = executor.get_event_buffer()
+
+    starts = {}
+    for key, path in paths.items():
+        with open(path) as f:
+            starts[key] = float(f.read())
+    lags = [starts[key] - dispatched[key] for key in starts]
+
+    return {
+        'tasks': tasks,
+        'succeeded': sum(1 for state in events.values() if state == 'success'),
+        'enqueue_us': round(enqueue_seconds * 1e6 / tasks, 2),
+        'first_start_ms': round((min(starts.values()) - start) * 1000, 2),
+        'seconds': round(elapsed, 4),
+        'tasks_per_second': round(tasks / elapsed, 2),
+        'lag_p50_ms': round(percentile(lags, 50) * 1000, 2),
+        'lag_p99_ms': round(percentile(lags, 99) * 1000, 2),
+        'heartbeats': len(heartbeats),
+        'heartbeat_p99_ms': round(percentile(heartbeats, 99) * 1000, 3),
+        'worker_rss_bytes': (sum(worker_rss) // len(worker_rss)
+                             if worker_rss else None),
+        'executor_rss_delta_bytes': (peak_rss - base_rss
+                                     if base_rss is not None else None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--parallelism', type=int, default=4)
+    parser.add_argument('--sleep', type=float, default=0,
+                        help="每个命令休眠的秒数，0 表示空命令")
+    parser.add_argument('--executors', default=None,
+                        help="逗号分隔的执行器名称，默认测试所有执行器")
+    args = parser.parse_args()
+
+    # 日志输出的耗时不计入测试结果
+    logging.disable(logging.INFO)
+
+    factories = [
+        ('sequential', lambda: SequentialExecutor()),
+        ('local_limited', lambda: LocalExecutor(parallelism=args.parallelism)),
+        ('local_unlimited', lambda: LocalExecutor(parallelism=0)),
+        ('thread', lambda: ThreadExecutor(parallelism=args.parallelism)),
+        ('asyncio', lambda: AsyncioExecutor(parallelism=args.parallelism)),
+    ]
+    if args.executors:
+        names = args.executors.split(',')
+        factories = [(name, factory) for name, factory in factories
+                     if name in names]
+
+    results = {}
+    for name, factory in factories:
+        output_dir = tempfile.mkdtemp(prefix='bench_executors_')
+        try:
+            results[name] = run(factory(), args.tasks, args.sleep, output_dir)
+        finally:
+            shutil.rmtree(output_dir)
+    print(json.dumps({
+        'parallelism': args.parallelism,
+        'sleep': args.sleep,
+        'results': results,
+    }, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+list_py_file_paths 性能测试
+
+在临时目录中生成一个合成的目录树，比较以下实现的耗时：
+- legacy: 优化前的实现，os.walk + 逐个规则 re.findall + 读取整个文件
+- serial: 当前的实现
+- safe_mode_max_bytes: 只读取文件的前N个字节
+- threads: 使用线程池执行需要读文件的检查
+
+python benchmarks/bench_list_py_file_paths.py --files 100000
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from xTool.utils.file import TemporaryDirectory  # noqa: E402
+from xTool.utils.file import list_py_file_paths  # noqa: E402
+
+
+def legacy_list_py_file_paths(directory, ignore_filename='.ignore', file_ext='.py',
+                              safe_mode=False, safe_filters=(b'xTool', b'XTool')):
+    """优化前的实现，用于对比 ."""
+    file_paths = []
+    patterns = []
+    for root, dirs, files in os.walk(directory, followlinks=True):
+        ignore_file = [f for f in files if f == ignore_filename]
+        if ignore_file:
+            with open(os.path.join(root, ignore_file[0]), 'r') as f:
+                patterns += [p.strip() for p in f.read().split('\n') if p]
+        for f in files:
+            file_path = os.path.join(root, f)
+            if not os.path.isfile(file_path):
+                continue
+            _, file_extension = os.path.splitext(f)
+            if file_extension != file_ext and not zipfile.is_zipfile(file_path):
+                continue
+            if any([re.findall(p, file_path) for p in patterns]):
+                continue
+            if safe_mode and not zipfile.is_zipfile(file_path):
+                with open(file_path, 'rb') as fp:
+                    content = fp.read()
+                if not all([s in content for s in safe_filters]):
+                    continue
+            file_paths.append(file_path)
+    return file_paths
+
+
+def make_tree(directory, files, files_per_dir, file_size):
+    """生成合成的目录树，每个目录包含固定数量的文件 ."""
+    body = b'import xTool\nXTool = 1\n# ' + b'x' * max(file_size - 40, 0) + b'\n'
+    # 忽略文件放在根目录，优化前后的实现对忽略规则作用范围的处理一致
+    with open(os.path.join(directory, '.ignore'), 'w') as f:
+        f.write('ignored_\\d+\\.py$\nnever_matches_[a-z]+\n')
+    dir_count = 0
+    for i in range(files):
+        if i % files_per_dir == 0:
+            current = os.path.join(directory, 'd{:03d}'.format(dir_count % 100),
+                                   'd{:05d}'.format(dir_count))
+            os.makedirs(current)
+            dir_count += 1
+        if i % 7 == 0:
+            name = 'data_{}.txt'.format(i)
+        elif i % 11 == 0:
+            name = 'ignored_{}.py'.format(i)
+        else:
+            name = 'file_{}.py'.format(i)
+        with open(os.path.join(current, name), 'wb') as f:
+            f.write(body)
+
+
+def timeit(func, repeat):
+    """返回多次执行的最短耗时和执行结果 ."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--files-per-dir', type=int, default=100)
+    parser.add_argument('--file-size', type=int, default=4096)
+    parser.add_argument('--max-bytes', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix='xtool_bench_') as directory:
+        make_tree(directory, args.files, args.files_per_dir, args.file_size)
+        cases = [
+            ('legacy', lambda: legacy_list_py_file_paths(directory)),
+            ('serial', lambda: list_py_file_paths(directory)),
+            ('legacy_safe_mode', lambda: legacy_list_py_file_paths(
+                directory, safe_mode=True)),
+            ('serial_safe_mode', lambda: list_py_file_paths(
+                directory, safe_mode=True)),
+            ('safe_mode_max_bytes', lambda: list_py_file_paths(
+                directory, safe_mode=True, safe_mode_max_bytes=args.max_bytes)),
+            ('threads_safe_mode_max_bytes', lambda: list_py_file_paths(
+                directory, safe_mode=True, safe_mode_max_bytes=args.max_bytes,
+                max_workers=args.workers)),
+        ]
+        results = []
+        for name, func in cases:
+            elapsed, file_paths = timeit(func, args.repeat)
+            results.append({
+                'case': name,
+                'seconds': round(elapsed, 4),
+                'files_found': len(file_paths),
+            })
+        print(json.dumps({'files': args.files, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
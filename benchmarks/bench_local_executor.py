@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+LocalExecutor 吞吐量测试
+
+使用 LocalExecutor 执行大量耗时极短的命令，比较以下配置每秒完成的命令数量：
+- legacy: 每执行完一个命令休眠1秒，优化前的行为
+- no_delay: 不休眠
+- batch: 不休眠，且工作进程每次唤醒时批量获取命令
+
+python benchmarks/bench_local_executor.py --tasks 2000 --parallelism 4
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bench_config  # noqa: E402,F401
+
+from xTool.executors.local_executor import LocalExecutor  # noqa: E402
+
+
+def run(tasks, parallelism, command, worker_delay=0, batch_size=1):
+    """执行 tasks 个命令，返回 (耗时, 成功的数量) ."""
+    executor = LocalExecutor(parallelism=parallelism,
+                             worker_delay=worker_delay,
+                             batch_size=batch_size)
+    executor.start()
+    start = time.time()
+    for i in range(tasks):
+        key = ('bench', 'task_{}'.format(i), start)
+        executor.running[key] = command
+        executor.execute_async(key, command)
+    while executor.running:
+        executor.sync()
+        time.sleep(0.01)
+    elapsed = time.time() - start
+    events = executor.get_event_buffer()
+    executor.end()
+    return elapsed, sum(1 for state in events.values() if state == 'success')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--legacy-tasks', type=int, default=None,
+                        help="legacy 模式执行的命令数量，默认是 2 * parallelism")
+    parser.add_argument('--parallelism', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--command', default='true')
+    args = parser.parse_args()
+
+    legacy_tasks = args.legacy_tasks or 2 * args.parallelism
+    configs = [
+        ('legacy', legacy_tasks, dict(worker_delay=1)),
+        ('no_delay', args.tasks, dict()),
+        ('batch', args.tasks, dict(batch_size=args.batch_size)),
+    ]
+    results = {}
+    for name, tasks, kwargs in configs:
+        elapsed, succeeded = run(tasks, args.parallelism, args.command, **kwargs)
+        results[name] = {
+            'tasks': tasks,
+            'succeeded': succeeded,
+            'seconds': round(elapsed, 4),
+            'tasks_per_second': round(tasks / elapsed, 2),
+        }
+    print(json.dumps({
+        'parallelism': args.parallelism,
+        'results': results,
+    }, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
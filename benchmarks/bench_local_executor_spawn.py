@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+LocalExecutor 命令启动延迟测试
+
+执行导入一个较重模块的 python 命令，比较以下方式每个命令的平均耗时：
+- shell: 字符串命令，经过 exec bash -c 执行，优化前的行为
+- argv: argv 列表形式的命令，不经过 shell 直接执行
+- fork: argv 列表形式的命令，从预先导入了模块的工作进程 fork 执行
+
+python benchmarks/bench_local_executor_spawn.py --tasks 50 --module sqlalchemy
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bench_config  # noqa: E402,F401
+
+from xTool.executors.local_executor import LocalExecutor  # noqa: E402
+
+
+def run(tasks, command, **kwargs):
+    """使用一个工作进程依次执行 tasks 个命令，返回 (耗时, 成功的数量) ."""
+    executor = LocalExecutor(parallelism=1, **kwargs)
+    executor.start()
+    # 等待工作进程完成预先导入
+    warmup_key = ('bench', 'warmup', 0)
+    executor.running[warmup_key] = command
+    executor.execute_async(warmup_key, command)
+    while executor.running:
+        executor.sync()
+        time.sleep(0.001)
+    executor.get_event_buffer()
+
+    start = time.time()
+    for i in range(tasks):
+        key = ('bench', 'task_{}'.format(i), start)
+        executor.running[key] = command
+        executor.execute_async(key, command)
+    while executor.running:
+        executor.sync()
+        time.sleep(0.001)
+    elapsed = time.time() - start
+    events = executor.get_event_buffer()
+    executor.end()
+    return elapsed, sum(1 for state in events.values() if state == 'success')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--module', default='sqlalchemy',
+                        help="每个命令导入的模块")
+    args = parser.parse_args()
+
+    code = 'import {}'.format(args.module)
+    argv = [sys.executable, '-c', code]
+    configs = [
+        ('shell', '{} -c "{}"'.format(sys.executable, code), dict()),
+        ('argv', argv, dict()),
+        ('fork', argv, dict(fork_python=True, preload_modules=[args.module])),
+    ]
+    results = {}
+    for name, command, kwargs in configs:
+        elapsed, succeeded = run(args.tasks, command, **kwargs)
+        results[name] = {
+            'tasks': args.tasks,
+            'succeeded': succeeded,
+            'seconds': round(elapsed, 4),
+            'ms_per_task': round(elapsed * 1000 / args.tasks, 2),
+        }
+    print(json.dumps({
+        'module': args.module,
+        'results': results,
+    }, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#coding: utf-8
+
+import pytest
+
+from xTool.collections.priority_queue import PriorityQueue
+
+
+class TestPriorityQueue:
+    def test_push_pop(self):
+        q = PriorityQueue()
+        q.push('a', 3)
+        q.push('b', 1)
+        q.push('c', 2)
+        assert len(q) == 3
+        assert 'a' in q
+        assert q.peek() == ('b', 1)
+        assert q.pop() == ('b', 1)
+        assert q.pop() == ('c', 2)
+        assert q.pop() == ('a', 3)
+        assert not q
+        with pytest.raises(KeyError):
+            q.pop()
+
+    def test_fifo_with_same_priority(self):
+        q = PriorityQueue()
+        for key in ['a', 'b', 'c']:
+            q.push(key, 0)
+        assert [q.pop()[0] for _ in range(3)] == ['a', 'b', 'c']
+
+    def test_update_and_remove(self):
+        q = PriorityQueue()
+        q.push('a', 1)
+        q.push('b', 2)
+        q.push('a', 3)
+        assert len(q) == 2
+        assert q.priority('a') == 3
+        q.remove('b')
+        q.discard('b')
+        assert 'b' not in q
+        assert q.pop() == ('a', 3)
+        assert len(q) == 0
+
+    def test_compact(self):
+        q = PriorityQueue()
+        for i in range(1000):
+            q.push(i, i)
+        for i in range(999):
+            q.remove(i)
+        assert len(q._heap) < 1000
+        assert q.pop() == (999, 999)
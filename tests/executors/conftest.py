@@ -0,0 +1,24 @@
+#coding: utf-8
+
+import sys
+
+import xTool
+from xTool.utils.configuration import XToolConfigParser
+
+
+# 执行器模块导入时读取 xTool.configuration 的全局配置，没有该模块时使用测试配置
+TEST_CONFIG = """
+[core]
+parallelism = 4
+executor = SequentialExecutor
+
+[dask]
+cluster_address =
+"""
+
+try:
+    from xTool import configuration  # noqa: F401
+except ImportError:
+    configuration = XToolConfigParser(default_config=TEST_CONFIG)
+    sys.modules['xTool.configuration'] = configuration
+    xTool.configuration = configuration
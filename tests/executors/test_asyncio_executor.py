@@ -0,0 +1,94 @@
+#coding: utf-8
+
+import logging
+import sys
+import time
+
+from xTool.executors.asyncio_executor import AsyncioExecutor
+from xTool.utils.state import State
+
+
+def run_commands(executor, commands, timeout=30):
+    executor.start()
+    try:
+        keys = []
+        for i, command in enumerate(commands):
+            key = ('test_asyncio_executor', 'task_{}'.format(i), 0)
+            keys.append(key)
+            executor.running[key] = command
+            executor.execute_async(key, command)
+        deadline = time.time() + timeout
+        while executor.running and time.time() < deadline:
+            executor.sync()
+            time.sleep(0.01)
+    finally:
+        executor.end()
+    events = executor.get_event_buffer()
+    return [events.get(key) for key in keys]
+
+
+class TestAsyncioExecutor:
+    def test_execute(self):
+        executor = AsyncioExecutor(parallelism=4)
+        states = run_commands(executor, [
+            [sys.executable, '-c', 'pass'],
+            'true',
+            [sys.executable, '-c', 'exit(1)'],
+            'exit 2',
+            ['/nonexistent/command'],
+        ])
+        assert states == [State.SUCCESS, State.SUCCESS,
+                          State.FAILED, State.FAILED, State.FAILED]
+
+    def test_max_concurrency(self):
+        executor = AsyncioExecutor(parallelism=0, max_concurrency=2)
+        start = time.time()
+        states = run_commands(executor, ['sleep 0.3'] * 4)
+        assert states == [State.SUCCESS] * 4
+        # 同时最多运行2个子进程
+        assert time.time() - start >= 0.6
+
+    def test_long_line(self, caplog):
+        executor = AsyncioExecutor(parallelism=1)
+        executor.stream_limit = 1024
+        code = ("import sys; sys.stdout.write('x' * 5000 + '\\n' + 'end'); "
+                "sys.stderr.write('y' * 3000)")
+        with caplog.at_level(logging.INFO):
+            states = run_commands(executor, [[sys.executable, '-c', code]])
+        assert states == [State.SUCCESS]
+        messages = [record.getMessage() for record in caplog.records]
+        # 超长的行分块写入日志，不会丢失输出
+        stdout = ''.join(m.split('stdout: ', 1)[1] for m in messages
+                         if 'stdout: ' in m)
+        stderr = ''.join(m.split('stderr: ', 1)[1] for m in messages
+                         if 'stderr: ' in m)
+        assert stdout == 'x' * 5000 + 'end'
+        assert stderr == 'y' * 3000
+
+    def test_kill_on_stream_error(self, tmpdir):
+        executor = AsyncioExecutor(parallelism=1)
+
+        async def broken_stream(key, stream, name):
+            raise RuntimeError("broken stream")
+
+        executor._stream = broken_stream
+        path = tmpdir.join('finished')
+        start = time.time()
+        states = run_commands(executor, ['sleep 2; touch {}'.format(path)])
+        assert states == [State.FAILED]
+        assert time.time() - start < 2
+        # 子进程已经被杀死，不会继续执行
+        time.sleep(2.5)
+        assert not path.exists()
+
+    def test_terminate(self):
+        executor = AsyncioExecutor(parallelism=2)
+        executor.start()
+        key = ('test_asyncio_executor', 'sleep', 0)
+        executor.running[key] = 'sleep 30'
+        executor.execute_async(key, 'sleep 30')
+        time.sleep(0.5)
+        start = time.time()
+        executor.terminate()
+        assert time.time() - start < 10
+        assert executor.get_event_buffer() == {key: State.FAILED}
@@ -0,0 +1,205 @@
+#coding: utf-8
+
+from collections import Counter
+
+from xTool.executors.base_executor import BaseExecutor
+from xTool.utils.processes import ResourceUsage
+
+
+class RecordingStatsLogger(object):
+    """记录发送的统计值 ."""
+
+    def __init__(self):
+        self.calls = []
+
+    def incr(self, stat, count=1, rate=1):
+        self.calls.append(('incr', stat, count))
+
+    def decr(self, stat, count=1, rate=1):
+        self.calls.append(('decr', stat, count))
+
+    def gauge(self, stat, value, rate=1, delta=False):
+        self.calls.append(('gauge', stat, value))
+
+    def timing(self, stat, dt):
+        self.calls.append(('timing', stat, dt))
+
+    def stats(self, prefix):
+        return [call for call in self.calls if call[1].startswith(prefix)]
+
+
+class FakeTaskInstance(object):
+    def __init__(self, task_id, dag_id='test_base_executor', pool=None):
+        self.dag_id = dag_id
+        self.task_id = task_id
+        self.execution_date = 0
+        self.pool = pool
+        self.state = None
+
+    @property
+    def key(self):
+        return self.dag_id, self.task_id, self.execution_date
+
+    def refresh_from_db(self):
+        pass
+
+
+class RecordingExecutor(BaseExecutor):
+    """只记录发送的任务的执行器 ."""
+
+    def __init__(self, **kwargs):
+        super(RecordingExecutor, self).__init__(**kwargs)
+        self.executed = []
+
+    def execute_async(self, key, command, queue=None):
+        self.executed.append(key)
+
+
+def queue_tasks(executor, queue, count, prefix=None, pool=None):
+    prefix = prefix or queue
+    for i in range(count):
+        ti = FakeTaskInstance('{}_{}'.format(prefix, i), pool=pool)
+        executor.queue_command(ti, 'true', queue=queue)
+
+
+def running_tasks(executor):
+    return Counter(key[1].rsplit('_', 1)[0] for key in executor.running)
+
+
+def select(executor, open_slots):
+    return Counter(queue for _, (_, _, queue, _) in
+                   executor._select_queued_tasks(open_slots))
+
+
+class TestBaseExecutor:
+    def test_queue_weights(self):
+        executor = BaseExecutor(parallelism=10, queue_weights={'a': 3})
+        queue_tasks(executor, 'a', 100)
+        queue_tasks(executor, 'b', 100)
+        assert select(executor, 8) == {'a': 6, 'b': 2}
+
+    def test_idle_queue_refilled(self):
+        executor = BaseExecutor(parallelism=10)
+        queue_tasks(executor, 'a', 800)
+        queue_tasks(executor, 'b', 5)
+        assert select(executor, 10) == {'a': 5, 'b': 5}
+        # 队列 b 空闲期间，队列 a 的虚拟时间不断增长
+        for _ in range(20):
+            assert select(executor, 10) == {'a': 10}
+        # 队列 b 重新有任务时，不会因为旧的虚拟时间较小而占用所有的slot
+        queue_tasks(executor, 'b', 50, prefix='b_refill')
+        assert select(executor, 10) == {'a': 5, 'b': 5}
+
+    def test_sync_task_queue_keeps_pass(self):
+        executor = BaseExecutor(parallelism=10)
+        queue_tasks(executor, 'a', 20)
+        queue_tasks(executor, 'b', 20)
+        select(executor, 10)
+        passes = dict(executor._queue_pass)
+        # queued_tasks 被外部修改后重建索引，不改变队列的虚拟时间
+        ti = FakeTaskInstance('external')
+        executor.queued_tasks[ti.key] = ('true', 1, 'a', ti)
+        executor._sync_task_queue()
+        assert executor._queue_pass == passes
+        assert sum(select(executor, 100).values()) == 31
+
+    def test_event_buffer(self):
+        executor = BaseExecutor(parallelism=10)
+        key_a = ('dag_a', 'task', 0)
+        key_b = ('dag_b', 'task', 0)
+        for key in (key_a, key_b):
+            executor.running[key] = 'true'
+        executor.success(key_a)
+        executor.fail(key_b)
+        # event_buffer 是真正的 dict，直接修改会生效
+        assert executor.event_buffer is executor.event_buffer
+        assert executor.event_buffer == {key_a: 'success', key_b: 'failed'}
+        key_c = ('dag_a', 'other', 0)
+        executor.event_buffer[key_c] = 'success'
+        del executor.event_buffer[key_b]
+        assert executor.get_event_buffer(dag_ids=['dag_b']) == {}
+        assert executor.get_event_buffer(dag_ids=['dag_a']) == {
+            key_a: 'success', key_c: 'success'}
+        assert executor.event_buffer == {}
+
+        executor.event_buffer = {key_a: 'success', key_b: 'failed'}
+        executor.event_buffer.pop(key_a)
+        assert executor.drain(1) == {key_b: 'failed'}
+        assert executor.drain() == {}
+
+    def test_drain_order(self):
+        executor = BaseExecutor(parallelism=10)
+        keys = [('dag_a', 'task_0', 0), ('dag_b', 'task_0', 0), ('dag_a', 'task_1', 0)]
+        for key in keys:
+            executor.event_buffer[key] = 'success'
+        # 以dag为单位按事件发生的先后顺序返回
+        assert list(executor.drain(2)) == [keys[0], keys[2]]
+        assert executor.drain(5, with_info=True) == {keys[1]: ('success', None)}
+
+    def test_resource_usage(self):
+        stats_client = RecordingStatsLogger()
+        executor = BaseExecutor(parallelism=10, stats_client=stats_client)
+        key = ('test_base_executor', 'task', 0)
+        executor.running[key] = 'true'
+        executor.change_state(key, 'success', ResourceUsage(1.0, 0.25, 0.25, 1024, 0, None))
+        assert stats_client.stats('executor.task.') == [
+            ('timing', 'executor.task.wall_time', 1000.0),
+            ('timing', 'executor.task.cpu_time', 500.0),
+            ('gauge', 'executor.task.max_rss', 1024),
+        ]
+
+    def test_resource_usage_unknown(self):
+        stats_client = RecordingStatsLogger()
+        executor = BaseExecutor(parallelism=10, stats_client=stats_client)
+        key = ('test_base_executor', 'task', 0)
+        executor.running[key] = 'true'
+        # 工作进程丢失子进程时，资源使用情况未知的指标不发送
+        executor.change_state(key, 'failed', ResourceUsage(1.0, None, None, None, 1, None))
+        assert stats_client.stats('executor.task.') == [
+            ('timing', 'executor.task.wall_time', 1000.0),
+        ]
+        assert executor.get_event_buffer() == {key: 'failed'}
+
+    def test_queue_slots(self):
+        stats_client = RecordingStatsLogger()
+        executor = RecordingExecutor(parallelism=10, queue_slots={'a': 2},
+                                     stats_client=stats_client)
+        queue_tasks(executor, 'a', 5)
+        queue_tasks(executor, 'b', 3)
+        executor.heartbeat()
+        # 队列 a 达到上限后不再发送任务，其它队列不受影响
+        assert running_tasks(executor) == {'a': 2, 'b': 3}
+        assert stats_client.stats('executor.open_slots.') == [
+            ('gauge', 'executor.open_slots.a', 0),
+            ('gauge', 'executor.open_slots.b', 5),
+        ]
+        executor.heartbeat()
+        assert running_tasks(executor) == {'a': 2, 'b': 3}
+        # 任务完成释放slot后继续发送
+        executor.change_state(executor.executed[0], 'success')
+        del stats_client.calls[:]
+        executor.heartbeat()
+        assert running_tasks(executor) == {'a': 2, 'b': 3}
+        assert len(executor.executed) == 6
+        assert len(executor.queued_tasks) == 2
+        assert stats_client.stats('executor.open_slots.a') == [
+            ('gauge', 'executor.open_slots.a', 0)]
+
+    def test_pool_slots(self):
+        stats_client = RecordingStatsLogger()
+        executor = RecordingExecutor(parallelism=10, pool_slots={'p': 1},
+                                     stats_client=stats_client)
+        queue_tasks(executor, 'a', 3, prefix='pooled', pool='p')
+        queue_tasks(executor, 'a', 2, prefix='free')
+        executor.heartbeat()
+        # 池 p 达到上限后，同一个队列中其它池的任务仍然可以发送
+        assert running_tasks(executor) == {'pooled': 1, 'free': 2}
+        assert stats_client.stats('executor.open_slots.a') == [
+            ('gauge', 'executor.open_slots.a', 7)]
+        executor.heartbeat()
+        assert running_tasks(executor) == {'pooled': 1, 'free': 2}
+        pooled = [key for key in executor.running if key[1].startswith('pooled')]
+        executor.change_state(pooled[0], 'success')
+        executor.heartbeat()
+        assert running_tasks(executor) == {'pooled': 1, 'free': 2}
+        assert len(executor.queued_tasks) == 1
@@ -0,0 +1,128 @@
+#coding: utf-8
+
+import pytest
+
+celery = pytest.importorskip('celery')
+
+from celery import states as celery_states  # noqa: E402
+
+from xTool.executors.celery_state_fetcher import BulkStateFetcher  # noqa: E402
+
+
+class CountingBackend(object):
+    """记录 mget 请求的键值存储 backend ."""
+
+    task_keyprefix = 'celery-task-meta-'
+
+    def __init__(self, mget_returns_dict=False):
+        self.mget_returns_dict = mget_returns_dict
+        self.store = {}
+        self.mget_calls = []
+
+    def get_key_for_task(self, task_id):
+        return self.task_keyprefix + task_id
+
+    def decode_result(self, value):
+        return {'status': value}
+
+    def mget(self, keys):
+        self.mget_calls.append(list(keys))
+        if self.mget_returns_dict:
+            # memcached 只返回存在的键
+            return dict((key, self.store[key]) for key in keys if key in self.store)
+        return [self.store.get(key) for key in keys]
+
+
+class NoMgetBackend(CountingBackend):
+    """继承了 mget 方法，但是不支持批量获取的 backend ."""
+
+    def mget(self, keys):
+        self.mget_calls.append(list(keys))
+        raise NotImplementedError('Does not support get_many')
+
+
+class PerTaskBackend(object):
+    """不支持批量请求的 backend ."""
+
+
+class FakeAsyncResult(object):
+    def __init__(self, task_id, backend, state=None):
+        self.task_id = task_id
+        self.backend = backend
+        self._state = state
+
+    @property
+    def state(self):
+        return self._state
+
+
+def make_async_results(backend, statuses):
+    async_results = {}
+    for i, status in enumerate(statuses):
+        task_id = 'task-{}'.format(i)
+        if status is not None and hasattr(backend, 'store'):
+            backend.store[backend.get_key_for_task(task_id)] = status
+        async_results[('dag', task_id, 0)] = FakeAsyncResult(
+            task_id, backend, status or celery_states.PENDING)
+    return async_results
+
+
+STATUSES = [celery_states.SUCCESS, celery_states.FAILURE, None,
+            celery_states.STARTED, celery_states.SUCCESS]
+
+
+def expected_states(async_results):
+    return dict((key, async_result.state)
+                for key, async_result in async_results.items())
+
+
+class TestBulkStateFetcher:
+    def test_empty(self):
+        assert BulkStateFetcher().get_many({}) == {}
+
+    @pytest.mark.parametrize('mget_returns_dict', [False, True])
+    def test_kv_backend_chunks(self, mget_returns_dict):
+        backend = CountingBackend(mget_returns_dict=mget_returns_dict)
+        async_results = make_async_results(backend, STATUSES)
+        states = BulkStateFetcher(chunk_size=2).get_many(async_results)
+        assert states == expected_states(async_results)
+        # 5个任务按 chunk_size=2 分成3次请求
+        assert [len(keys) for keys in backend.mget_calls] == [2, 2, 1]
+        assert sum(backend.mget_calls, []) == [
+            backend.get_key_for_task(async_result.task_id)
+            for async_result in async_results.values()]
+
+    def test_kv_backend_single_request(self):
+        backend = CountingBackend()
+        async_results = make_async_results(backend, STATUSES)
+        BulkStateFetcher(chunk_size=1000).get_many(async_results)
+        assert len(backend.mget_calls) == 1
+
+    def test_db_backend(self, tmpdir):
+        app = celery.Celery('test_celery_state_fetcher',
+                            backend='db+sqlite:///{}'.format(tmpdir.join('celery.db')),
+                            broker='memory://')
+        async_results = {}
+        for i, status in enumerate(STATUSES):
+            task_id = 'task-{}'.format(i)
+            if status is not None:
+                app.backend.store_result(task_id, None, status)
+            async_results[('dag', task_id, 0)] = app.AsyncResult(task_id)
+        states = BulkStateFetcher(chunk_size=2).get_many(async_results)
+        assert states == dict(
+            (('dag', 'task-{}'.format(i), 0), status or celery_states.PENDING)
+            for i, status in enumerate(STATUSES))
+
+    def test_threads(self):
+        backend = PerTaskBackend()
+        async_results = make_async_results(backend, STATUSES)
+        states = BulkStateFetcher(max_workers=2).get_many(async_results)
+        assert states == expected_states(async_results)
+
+    def test_mget_not_implemented(self):
+        backend = NoMgetBackend()
+        async_results = make_async_results(backend, STATUSES)
+        states = BulkStateFetcher(chunk_size=2, max_workers=2).get_many(async_results)
+        assert states == expected_states(async_results)
+        # 第一次 mget 失败后使用线程池获取
+        assert len(backend.mget_calls) == 1
@@ -0,0 +1,62 @@
+#coding: utf-8
+
+import time
+
+import pytest
+
+distributed = pytest.importorskip('distributed')
+dask_executor = pytest.importorskip('xTool.executors.dask_executor',
+                                    exc_type=ImportError)
+
+from xTool.utils.state import State
+
+
+@pytest.fixture
+def cluster():
+    cluster = distributed.LocalCluster(n_workers=2, processes=False,
+                                       dashboard_address=None)
+    yield cluster
+    cluster.close()
+
+
+def submit(executor, task_id, command):
+    key = ('test_dask_executor', task_id, 0)
+    executor.running[key] = command
+    executor.execute_async(key, command)
+    return key
+
+
+def wait_for_events(executor, count=0, timeout=30):
+    deadline = time.time() + timeout
+    while len(executor.running) > count and time.time() < deadline:
+        executor.sync()
+        time.sleep(0.01)
+    return executor.get_event_buffer()
+
+
+def test_sync(cluster):
+    executor = dask_executor.DaskExecutor(cluster_address=cluster.scheduler_address)
+    executor.start()
+    success = submit(executor, 'success', 'exit 0')
+    fail = submit(executor, 'fail', 'exit 1')
+    events = wait_for_events(executor)
+    assert events == {success: State.SUCCESS, fail: State.FAILED}
+    assert not executor.futures
+
+    # 所有 future 完成后，后台线程可以继续等待新提交的 future
+    sleep = submit(executor, 'sleep', 'sleep 0.2')
+    executor.sync()
+    assert executor.get_event_buffer() == {}
+    events = wait_for_events(executor)
+    assert events == {sleep: State.SUCCESS}
+    executor.end()
+    assert not executor._watcher.is_alive()
+
+
+def test_terminate(cluster):
+    executor = dask_executor.DaskExecutor(cluster_address=cluster.scheduler_address)
+    executor.start()
+    sleep = submit(executor, 'sleep', 'sleep 30')
+    executor.terminate()
+    assert executor.get_event_buffer() == {sleep: State.FAILED}
+    assert not executor.futures
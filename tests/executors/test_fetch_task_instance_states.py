@@ -0,0 +1,133 @@
+#coding: utf-8
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+
+from sqlalchemy import Column, DateTime, String, create_engine, event  # noqa: E402
+from sqlalchemy.orm import declarative_base, sessionmaker  # noqa: E402
+
+from xTool.decorators import db  # noqa: E402
+from xTool.executors.base_executor import BaseExecutor  # noqa: E402
+from xTool.utils import timezone  # noqa: E402
+from xTool.utils.state import State  # noqa: E402
+
+Base = declarative_base()
+
+
+class TaskInstance(Base):
+    """只包含状态相关列的任务实例模型，execution_date 是没有时区的 DateTime 列 ."""
+
+    __tablename__ = 'task_instance'
+
+    task_id = Column(String(250), primary_key=True)
+    dag_id = Column(String(250), primary_key=True)
+    execution_date = Column(DateTime, primary_key=True)
+    state = Column(String(20))
+
+    @property
+    def key(self):
+        return self.dag_id, self.task_id, self.execution_date
+
+
+class PlainTaskInstance(object):
+    """不是 SQLAlchemy 模型的任务实例 ."""
+
+    def __init__(self, task_id, state):
+        self.dag_id = 'test_fetch_task_instance_states'
+        self.task_id = task_id
+        self.execution_date = 0
+        self.state = None
+        self._db_state = state
+
+    @property
+    def key(self):
+        return self.dag_id, self.task_id, self.execution_date
+
+    def refresh_from_db(self):
+        self.state = self._db_state
+
+
+@pytest.fixture
+def selects(monkeypatch):
+    """使用 sqlite 数据库，返回执行过的 SELECT 语句列表 ."""
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, 'settings',
+                        SimpleNamespace(Session=sessionmaker(bind=engine)),
+                        raising=False)
+    executed = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            executed.append(statement)
+
+    yield executed
+    engine.dispose()
+
+
+def make_task_instances(execution_date, count):
+    return [TaskInstance(dag_id='test_fetch_task_instance_states',
+                         task_id='task_{}'.format(i),
+                         execution_date=execution_date)
+            for i in range(count)]
+
+
+def save_states(task_instances, states):
+    with db.create_session() as session:
+        for ti, state in zip(task_instances, states):
+            if state is not None:
+                session.add(TaskInstance(dag_id=ti.dag_id,
+                                         task_id=ti.task_id,
+                                         execution_date=ti.execution_date,
+                                         state=state))
+        session.commit()
+
+
+STATES = [State.QUEUED, State.RUNNING, None, State.SUCCESS, State.QUEUED]
+
+
+class TestFetchTaskInstanceStates:
+    @pytest.mark.parametrize('execution_date', [
+        datetime(2020, 1, 1),
+        # 带时区的时间写入没有时区的列后，读取的时间不带时区
+        timezone.utc_datetime(2020, 1, 1),
+        timezone.system_now(),
+    ])
+    def test_chunks(self, selects, execution_date):
+        task_instances = make_task_instances(execution_date, len(STATES))
+        save_states(task_instances, STATES)
+        executor = BaseExecutor()
+        executor.max_tis_per_query = 2
+        del selects[:]
+        states = executor.fetch_task_instance_states(task_instances)
+        # 5个任务实例按 max_tis_per_query=2 分成3次查询
+        assert len(selects) == 3
+        # DB中不存在的任务实例状态为None
+        assert [ti.state for ti in task_instances] == STATES
+        assert states == dict((ti.key, state)
+                              for ti, state in zip(task_instances, STATES))
+
+    def test_running_not_executed(self, selects):
+        task_instances = make_task_instances(datetime(2020, 1, 1), len(STATES))
+        save_states(task_instances, STATES)
+        executor = BaseExecutor(parallelism=10)
+        executor.execute_async = lambda key, command, queue=None: None
+        for ti in task_instances:
+            executor.queue_command(ti, 'true')
+        executor.heartbeat()
+        # 已经在运行的任务实例不发给执行器
+        assert sorted(key[1] for key in executor.running) == \
+            ['task_0', 'task_2', 'task_3', 'task_4']
+        assert not executor.queued_tasks
+
+    def test_refresh_from_db(self):
+        task_instances = [PlainTaskInstance('task_{}'.format(i), state)
+                          for i, state in enumerate(STATES)]
+        states = BaseExecutor().fetch_task_instance_states(task_instances)
+        assert [ti.state for ti in task_instances] == STATES
+        assert list(states.values()) == STATES
@@ -0,0 +1,244 @@
+#coding: utf-8
+
+import multiprocessing
+import os
+import sys
+import time
+
+from six.moves import queue as Queue
+
+from xTool.executors.local_executor import LocalExecutor
+from xTool.executors.local_executor import PythonZygote
+from xTool.executors.local_executor import QueuedLocalWorker
+from xTool.executors.local_executor import drain_results
+from xTool.executors.local_executor import parse_python_command
+from xTool.executors.local_executor import wait_for_workers
+from xTool.utils.state import State
+
+
+def make_worker(commands, batch_size, idle_workers=None):
+    task_queue = Queue.Queue()
+    for item in commands:
+        task_queue.put(item)
+    return QueuedLocalWorker(task_queue, None, batch_size=batch_size,
+                             idle_workers=idle_workers)
+
+
+class ResultCollector(object):
+    """只有结果队列的执行器 ."""
+
+    def __init__(self):
+        self.result_queue = multiprocessing.Queue()
+        self.results = []
+
+    def change_state(self, key, state, info=None):
+        self.results.append((key, state))
+
+    def sync(self):
+        drain_results(self)
+
+
+def put_results(result_queue, count, size):
+    for i in range(count):
+        result_queue.put((('key', i), 'x' * size))
+
+
+def run_commands(executor, commands, timeout=30):
+    executor.start()
+    try:
+        for i, command in enumerate(commands):
+            key = ('test_local_executor', 'task_{}'.format(i), 0)
+            executor.running[key] = command
+            executor.execute_async(key, command)
+        deadline = time.time() + timeout
+        while executor.running and time.time() < deadline:
+            executor.sync()
+            time.sleep(0.01)
+    finally:
+        executor.end()
+    return executor.get_event_buffer()
+
+
+class TestParsePythonCommand:
+    def test_current_interpreter(self):
+        assert parse_python_command([sys.executable, '-m', 'json.tool']) == \
+            ('module', 'json.tool', ['json.tool'])
+        assert parse_python_command([sys.executable, '-c', 'pass', 'a']) == \
+            ('code', 'pass', ['-c', 'a'])
+        assert parse_python_command([sys.executable, 'a.py', 'b']) == \
+            ('path', 'a.py', ['a.py', 'b'])
+
+    def test_other_interpreter(self, tmpdir):
+        # 名称以 python 开头，但不是当前解释器
+        python = tmpdir.join('python3')
+        python.write('#!/bin/sh\n')
+        python.chmod(0o755)
+        assert parse_python_command([str(python), '-c', 'pass']) is None
+        assert parse_python_command(['python-nonexistent', '-c', 'pass']) is None
+        assert parse_python_command(['bash', '-c', 'true']) is None
+
+
+class TestPythonZygote:
+    def test_spawn(self, tmpdir):
+        zygote = PythonZygote(['json'])
+        zygote.start()
+        try:
+            path = str(tmpdir.join('pid'))
+            code = ("import os, sys, json; open({!r}, 'w').write(str(os.getppid())); "
+                    "sys.exit(3)").format(path)
+            pid = zygote.spawn(('code', code, ['-c']))
+            assert zygote.child_pid == pid
+            usage = zygote.wait()
+            assert usage.exit_code == 3
+            assert zygote.child_pid is None
+            # 命令进程是 zygote 进程的子进程
+            with open(path) as f:
+                assert int(f.read()) == zygote.pid
+        finally:
+            zygote.stop()
+        assert zygote._conn is None
+
+    def test_zygote_exit(self):
+        zygote = PythonZygote()
+        zygote.start()
+        os.kill(zygote.pid, 9)
+        os.waitpid(zygote.pid, 0)
+        try:
+            zygote.spawn(('code', 'pass', ['-c']))
+        except OSError:
+            pass
+        else:
+            assert False, "spawn should fail after the zygote exited"
+        finally:
+            zygote.stop()
+
+
+class TestResults:
+    def test_drain_results(self):
+        collector = ResultCollector()
+        put_results(collector.result_queue, 3, 1)
+        # 等待队列的后台线程把结果写入管道
+        deadline = time.time() + 30
+        count = 0
+        while count < 3 and time.time() < deadline:
+            count += drain_results(collector)
+        assert count == 3
+        assert collector.results == [(('key', i), 'x') for i in range(3)]
+        assert drain_results(collector) == 0
+
+    def test_wait_for_workers(self):
+        collector = ResultCollector()
+        # 结果的总大小超过管道的缓冲区，工作进程退出前需要父进程读取结果
+        workers = [multiprocessing.Process(target=put_results,
+                                           args=(collector.result_queue, 100, 4096))
+                   for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        start = time.time()
+        wait_for_workers(collector, workers)
+        assert time.time() - start < 10
+        assert not any(worker.is_alive() for worker in workers)
+        assert len(collector.results) == 200
+
+
+class TestQueuedLocalWorker:
+    def test_get_batch(self):
+        commands = [(('key', i), 'true') for i in range(5)]
+        worker = make_worker(commands, batch_size=2)
+        assert worker._get_batch() == commands[:2]
+        assert worker._get_batch() == commands[2:4]
+        assert worker._get_batch() == commands[4:]
+
+    def test_get_batch_poison_pill(self):
+        commands = [(('key', 0), 'true'), (None, None), (None, None)]
+        worker = make_worker(commands, batch_size=3)
+        # 每个工作进程只消费一个毒丸
+        assert worker._get_batch() == commands[:2]
+        assert worker.task_queue.qsize() == 1
+
+    def test_get_batch_idle_workers(self):
+        commands = [(('key', i), 'true') for i in range(3)]
+        idle_workers = multiprocessing.Value('i', 0)
+        worker = make_worker(commands, batch_size=3, idle_workers=idle_workers)
+        idle_workers.value = 1
+        # 其它工作进程空闲时，剩余的命令留给其它工作进程
+        assert worker._get_batch() == commands[:1]
+        idle_workers.value = 0
+        assert worker._get_batch() == commands[1:]
+        assert idle_workers.value == 0
+
+
+class TestLocalExecutor:
+    def test_batch_size(self):
+        executor = LocalExecutor(parallelism=2, batch_size=4)
+        events = run_commands(executor, ['true'] * 10 + ['false'])
+        assert len(events) == 11
+        assert list(events.values()).count(State.SUCCESS) == 10
+        assert list(events.values()).count(State.FAILED) == 1
+
+    def test_batch_size_slow_command(self):
+        # 一个耗时长的命令不会阻塞同一批次的其它命令
+        executor = LocalExecutor(parallelism=2, batch_size=8)
+        executor.start()
+        try:
+            # 等待所有工作进程启动
+            deadline = time.time() + 30
+            while executor.idle_workers.value < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            slow_key = ('test_local_executor', 'slow', 0)
+            keys = [('test_local_executor', 'task_{}'.format(i), 0)
+                    for i in range(4)]
+            start = time.time()
+            for key, command in [(slow_key, 'sleep 3')] + [(key, 'true') for key in keys]:
+                executor.running[key] = command
+                executor.execute_async(key, command)
+            while any(key in executor.running for key in keys):
+                assert time.time() - start < 2.5
+                executor.sync()
+                time.sleep(0.01)
+        finally:
+            executor.end()
+
+    def test_worker_delay(self):
+        executor = LocalExecutor(parallelism=1, worker_delay=0.5)
+        start = time.time()
+        events = run_commands(executor, ['true'] * 3)
+        assert list(events.values()) == [State.SUCCESS] * 3
+        # 工作进程每执行完一个命令后休眠
+        assert time.time() - start >= 1.5
+
+    def test_fork_python(self, tmpdir):
+        # 工作进程的结果队列启动后台线程后，python 命令仍然从单线程的 zygote 进程 fork
+        path = str(tmpdir.join('ppid'))
+        code = "import os, json; open({!r}, 'a').write('%d\\n' % os.getppid())"
+        command = [sys.executable, '-c', code.format(path)]
+        executor = LocalExecutor(parallelism=1, fork_python=True,
+                                 preload_modules=['json'])
+        events = run_commands(executor, [command, command,
+                                         [sys.executable, '-c', 'exit(2)']])
+        assert sorted(events.values()) == sorted([State.SUCCESS] * 2 + [State.FAILED])
+        with open(path) as f:
+            ppids = set(int(ppid) for ppid in f.read().split())
+        assert len(ppids) == 1
+        assert ppids != set([executor.workers[0].pid])
+
+    def test_lost_zygote(self, tmpdir):
+        # 命令杀死 zygote 进程后，工作进程得不到资源使用情况，任务失败但执行器继续运行
+        # 等待 zygote 返回命令进程的pid后再杀死 zygote，标记文件防止杀死工作进程
+        code = ("import os, time\n"
+                "if not os.path.exists({0!r}):\n"
+                "    open({0!r}, 'w').close()\n"
+                "    time.sleep(0.2)\n"
+                "    os.kill(os.getppid(), 9)\n"
+                "    time.sleep(0.5)\n").format(str(tmpdir.join('killed')))
+        kill_zygote = [sys.executable, '-c', code]
+        executor = LocalExecutor(parallelism=1, fork_python=True)
+        events = run_commands(executor, [kill_zygote,
+                                         [sys.executable, '-c', 'pass']])
+        # 之后的 python 命令使用 subprocess 执行
+        assert list(events.values()) == [State.FAILED, State.SUCCESS]
+
+    def test_unlimited_parallelism(self):
+        executor = LocalExecutor(parallelism=0)
+        events = run_commands(executor, ['true', 'false'])
+        assert sorted(events.values()) == sorted([State.SUCCESS, State.FAILED])
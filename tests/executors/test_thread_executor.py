@@ -0,0 +1,145 @@
+#coding: utf-8
+
+from collections import deque
+import sys
+import threading
+import time
+
+from xTool.executors.thread_executor import ThreadExecutor
+from xTool.utils.state import State
+
+
+class FakeTaskInstance(object):
+    pool = None
+
+    def __init__(self, task_id, dag_id='test_thread_executor'):
+        self.dag_id = dag_id
+        self.task_id = task_id
+        self.execution_date = 0
+        self.state = None
+
+    @property
+    def key(self):
+        return self.dag_id, self.task_id, self.execution_date
+
+    def refresh_from_db(self):
+        pass
+
+
+def run_until_done(executor, timeout=30):
+    deadline = time.time() + timeout
+    while executor.queued_tasks or executor.running:
+        assert time.time() < deadline
+        executor.heartbeat()
+        time.sleep(0.01)
+
+
+def fail():
+    raise ValueError("fail")
+
+
+class ConcurrencyCounter(object):
+    """记录同时执行的任务数量的最大值 ."""
+
+    def __init__(self, duration=0.05):
+        self.duration = duration
+        self.current = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.current += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.current)
+        time.sleep(self.duration)
+        with self._lock:
+            self.current -= 1
+
+
+class SlowDeque(deque):
+    """写入结果较慢的 deque ."""
+
+    def append(self, item):
+        time.sleep(0.2)
+        super(SlowDeque, self).append(item)
+
+
+class TestThreadExecutor:
+    def test_success(self):
+        executor = ThreadExecutor(parallelism=4)
+        executor.start()
+        commands = [lambda: None, [sys.executable, '-c', 'pass'], 'true']
+        for i, command in enumerate(commands):
+            executor.queue_command(FakeTaskInstance('task_{}'.format(i)), command)
+        run_until_done(executor)
+        executor.end()
+        assert list(executor.get_event_buffer().values()) == [State.SUCCESS] * 3
+
+    def test_failure(self):
+        executor = ThreadExecutor(parallelism=4)
+        executor.start()
+        commands = {
+            'callable': fail,
+            'argv': [sys.executable, '-c', 'exit(1)'],
+            'shell': 'exit 2',
+            'not_found': ['/nonexistent/command'],
+        }
+        for task_id, command in commands.items():
+            executor.queue_command(FakeTaskInstance(task_id), command)
+        run_until_done(executor)
+        executor.end()
+        events = executor.get_event_buffer()
+        assert dict((key[1], state) for key, state in events.items()) == \
+            dict((task_id, State.FAILED) for task_id in commands)
+
+    def test_parallelism(self):
+        counter = ConcurrencyCounter()
+        executor = ThreadExecutor(parallelism=2, max_workers=8)
+        executor.start()
+        for i in range(10):
+            executor.queue_command(FakeTaskInstance('task_{}'.format(i)), counter)
+        run_until_done(executor)
+        executor.end()
+        assert counter.calls == 10
+        # 线程数量多于 parallelism 时，同时执行的任务数量仍然受 parallelism 限制
+        assert counter.peak <= 2
+        assert len(executor.get_event_buffer()) == 10
+
+    def test_max_workers(self):
+        counter = ConcurrencyCounter()
+        executor = ThreadExecutor(parallelism=0, max_workers=3)
+        executor.start()
+        for i in range(10):
+            executor.queue_command(FakeTaskInstance('task_{}'.format(i)), counter)
+        run_until_done(executor)
+        executor.end()
+        assert counter.calls == 10
+        assert counter.peak <= 3
+
+    def test_terminate(self):
+        executor = ThreadExecutor(parallelism=0, max_workers=1)
+        executor.start()
+        for i in range(3):
+            key = ('test_thread_executor', 'task_{}'.format(i), 0)
+            executor.running[key] = 'sleep'
+            executor.execute_async(key, lambda: time.sleep(0.3))
+        executor.terminate()
+        executor.end()
+        # 正在执行的任务无法终止，尚未开始的任务被取消
+        states = executor.get_event_buffer()
+        assert len(states) == 3
+        assert list(states.values()).count(State.FAILED) >= 2
+
+    def test_end_waits_for_results(self):
+        executor = ThreadExecutor(parallelism=2)
+        executor.start()
+        executor._results = SlowDeque()
+        for i in range(2):
+            executor.queue_command(FakeTaskInstance('task_{}'.format(i)), lambda: None)
+        executor.heartbeat()
+        executor.end()
+        # 任务的回调函数在 future 完成之后执行，end() 返回前所有结果都已同步
+        assert list(executor.get_event_buffer().values()) == [State.SUCCESS] * 2
+        assert not executor.running
@@ -0,0 +1,276 @@
+#coding: utf-8
+
+from datetime import timedelta
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm.session import make_transient
+from sqlalchemy.pool import StaticPool
+
+jobs = pytest.importorskip('xTool.models.jobs', exc_type=ImportError)
+
+from xTool.decorators import db  # noqa: E402
+from xTool.exceptions import XToolException  # noqa: E402
+from xTool.utils import timezone  # noqa: E402
+from xTool.utils.state import State  # noqa: E402
+
+BaseJob = jobs.BaseJob
+HeartbeatAggregator = jobs.HeartbeatAggregator
+
+
+class FakeExecutor(object):
+    pass
+
+
+class CallbackJob(BaseJob):
+    __mapper_args__ = {'polymorphic_identity': 'CallbackJob'}
+
+    callbacks = 0
+
+    def heartbeat_callback(self, session=None):
+        self.callbacks += 1
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    """使用 sqlite 内存数据库，返回执行过的 SQL 语句列表 ."""
+    engine = create_engine('sqlite://',
+                           poolclass=StaticPool,
+                           connect_args={'check_same_thread': False})
+    BaseJob.__table__.create(engine)
+    # 按模型绑定数据库时 session.bind 是 None
+    Session = sessionmaker(binds={BaseJob: engine})
+    monkeypatch.setattr(db, 'settings', SimpleNamespace(Session=Session),
+                        raising=False)
+    executed = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    yield executed
+    engine.dispose()
+
+
+def save_job(job_cls=CallbackJob, **kwargs):
+    job = job_cls(executor=FakeExecutor(), heartrate=0, **kwargs)
+    latest_heartbeat = job.latest_heartbeat
+    with db.create_session() as session:
+        job.state = State.RUNNING
+        session.add(job)
+        session.commit()
+        job_id = job.id
+        make_transient(job)
+        job.id = job_id
+    # DateTime 列读取的时间没有时区，保留内存中带时区的心跳时间
+    job.latest_heartbeat = latest_heartbeat
+    return job
+
+
+def updates(statements):
+    return [s.lstrip().upper() for s in statements
+            if s.lstrip().upper().startswith('UPDATE')]
+
+
+def set_state(job, state):
+    with db.create_session() as session:
+        session.query(BaseJob).filter(BaseJob.id == job.id).update(
+            {BaseJob.state: state})
+        session.commit()
+
+
+def get_job(job):
+    with db.create_session() as session:
+        row = session.query(BaseJob).filter(BaseJob.id == job.id).one()
+        make_transient(row)
+        return row
+
+
+class TestUpdateHeartbeat:
+    def test_returning(self, statements):
+        job = save_job()
+        latest_heartbeat = timezone.system_now()
+        del statements[:]
+        with db.create_session() as session:
+            assert BaseJob._supports_update_returning(session.get_bind(BaseJob).dialect)
+            assert job._update_heartbeat(session, latest_heartbeat) == State.RUNNING
+        # 只执行一条 UPDATE ... RETURNING 语句
+        queries = [s for s in statements
+                   if s.lstrip().upper().startswith(('UPDATE', 'SELECT'))]
+        assert len(queries) == 1
+        assert 'RETURNING' in queries[0].upper()
+        assert get_job(job).latest_heartbeat == latest_heartbeat.replace(tzinfo=None)
+
+    def test_fallback(self, statements, monkeypatch):
+        monkeypatch.setattr(BaseJob, '_supports_update_returning',
+                            staticmethod(lambda dialect: False))
+        job = save_job()
+        set_state(job, State.SHUTDOWN)
+        latest_heartbeat = timezone.system_now()
+        del statements[:]
+        with db.create_session() as session:
+            assert job._update_heartbeat(session, latest_heartbeat) == State.SHUTDOWN
+        queries = [s.lstrip().upper() for s in statements
+                   if s.lstrip().upper().startswith(('UPDATE', 'SELECT'))]
+        assert [q.split()[0] for q in queries] == ['UPDATE', 'SELECT']
+        assert not any('RETURNING' in q for q in queries)
+        assert get_job(job).latest_heartbeat == latest_heartbeat.replace(tzinfo=None)
+
+    @pytest.mark.parametrize('returning', [True, False])
+    def test_job_not_found(self, statements, monkeypatch, returning):
+        monkeypatch.setattr(BaseJob, '_supports_update_returning',
+                            staticmethod(lambda dialect: returning))
+        job = save_job()
+        job.id += 1
+        with db.create_session() as session:
+            with pytest.raises(NoResultFound):
+                job._update_heartbeat(session, timezone.system_now())
+
+
+class TestHeartbeat:
+    def test_not_coalesced_by_default(self, statements):
+        job = save_job()
+        assert job.coalesce_heartbeat is False
+
+    def test_coalesced(self, statements):
+        job = save_job(coalesce_heartbeat=True)
+        before = get_job(job).latest_heartbeat
+        job.heartbeat()
+        assert job.callbacks == 1
+        assert get_job(job).latest_heartbeat > before
+
+    def test_coalesced_shutdown(self, statements):
+        job = save_job(coalesce_heartbeat=True)
+        set_state(job, State.SHUTDOWN)
+        with pytest.raises(XToolException):
+            job.heartbeat()
+        # 被关闭的job不执行心跳处理函数
+        assert job.callbacks == 0
+        assert get_job(job).end_date is not None
+
+    def test_orm_shutdown(self, statements):
+        job = save_job()
+        set_state(job, State.SHUTDOWN)
+        with pytest.raises(XToolException):
+            job.heartbeat()
+        assert job.callbacks == 0
+
+
+class TestHeartbeatAggregator:
+    @pytest.mark.parametrize('returning,max_jobs_per_query,queries', [
+        (True, 10, ['UPDATE']),
+        (True, 2, ['UPDATE', 'UPDATE']),
+        (False, 10, ['UPDATE', 'SELECT']),
+        (False, 2, ['UPDATE', 'SELECT', 'UPDATE', 'SELECT']),
+    ])
+    def test_flush(self, statements, monkeypatch,
+                   returning, max_jobs_per_query, queries):
+        monkeypatch.setattr(BaseJob, '_supports_update_returning',
+                            staticmethod(lambda dialect: returning))
+        aggregator = HeartbeatAggregator(interval=3600,
+                                         max_jobs_per_query=max_jobs_per_query)
+        job_list = [save_job() for _ in range(3)]
+        now = timezone.system_now()
+        heartbeats = {}
+        for i, job in enumerate(job_list):
+            aggregator.register(job)
+            heartbeats[job.id] = now + timedelta(seconds=i)
+            aggregator.beat(job, heartbeats[job.id])
+        set_state(job_list[1], State.SHUTDOWN)
+        del statements[:]
+        aggregator.flush()
+        executed = [s.lstrip().upper() for s in statements
+                    if s.lstrip().upper().startswith(('UPDATE', 'SELECT'))]
+        assert [q.split()[0] for q in executed] == queries
+        # 每条 UPDATE 语句使用 CASE 为每个job设置各自的心跳时间
+        assert all('CASE' in q for q in updates(statements))
+        assert all(('RETURNING' in q) == returning for q in updates(statements))
+        for job in job_list:
+            assert get_job(job).latest_heartbeat == \
+                heartbeats[job.id].replace(tzinfo=None)
+        assert [job.state for job in job_list] == [
+            State.RUNNING, State.SHUTDOWN, State.RUNNING]
+        # 没有新的心跳时不访问DB
+        del statements[:]
+        aggregator.flush()
+        assert statements == []
+        aggregator.stop()
+
+    def test_lazy_start(self, statements):
+        aggregator = HeartbeatAggregator(interval=0.05)
+        assert aggregator._thread is None
+        job = save_job()
+        aggregator.register(job)
+        thread = aggregator._thread
+        assert thread.is_alive()
+        # 重复启动不会创建新的线程
+        aggregator.register(save_job())
+        assert aggregator._thread is thread
+        flush = aggregator._flush
+        flushed = threading.Event()
+
+        def notify_flush(pending, jobs):
+            flush(pending, jobs)
+            flushed.set()
+
+        # 等待后台线程写入完成后再读取，不与后台线程同时使用同一个数据库连接
+        aggregator._flush = notify_flush
+        latest_heartbeat = timezone.system_now() + timedelta(seconds=10)
+        aggregator.beat(job, latest_heartbeat)
+        assert flushed.wait(10)
+        aggregator.stop()
+        assert not thread.is_alive()
+        assert get_job(job).latest_heartbeat == latest_heartbeat.replace(tzinfo=None)
+
+    def test_requeue(self, statements, monkeypatch):
+        aggregator = HeartbeatAggregator(interval=3600)
+        job, old_job, removed_job = save_job(), save_job(), save_job()
+        for j in (job, old_job, removed_job):
+            aggregator.register(j)
+        now = timezone.system_now()
+        aggregator.beat(job, now)
+        aggregator.beat(old_job, now)
+        aggregator.beat(removed_job, now)
+        flush = aggregator._flush
+
+        def broken_flush(pending, jobs):
+            # 写入期间 job 有新的心跳，old_job 的心跳时间更早
+            aggregator.beat(job, now + timedelta(seconds=1))
+            aggregator.beat(old_job, now - timedelta(seconds=1))
+            aggregator._jobs.pop(removed_job.id)
+            raise RuntimeError("database is gone")
+
+        aggregator._flush = broken_flush
+        with pytest.raises(RuntimeError):
+            aggregator.flush()
+        # 写入失败的心跳重新放回等待队列，每个job只保留最新的心跳时间
+        assert aggregator._pending == {
+            job.id: now + timedelta(seconds=1),
+            old_job.id: now,
+        }
+        aggregator._flush = flush
+        aggregator.flush()
+        assert aggregator._pending == {}
+        assert get_job(job).latest_heartbeat == \
+            (now + timedelta(seconds=1)).replace(tzinfo=None)
+        aggregator.stop()
+
+    def test_heartbeat_shutdown(self, statements):
+        aggregator = HeartbeatAggregator(interval=3600)
+        job = save_job(heartbeat_aggregator=aggregator)
+        aggregator.register(job)
+        job.heartbeat()
+        assert job.callbacks == 1
+        set_state(job, State.SHUTDOWN)
+        aggregator.flush()
+        assert job.state == State.SHUTDOWN
+        # 发现job被关闭后，下次心跳在睡眠之前执行kill操作
+        job.heartrate = 3600
+        with pytest.raises(XToolException):
+            job.heartbeat()
+        assert job.callbacks == 1
+        aggregator.stop()
@@ -0,0 +1,53 @@
+#coding: utf-8
+
+import os
+
+from xTool.processing.change_detection import FileChangeDetector
+
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class TestFileChangeDetector:
+    def test_should_process(self, tmpdir):
+        file_path = str(tmpdir.join('a.py'))
+        _write(file_path, 'a')
+        detector = FileChangeDetector()
+        assert detector.should_process(file_path)
+        detector.record(file_path)
+        assert not detector.should_process(file_path)
+        assert detector.counters == {'skipped': 1, 'processed': 1}
+
+        _write(file_path, 'ab')
+        assert detector.should_process(file_path)
+
+    def test_ttl(self):
+        file_path = __file__
+        detector = FileChangeDetector(ttl=0)
+        detector.record(file_path)
+        assert detector.has_changed(file_path)
+
+    def test_use_hash(self, tmpdir):
+        file_path = str(tmpdir.join('a.py'))
+        _write(file_path, 'a')
+        detector = FileChangeDetector(use_hash=True)
+        detector.record(file_path)
+        assert not detector.has_changed(file_path)
+        # 内容变化，但是mtime和size不变
+        st = os.stat(file_path)
+        _write(file_path, 'b')
+        os.utime(file_path, (st.st_atime, st.st_mtime))
+        assert detector.has_changed(file_path)
+
+    def test_forget(self, tmpdir):
+        file_path = str(tmpdir.join('a.py'))
+        _write(file_path, 'a')
+        detector = FileChangeDetector()
+        detector.record(file_path)
+        detector.forget(file_path)
+        assert detector.has_changed(file_path)
+        os.remove(file_path)
+        detector.record(file_path)
+        assert detector.has_changed(file_path)
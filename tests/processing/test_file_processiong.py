@@ -1,11 +1,14 @@
 #coding: utf-8
 
 import os
+import time
 import logging
 
 from xTool.utils.file import list_py_file_paths
 from xTool.processing.file_processing import FileProcessorManager
 from xTool.processing.file_processing import BaseMultiprocessFileProcessor
+from xTool.processing.file_processing import FileProcessorPool
+from xTool.processing.change_detection import FileChangeDetector
 
 
 #logging.basicConfig(level=logging.INFO)
@@ -28,6 +31,50 @@ def processor_factory(file_path):
     return PrintMultiprocessFileProcessor(file_path)
 
 
+class StreamMultiprocessFileProcessor(BaseMultiprocessFileProcessor):
+    result_batch_size = 2
+
+    def process_file(self, file_path):
+        for i in range(5):
+            yield "{}:{}".format(file_path, i)
+        if file_path == 'wait.txt':
+            # 等待父进程取走部分结果
+            time.sleep(30)
+
+
+def stream_processor_factory(file_path):
+    return StreamMultiprocessFileProcessor(file_path)
+
+
+class HangMultiprocessFileProcessor(BaseMultiprocessFileProcessor):
+    def process_file(self, file_path):
+        if file_path == 'hang.txt':
+            time.sleep(60)
+        return [file_path]
+
+
+def hang_processor_factory(file_path):
+    return HangMultiprocessFileProcessor(file_path)
+
+
+def process_file(file_path):
+    if file_path == '1.txt':
+        raise Exception("I'm 1.txt")
+    if file_path == 'exit.txt':
+        os._exit(3)
+    return [file_path]
+
+
+def slow_process_file(file_path):
+    time.sleep(0.3)
+    return [file_path]
+
+
+def stream_process_file(file_path):
+    for i in range(3):
+        yield "{}:{}".format(file_path, i)
+
+
 class TestFileProcessorManager:
     def test_heartbeat(self):
         file_paths = list_py_file_paths(file_directory)
@@ -50,6 +97,8 @@ class TestFileProcessorManager:
         result = process_manager.heartbeat()
         assert process_manager.processing_count() == 0
         assert result == file_paths[:1]
+        assert process_manager.runtime_stats.file_stats(file_paths[0])['runs'] == 1
+        assert [f for f, _ in process_manager.slowest(1)] == file_paths[:1]
 
     def test_subprocess_exception(self):
         file_paths = ['1.txt', '2.txt']
@@ -72,3 +121,284 @@ class TestFileProcessorManager:
         result = process_manager.heartbeat()
         assert process_manager.processing_count() == 0
         assert result == ['2.txt']
+
+    def test_heartbeat_wait_timeout(self):
+        file_paths = ['2.txt']
+        parallelism = 1
+        process_file_interval = 1
+        min_file_parsing_loop_time = 1
+        max_runs = 1
+        process_manager = FileProcessorManager(file_directory,
+                             file_paths,
+                             parallelism,
+                             process_file_interval,
+                             min_file_parsing_loop_time,
+                             max_runs,
+                             processor_factory)
+        result = process_manager.heartbeat()
+        assert result == []
+        assert process_manager.processing_count() == 1
+
+        # 阻塞等待处理器完成，不需要调用 wait_until_finished
+        result = process_manager.heartbeat(timeout=30)
+        assert process_manager.processing_count() == 0
+        assert result == ['2.txt']
+
+    def test_file_priority(self):
+        file_paths = ['2.txt', '3.txt', '4.txt']
+        priorities = {'2.txt': 1, '3.txt': 3, '4.txt': 2}
+        process_manager = FileProcessorManager(file_directory,
+                             file_paths,
+                             1,
+                             1,
+                             1,
+                             1,
+                             processor_factory,
+                             file_priority=priorities.get)
+        process_manager.heartbeat()
+        assert list(process_manager._processors) == ['3.txt']
+        process_manager.wait_until_finished()
+        process_manager.heartbeat()
+        assert list(process_manager._processors) == ['4.txt']
+        process_manager.wait_until_finished()
+
+    def test_change_detector(self):
+        file_paths = [__file__]
+        change_detector = FileChangeDetector()
+        process_manager = FileProcessorManager(file_directory,
+                             file_paths,
+                             1,
+                             0,
+                             0,
+                             2,
+                             processor_factory,
+                             change_detector=change_detector)
+        process_manager.heartbeat()
+        assert process_manager.processing_count() == 1
+        result = process_manager.heartbeat(timeout=30)
+        assert result == file_paths
+        # 文件没有变化，不再处理
+        process_manager.heartbeat()
+        assert process_manager.processing_count() == 0
+        assert change_detector.counters == {'skipped': 1, 'processed': 1}
+        assert process_manager.max_runs_reached()
+
+    def test_stream_results(self):
+        process_manager = FileProcessorManager(file_directory,
+                             ['wait.txt'],
+                             1,
+                             1,
+                             1,
+                             1,
+                             stream_processor_factory,
+                             result_batch_size=3)
+        process_manager.heartbeat()
+        try:
+            # 处理器尚未结束，每次心跳最多返回 result_batch_size 个部分结果
+            result = []
+            while len(result) < 4:
+                items = process_manager.heartbeat(timeout=30)
+                assert 0 < len(items) <= 3
+                result.extend(items)
+            assert result == ['wait.txt:{}'.format(i) for i in range(4)]
+            assert process_manager.processing_count() == 1
+        finally:
+            process_manager.terminate()
+
+    def test_stream_results_finished(self):
+        process_manager = FileProcessorManager(file_directory,
+                             ['2.txt'],
+                             1,
+                             1,
+                             1,
+                             1,
+                             stream_processor_factory)
+        process_manager.heartbeat()
+        process_manager.wait_until_finished()
+        result = process_manager.heartbeat()
+        assert result == ['2.txt:{}'.format(i) for i in range(5)]
+        assert process_manager.processing_count() == 0
+
+    def test_file_timeout(self):
+        process_manager = FileProcessorManager(file_directory,
+                             ['hang.txt', '2.txt'],
+                             2,
+                             1,
+                             0,
+                             -1,
+                             hang_processor_factory,
+                             file_timeout=30,
+                             file_timeout_overrides={'hang.txt': 0.5})
+        process_manager.heartbeat()
+        processor = process_manager._processors['hang.txt']
+        start = time.time()
+        process_manager.wait_until_finished()
+        assert time.time() - start < 10
+        assert not processor._process.is_alive()
+        result = process_manager.heartbeat()
+        assert result == ['2.txt']
+        assert process_manager.get_timeout_count('hang.txt') == 1
+        assert process_manager.get_timeout_count('2.txt') == 0
+        # 超时的文件按指数退避再次调度
+        assert process_manager._file_path_schedule.priority('hang.txt') - time.time() > 1.5
+        process_manager.terminate()
+
+    def test_file_timeout_zero_interval(self):
+        process_manager = FileProcessorManager(file_directory,
+                             ['hang.txt'],
+                             1,
+                             0,
+                             0,
+                             -1,
+                             hang_processor_factory,
+                             file_timeout_overrides={'hang.txt': 0.5},
+                             max_timeout_backoff=1.5)
+        for timeout_count in (1, 2):
+            process_manager.heartbeat()
+            processor = process_manager._processors['hang.txt']
+            process_manager.wait_until_finished()
+            assert not processor._process.is_alive()
+            process_manager.heartbeat()
+            assert process_manager.get_timeout_count('hang.txt') == timeout_count
+            # 调度间隔为0时以最长执行时间作为退避的基数，不会立即重新调度
+            assert 'hang.txt' not in process_manager._processors
+            delay = process_manager._file_path_schedule.priority('hang.txt') - time.time()
+            assert 0.5 < delay <= min(0.5 * 2 ** timeout_count, 1.5)
+            time.sleep(delay)
+        process_manager.terminate()
+
+
+class TestFileProcessorPool:
+    def test_heartbeat(self):
+        pool = FileProcessorPool(process_file, 2)
+        pool.start()
+        try:
+            worker_pids = set(w.process.pid for w in pool._workers)
+            process_manager = FileProcessorManager(file_directory,
+                                 ['1.txt', '2.txt'],
+                                 2,
+                                 1,
+                                 1,
+                                 1,
+                                 pool.processor_factory)
+            result = process_manager.heartbeat()
+            assert result == []
+            assert process_manager.processing_count() == 2
+            assert set(process_manager.get_all_pids()) == worker_pids
+
+            process_manager.wait_until_finished()
+            result = process_manager.heartbeat()
+            assert process_manager.processing_count() == 0
+            assert result == ['2.txt']
+            # 工作进程被复用
+            assert set(w.process.pid for w in pool._workers) == worker_pids
+        finally:
+            pool.close()
+
+    def test_poll_own_worker(self):
+        pool = FileProcessorPool(process_file, 2)
+        pool.start()
+        try:
+            processor_2 = pool.processor_factory('2.txt')
+            processor_3 = pool.processor_factory('3.txt')
+            processor_2.start()
+            processor_3.start()
+            channel_3 = processor_3.waitables[0]
+            assert processor_2.waitables != processor_3.waitables
+            assert channel_3.poll(30)
+            while not processor_2.done:
+                time.sleep(0.01)
+            # 检查一个处理器不会取走其它处理器的消息
+            assert channel_3.poll(0)
+            assert processor_3.done
+            assert processor_3.result == ['3.txt']
+        finally:
+            pool.close()
+
+    def test_pending_processor(self):
+        pool = FileProcessorPool(process_file, 1)
+        pool.start()
+        try:
+            process_manager = FileProcessorManager(file_directory,
+                                 ['2.txt', '3.txt'],
+                                 2,
+                                 1,
+                                 1,
+                                 1,
+                                 pool.processor_factory)
+            process_manager.heartbeat()
+            assert process_manager.processing_count() == 2
+            # 等待分配工作进程的处理器没有进程ID
+            assert process_manager.get_all_pids() == [pool._workers[0].process.pid]
+            result = []
+            while process_manager.processing_count():
+                result.extend(process_manager.heartbeat(timeout=30))
+            assert sorted(result) == ['2.txt', '3.txt']
+        finally:
+            pool.close()
+
+    def test_worker_exit(self):
+        pool = FileProcessorPool(process_file, 1)
+        pool.start()
+        try:
+            process_manager = FileProcessorManager(file_directory,
+                                 ['exit.txt', '2.txt'],
+                                 1,
+                                 1,
+                                 1,
+                                 1,
+                                 pool.processor_factory)
+            process_manager.heartbeat()
+            processor = process_manager._processors['exit.txt']
+            result = process_manager.heartbeat(timeout=30)
+            assert result == []
+            assert processor.exit_code == 3
+            assert process_manager.processing_count() == 1
+            # 重启后的工作进程继续处理文件
+            result = process_manager.heartbeat(timeout=30)
+            assert result == ['2.txt']
+        finally:
+            pool.close()
+
+    def test_file_timeout(self):
+        pool = FileProcessorPool(slow_process_file, 1)
+        pool.start()
+        try:
+            process_manager = FileProcessorManager(file_directory,
+                                 ['2.txt'],
+                                 1,
+                                 1,
+                                 1,
+                                 1,
+                                 pool.processor_factory,
+                                 file_timeout=0.4)
+            process_manager.heartbeat()
+            # 处理器在超时之后才被检查，已经完成的处理器不能被丢失
+            time.sleep(0.6)
+            result = process_manager.heartbeat()
+            assert result == ['2.txt']
+            assert process_manager.processing_count() == 0
+            assert process_manager.get_timeout_count('2.txt') == 0
+            assert process_manager.get_last_runtime('2.txt') is not None
+            assert not process_manager._processor_deadlines
+        finally:
+            pool.close()
+
+    def test_stream_results(self):
+        pool = FileProcessorPool(stream_process_file, 1, result_batch_size=1)
+        pool.start()
+        try:
+            process_manager = FileProcessorManager(file_directory,
+                                 ['2.txt'],
+                                 1,
+                                 1,
+                                 1,
+                                 1,
+                                 pool.processor_factory)
+            process_manager.heartbeat()
+            result = []
+            while process_manager.processing_count():
+                result.extend(process_manager.heartbeat(timeout=30))
+            assert result == ['2.txt:0', '2.txt:1', '2.txt:2']
+        finally:
+            pool.close()
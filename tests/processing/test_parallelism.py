@@ -0,0 +1,130 @@
+#coding: utf-8
+
+import pytest
+
+from xTool.exceptions import XToolException
+from xTool.processing.file_processing import FileProcessorManager
+from xTool.processing.parallelism import ParallelismController
+
+
+class RecordingStats(object):
+    def __init__(self):
+        self.gauges = {}
+        self.counters = {}
+
+    def incr(self, stat, count=1, rate=1):
+        self.counters[stat] = self.counters.get(stat, 0) + count
+
+    def gauge(self, stat, value, rate=1, delta=False):
+        self.gauges[stat] = value
+
+
+class FixedParallelismController(ParallelismController):
+    load = 0.1
+    memory = 10
+
+    def load_per_cpu(self):
+        return self.load
+
+    def memory_percent(self):
+        return self.memory
+
+
+class TestParallelismController:
+    def test_invalid_range(self):
+        with pytest.raises(XToolException):
+            ParallelismController(min_parallelism=3, max_parallelism=2)
+
+    def test_backlog(self):
+        stats = RecordingStats()
+        controller = FixedParallelismController(1, 4, step=2, cooldown=0,
+                                                stats_client=stats)
+        # 没有历史执行时长时，有积压就提高并发度
+        assert controller.adjust(1, 10, None, 1) == 3
+        assert controller.last_decision.reason == 'backlog'
+        # 达到最大并发度
+        assert controller.adjust(3, 10, None, 1) == 4
+        assert controller.adjust(4, 10, None, 1) == 4
+        assert controller.last_decision.reason == 'steady'
+        assert stats.gauges['file_processor.parallelism'] == 4
+        assert stats.counters['file_processor.parallelism_decision.backlog'] == 2
+        assert stats.counters['file_processor.parallelism_decision.steady'] == 1
+
+    def test_demand(self):
+        controller = FixedParallelismController(1, 8, cooldown=0)
+        # 在1秒内处理完所有文件需要2个处理器
+        assert controller.adjust(1, 5, 1.5, 1) == 2
+        assert controller.adjust(2, 5, 1.5, 1) == 2
+        assert controller.last_decision.demand == 2
+        # 没有积压时降低到需求
+        assert controller.adjust(4, 0, 1.5, 1) == 3
+        assert controller.last_decision.reason == 'idle'
+
+    def test_resources(self):
+        controller = FixedParallelismController(2, 8, cooldown=0)
+        controller.memory = 95
+        assert controller.adjust(4, 10, None, 1) == 3
+        assert controller.last_decision.reason == 'memory'
+        controller.memory = 10
+        controller.load = 2
+        assert controller.adjust(3, 10, None, 1) == 2
+        assert controller.last_decision.reason == 'load'
+        # 不会低于最小并发度
+        assert controller.adjust(2, 10, None, 1) == 2
+
+    def test_cooldown(self):
+        controller = FixedParallelismController(1, 8, cooldown=60)
+        assert controller.adjust(1, 10, None, 1) == 2
+        # 两次调整之间的间隔太短，保持不变
+        assert controller.adjust(2, 10, None, 1) == 2
+        assert controller.last_decision.reason == 'cooldown'
+        controller.load = 2
+        assert controller.adjust(2, 10, None, 1) == 2
+        assert controller.last_decision.reason == 'cooldown'
+        # 内存不足时不受冷却时间的限制
+        controller.memory = 95
+        assert controller.adjust(2, 10, None, 1) == 1
+        assert controller.last_decision.reason == 'memory'
+        controller.memory = 10
+        controller.load = 0.1
+        controller._last_adjust_time -= 61
+        assert controller.adjust(1, 10, None, 1) == 2
+        assert controller.last_decision.reason == 'backlog'
+
+    def test_manager(self):
+        controller = FixedParallelismController(1, 3)
+        process_manager = FileProcessorManager(None,
+                             [],
+                             4,
+                             1,
+                             0,
+                             1,
+                             None,
+                             parallelism_controller=controller)
+        # 初始并发度被限制在最大并发度以内
+        assert process_manager.parallelism == 3
+        controller.memory = 95
+        process_manager.heartbeat()
+        assert process_manager.parallelism == 2
+        assert controller.last_decision.reason == 'memory'
+
+    def test_manager_total_runtime(self):
+        process_manager = FileProcessorManager(None,
+                             ['a.py', 'b.py'],
+                             1,
+                             1,
+                             0,
+                             1,
+                             None)
+        assert process_manager._total_runtime() is None
+        process_manager._set_last_runtime('a.py', 1.5)
+        process_manager._set_last_runtime('b.py', 2)
+        process_manager._set_last_runtime('a.py', 0.5)
+        assert process_manager._total_runtime() == 2.5
+        # 删除的文件不计入需求
+        process_manager.remove_file_paths(['b.py'])
+        assert process_manager._total_runtime() == 0.5
+        process_manager.add_file_paths(['b.py'])
+        assert process_manager._total_runtime() == 2.5
+        process_manager.remove_file_paths(['a.py', 'b.py'])
+        assert process_manager._total_runtime() is None
@@ -0,0 +1,85 @@
+#coding: utf-8
+
+import pytest
+
+from xTool.processing.runtime_stats import FileRuntimeStats
+
+
+class RecordingStats(object):
+    def __init__(self):
+        self.gauges = {}
+
+    def gauge(self, stat, value, rate=1, delta=False):
+        self.gauges[stat] = value
+
+
+class TestFileRuntimeStats:
+    def test_file_stats(self):
+        runtime_stats = FileRuntimeStats(window=100)
+        assert runtime_stats.file_stats('a.py') is None
+        for i in range(1, 101):
+            runtime_stats.record('a.py', float(i))
+        stats = runtime_stats.file_stats('a.py')
+        assert stats == {
+            'count': 100,
+            'runs': 100,
+            'mean': 50.5,
+            'p50': 50.0,
+            'p95': 95.0,
+            'p99': 99.0,
+            'max': 100.0,
+        }
+
+    def test_window(self):
+        runtime_stats = FileRuntimeStats(window=3)
+        for runtime in [10, 1, 2, 3]:
+            runtime_stats.record('a.py', runtime)
+        stats = runtime_stats.file_stats('a.py')
+        # 只保留最近3次的执行时长
+        assert stats['count'] == 3
+        assert stats['runs'] == 4
+        assert stats['max'] == 3
+        assert stats['mean'] == 2
+
+        with pytest.raises(ValueError):
+            FileRuntimeStats(window=0)
+
+    def test_slowest(self):
+        runtime_stats = FileRuntimeStats()
+        runtime_stats.record('a.py', 1)
+        runtime_stats.record('b.py', 3)
+        runtime_stats.record('c.py', 2)
+        assert [f for f, _ in runtime_stats.slowest(2)] == ['b.py', 'c.py']
+        runtime_stats.forget('b.py')
+        assert 'b.py' not in runtime_stats
+        assert sorted(runtime_stats.stats()) == ['a.py', 'c.py']
+
+    def test_emit(self):
+        runtime_stats = FileRuntimeStats()
+        runtime_stats.record('/dags/a.b.py', 1)
+        runtime_stats.record('/dags/c.py', 2)
+        stats_client = RecordingStats()
+        runtime_stats.emit(stats_client, n=1, base_directory='/dags')
+        assert stats_client.gauges == {
+            'file_processor.runtime.files': 2,
+            'file_processor.runtime.total_mean': 3,
+            'file_processor.runtime.c.mean': 2,
+            'file_processor.runtime.c.p95': 2,
+            'file_processor.runtime.c.max': 2,
+        }
+
+    def test_emit_same_file_name(self):
+        runtime_stats = FileRuntimeStats()
+        runtime_stats.record('/dags/a/dag.py', 1)
+        runtime_stats.record('/dags/b/dag.py', 2)
+        runtime_stats.record('/dags/b/a.b.py', 3)
+        stats_client = RecordingStats()
+        runtime_stats.emit(stats_client, n=3, base_directory='/dags/')
+        # 不同目录下的同名文件使用不同的指标
+        assert stats_client.gauges['file_processor.runtime.a.dag.mean'] == 1
+        assert stats_client.gauges['file_processor.runtime.b.dag.mean'] == 2
+        assert stats_client.gauges['file_processor.runtime.b.a_b.mean'] == 3
+        # 没有根目录时使用完整路径
+        stats_client = RecordingStats()
+        runtime_stats.emit(stats_client, n=1)
+        assert 'file_processor.runtime.dags.b.a_b.mean' in stats_client.gauges
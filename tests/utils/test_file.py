@@ -0,0 +1,67 @@
+#coding: utf-8
+
+import os
+import zipfile
+
+from xTool.utils.file import list_py_file_paths
+
+
+def _write(path, content='xTool XTool'):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _make_tree(directory):
+    _write(os.path.join(directory, 'a.py'))
+    _write(os.path.join(directory, 'a.txt'))
+    _write(os.path.join(directory, 'plain.py'), 'print(1)')
+    _write(os.path.join(directory, 'skip', 'b.py'))
+    _write(os.path.join(directory, 'sub', '.ignore'), 'ignored\n')
+    _write(os.path.join(directory, 'sub', 'c.py'))
+    _write(os.path.join(directory, 'sub', 'ignored.py'))
+    _write(os.path.join(directory, 'sub', 'ignored_dir', 'd.py'))
+    _write(os.path.join(directory, 'other', 'ignored.py'))
+    with zipfile.ZipFile(os.path.join(directory, 'e.zip'), 'w') as z:
+        z.writestr('e.py', 'xTool')
+    _write(os.path.join(directory, '.ignore'), 'skip\n')
+
+
+def test_list_py_file_paths(tmpdir):
+    directory = str(tmpdir)
+    _make_tree(directory)
+    file_paths = list_py_file_paths(directory)
+    expected = [
+        os.path.join(directory, 'a.py'),
+        os.path.join(directory, 'plain.py'),
+        os.path.join(directory, 'e.zip'),
+        os.path.join(directory, 'sub', 'c.py'),
+        # 忽略规则只作用于所在目录及其子目录
+        os.path.join(directory, 'other', 'ignored.py'),
+    ]
+    assert sorted(file_paths) == sorted(expected)
+    assert list_py_file_paths(None) == []
+    assert list_py_file_paths(expected[0]) == [expected[0]]
+
+
+def test_list_py_file_paths_safe_mode(tmpdir):
+    directory = str(tmpdir)
+    _make_tree(directory)
+    file_paths = list_py_file_paths(directory, safe_mode=True)
+    assert os.path.join(directory, 'plain.py') not in file_paths
+    assert os.path.join(directory, 'a.py') in file_paths
+
+    _write(os.path.join(directory, 'late.py'), ' ' * 100 + 'xTool XTool')
+    file_paths = list_py_file_paths(directory, safe_mode=True,
+                                    safe_mode_max_bytes=64)
+    assert os.path.join(directory, 'late.py') not in file_paths
+    assert os.path.join(directory, 'a.py') in file_paths
+
+
+def test_list_py_file_paths_max_workers(tmpdir):
+    directory = str(tmpdir)
+    _make_tree(directory)
+    assert (list_py_file_paths(directory, safe_mode=True, max_workers=4) ==
+            list_py_file_paths(directory, safe_mode=True))
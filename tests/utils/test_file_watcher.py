@@ -0,0 +1,99 @@
+#coding: utf-8
+
+import os
+import shutil
+
+import pytest
+
+from xTool.utils.file_watcher import DirectoryWatcher
+
+
+def _write(path, content='xTool'):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class FakeManager(object):
+    def __init__(self):
+        self.file_paths = set()
+
+    def add_file_paths(self, file_paths):
+        self.file_paths.update(file_paths)
+
+    def remove_file_paths(self, file_paths):
+        self.file_paths.difference_update(file_paths)
+
+
+@pytest.fixture(params=[True, False], ids=['inotify', 'polling'])
+def use_inotify(request):
+    return request.param
+
+
+class TestDirectoryWatcher:
+    def test_poll(self, tmpdir, use_inotify):
+        directory = str(tmpdir)
+        a = os.path.join(directory, 'a.py')
+        _write(a)
+        _write(os.path.join(directory, 'a.txt'))
+        watcher = DirectoryWatcher(directory, use_inotify=use_inotify)
+        try:
+            assert watcher.file_paths == {a}
+            assert watcher.poll() == (set(), set())
+
+            b = os.path.join(directory, 'b.py')
+            _write(b)
+            assert watcher.poll() == ({b}, set())
+
+            os.remove(a)
+            assert watcher.poll() == (set(), {a})
+
+            sub_directory = os.path.join(directory, 'sub')
+            os.mkdir(sub_directory)
+            c = os.path.join(sub_directory, 'c.py')
+            _write(c)
+            assert watcher.poll() == ({c}, set())
+
+            shutil.rmtree(sub_directory)
+            assert watcher.poll() == (set(), {c})
+            assert watcher.file_paths == {b}
+        finally:
+            watcher.close()
+
+    def test_ignore_file(self, tmpdir, use_inotify):
+        directory = str(tmpdir)
+        a = os.path.join(directory, 'a.py')
+        _write(a)
+        watcher = DirectoryWatcher(directory, use_inotify=use_inotify)
+        try:
+            _write(os.path.join(directory, '.ignore'), 'a.py\n')
+            assert watcher.poll() == (set(), {a})
+        finally:
+            watcher.close()
+
+    def test_safe_mode(self, tmpdir, use_inotify):
+        directory = str(tmpdir)
+        a = os.path.join(directory, 'a.py')
+        _write(a, '')
+        watcher = DirectoryWatcher(directory, safe_mode=True,
+                                   use_inotify=use_inotify)
+        try:
+            assert watcher.file_paths == set()
+            _write(a, 'xTool XTool')
+            assert watcher.poll() == ({a}, set())
+        finally:
+            watcher.close()
+
+    def test_sync(self, tmpdir, use_inotify):
+        directory = str(tmpdir)
+        a = os.path.join(directory, 'a.py')
+        _write(a)
+        watcher = DirectoryWatcher(directory, use_inotify=use_inotify)
+        manager = FakeManager()
+        manager.add_file_paths(watcher.file_paths)
+        try:
+            b = os.path.join(directory, 'b.py')
+            os.rename(a, b)
+            watcher.sync(manager)
+            assert manager.file_paths == {b}
+        finally:
+            watcher.close()
@@ -1,6 +1,10 @@
 #coding: utf-8
 
 import os
+import signal
+import subprocess
+import sys
+import time
 
 from xTool.utils import processes
 
@@ -9,3 +13,22 @@ def test_which():
     values = processes.which('Lib', path=None)
     for executable_path in values:
         assert os.access(executable_path, os.X_OK)
+
+
+def test_wait_for_pid():
+    start_time = time.time()
+    process = subprocess.Popen([sys.executable, '-c', 'x = bytearray(32 * 2 ** 20)'])
+    usage = processes.wait_for_pid(process.pid, start_time)
+    process.returncode = usage.exit_code
+    assert usage.exit_code == 0
+    assert usage.exit_signal is None
+    assert usage.wall_time > 0
+    assert usage.max_rss >= 32 * 2 ** 20
+
+    process = subprocess.Popen(['sleep', '10'])
+    os.kill(process.pid, signal.SIGKILL)
+    usage = processes.wait_for_pid(process.pid)
+    process.returncode = usage.exit_code
+    assert usage.exit_code == -signal.SIGKILL
+    assert usage.exit_signal == signal.SIGKILL
+    assert usage.wall_time is None
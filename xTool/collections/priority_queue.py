@@ -0,0 +1,119 @@
+#coding: utf-8
+
+"""
+带索引的优先级队列
+"""
+
+import heapq
+import itertools
+
+
+class PriorityQueue(object):
+    """基于最小堆的优先级队列
+
+    - 通过key索引堆中的节点，成员判断是O(1)
+    - 入队、出队、更新优先级都是O(log n)
+    - 删除采用惰性删除，被删除的节点在出队时丢弃
+    - 优先级相同时，按照入队的顺序出队
+
+    >>> q = PriorityQueue()
+    >>> q.push('a', 2)
+    >>> q.push('b', 1)
+    >>> 'a' in q
+    True
+    >>> q.pop()
+    ('b', 1)
+    >>> len(q)
+    1
+    """
+
+    # 被删除节点的占位符
+    _REMOVED = object()
+
+    def __init__(self):
+        # 堆中的节点是 [priority, count, key]
+        self._heap = []
+        # key => 堆中的节点
+        self._entries = {}
+        # 入队计数器，保证相同优先级的节点按照入队的顺序出队
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        """遍历队列中的key，不保证顺序 ."""
+        return iter(list(self._entries))
+
+    def push(self, key, priority):
+        """入队，如果key已经在队列中，则更新它的优先级 ."""
+        updated = key in self._entries
+        if updated:
+            self._remove_entry(key)
+        entry = [priority, next(self._counter), key]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if updated:
+            self._compact()
+
+    def remove(self, key):
+        """删除key，如果key不存在抛出KeyError ."""
+        self._remove_entry(key)
+        self._compact()
+
+    def discard(self, key):
+        """删除key，如果key不存在则忽略 ."""
+        if key in self._entries:
+            self.remove(key)
+
+    def priority(self, key):
+        """获得key的优先级 ."""
+        return self._entries[key][0]
+
+    def peek(self):
+        """返回优先级最小的 (key, priority)，但不出队 ."""
+        self._prune()
+        if not self._heap:
+            raise KeyError("peek from an empty priority queue")
+        priority, _, key = self._heap[0]
+        return key, priority
+
+    def pop(self):
+        """出队优先级最小的 (key, priority) ."""
+        self._prune()
+        if not self._heap:
+            raise KeyError("pop from an empty priority queue")
+        priority, _, key = heapq.heappop(self._heap)
+        del self._entries[key]
+        return key, priority
+
+    def clear(self):
+        """清空队列 ."""
+        self._heap = []
+        self._entries = {}
+
+    def _remove_entry(self, key):
+        """将堆中的节点标记为已删除 ."""
+        entry = self._entries.pop(key)
+        entry[-1] = self._REMOVED
+
+    def _prune(self):
+        """丢弃堆顶已被删除的节点 ."""
+        heap = self._heap
+        while heap and heap[0][-1] is self._REMOVED:
+            heapq.heappop(heap)
+
+    def _compact(self):
+        """已删除的节点过多时重建堆，防止堆无限增长 ."""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap
+                          if entry[-1] is not self._REMOVED]
+            heapq.heapify(self._heap)
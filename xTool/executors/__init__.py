@@ -65,6 +65,12 @@ def _get_executor(executor_name):
     elif executor_name == 'DaskExecutor':
         from xTool.executors.dask_executor import DaskExecutor
         return DaskExecutor()
+    elif executor_name == 'ThreadExecutor':
+        from xTool.executors.thread_executor import ThreadExecutor
+        return ThreadExecutor()
+    elif executor_name == 'AsyncioExecutor':
+        from xTool.executors.asyncio_executor import AsyncioExecutor
+        return AsyncioExecutor()
     else:
         # 使用第三方executor
         # Loading plugins
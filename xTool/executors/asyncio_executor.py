@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+AsyncioExecutor 在一个后台线程的事件循环中使用 asyncio 子进程执行命令，
+一个线程即可同时管理成千上万个正在运行的命令，命令的标准输出和标准错误按行实时写入日志。
+"""
+
+import asyncio
+from collections import deque
+import concurrent.futures
+import os
+import signal
+import threading
+
+from xTool.executors.base_executor import BaseExecutor
+from xTool.executors.base_executor import PARALLELISM
+from xTool.utils.state import State
+
+
+class AsyncioExecutor(BaseExecutor):
+    """asyncio 子进程执行器
+
+    - argv 列表形式的命令使用 create_subprocess_exec 执行，不经过 shell
+    - 字符串形式的命令使用 create_subprocess_shell 执行
+    - 子进程在新的进程组中运行，杀死命令时同时杀死 shell 启动的所有子进程
+    - 事件循环线程把执行结果放到 deque 中，sync() 不阻塞地取出结果并调用 change_state
+    """
+
+    # 读取子进程输出时每行的最大长度
+    stream_limit = 2 ** 20
+
+    def __init__(self, parallelism=PARALLELISM, max_concurrency=None, **kwargs):
+        """
+        :param max_concurrency: 同时运行的子进程的最大数量，默认等于 parallelism，
+            parallelism 为0时不限制
+        :type max_concurrency: int
+        """
+        super(AsyncioExecutor, self).__init__(parallelism=parallelism, **kwargs)
+        if max_concurrency is None and parallelism:
+            max_concurrency = parallelism
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        # 正在执行的任务 key => concurrent.futures.Future
+        self._futures = {}
+        # 正在运行的子进程 key => asyncio.subprocess.Process，只在事件循环线程中访问
+        self._processes = {}
+        # 已完成的任务 (key, state)，由事件循环线程写入
+        self._results = deque()
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop,
+                                        name="AsyncioExecutor-loop")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        # 信号量需要在事件循环所在的线程中创建
+        if self.max_concurrency:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop.run_forever()
+
+    async def _stream(self, key, stream, name):
+        """将子进程的输出按行写入日志
+
+        超过 stream_limit 的行分块写入日志，不会因为 LimitOverrunError 停止读取输出
+        """
+        while True:
+            try:
+                line = await stream.readuntil(b'\n')
+            except asyncio.IncompleteReadError as e:
+                # 输出结束，最后一行没有换行符
+                line = e.partial
+            except asyncio.LimitOverrunError:
+                line = await stream.read(self.stream_limit)
+            if not line:
+                break
+            self.log.info("[%s] %s: %s", key, name,
+                          line.decode('utf-8', 'replace').rstrip())
+
+    async def _execute(self, key, command):
+        """在事件循环中执行命令，返回任务的状态 ."""
+        self.log.info("%s running %s", self.__class__.__name__, command)
+        if isinstance(command, (list, tuple)):
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=self.stream_limit,
+                start_new_session=True)
+        else:
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=self.stream_limit,
+                start_new_session=True)
+        self._processes[key] = process
+        try:
+            await asyncio.gather(self._stream(key, process.stdout, 'stdout'),
+                                 self._stream(key, process.stderr, 'stderr'))
+            returncode = await process.wait()
+        finally:
+            self._processes.pop(key, None)
+            if process.returncode is None:
+                # 读取输出失败或者被取消时，不留下仍在运行的子进程
+                self._kill(process)
+                await process.wait()
+        if returncode != 0:
+            self.log.error("Failed to execute task %s, return code %s.",
+                           key, returncode)
+            return State.FAILED
+        return State.SUCCESS
+
+    @staticmethod
+    def _kill(process):
+        """杀死子进程所在的进程组 ."""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def _run(self, key, command):
+        try:
+            if self._semaphore is None:
+                state = await self._execute(key, command)
+            else:
+                async with self._semaphore:
+                    state = await self._execute(key, command)
+        except Exception as e:
+            self.log.error("Failed to execute task %s: %s", key, e)
+            state = State.FAILED
+        self._results.append((key, state))
+
+    def execute_async(self, key, command, queue=None):
+        self._futures[key] = asyncio.run_coroutine_threadsafe(
+            self._run(key, command), self._loop)
+
+    def sync(self):
+        """取出所有已完成的任务，不会阻塞 ."""
+        while True:
+            try:
+                key, state = self._results.popleft()
+            except IndexError:
+                break
+            self._futures.pop(key, None)
+            self.change_state(key, state)
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def end(self):
+        """等待所有的任务执行完成 ."""
+        concurrent.futures.wait(list(self._futures.values()))
+        self.sync()
+        self._stop_loop()
+
+    def terminate(self):
+        """杀死所有正在运行的子进程 ."""
+        def kill_all():
+            for process in list(self._processes.values()):
+                if process.returncode is None:
+                    self._kill(process)
+        self._loop.call_soon_threadsafe(kill_all)
+        concurrent.futures.wait(list(self._futures.values()), timeout=10)
+        self.sync()
+        self._stop_loop()
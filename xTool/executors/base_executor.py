@@ -11,18 +11,120 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from builtins import range
+from collections import defaultdict, OrderedDict
+import itertools
 
 from xTool import configuration
+from xTool.collections.priority_queue import PriorityQueue
+from xTool.decorators.db import create_session
+from xTool.stats.stats_logger import DummyStatsLogger
+from xTool.utils import helpers
 from xTool.utils.log.logging_mixin import LoggingMixin
+from xTool.utils.processes import ResourceUsage
 from xTool.utils.state import State
 
 PARALLELISM = configuration.getint('core', 'PARALLELISM')
 
 
+class EventBuffer(dict):
+    """任务实例的状态变更事件 key => state
+
+    是一个真正的 dict，直接修改 executor.event_buffer 的代码仍然有效；
+    同时按 dag_id 维护事件的索引 dag_id => {key: info}，获取和清除一个dag的事件只需要访问该dag的事件。
+    info 是任务的附加信息，例如 ResourceUsage 类型的资源使用情况
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(EventBuffer, self).__init__()
+        # :type : OrderedDict[unicode, OrderedDict]
+        self._dag_events = OrderedDict()
+        self.update(*args, **kwargs)
+
+    def add(self, key, state, info=None):
+        """记录事件，任务实例的唯一key的第一部分是 dag_id ."""
+        dict.__setitem__(self, key, state)
+        dag_events = self._dag_events.get(key[0])
+        if dag_events is None:
+            dag_events = self._dag_events[key[0]] = OrderedDict()
+        dag_events[key] = info
+
+    def _discard_index(self, key):
+        dag_events = self._dag_events.get(key[0])
+        if dag_events is not None:
+            dag_events.pop(key, None)
+            if not dag_events:
+                del self._dag_events[key[0]]
+
+    def __setitem__(self, key, state):
+        self.add(key, state)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._discard_index(key)
+
+    def pop(self, key, *args):
+        if key not in self:
+            return dict.pop(self, key, *args)
+        state = dict.pop(self, key)
+        self._discard_index(key)
+        return state
+
+    def popitem(self):
+        key, state = dict.popitem(self)
+        self._discard_index(key)
+        return key, state
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.add(key, default)
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, state in dict(*args, **kwargs).items():
+            self.add(key, state)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        dict.clear(self)
+        self._dag_events.clear()
+
+    def pop_dag(self, dag_id):
+        """删除并返回一个dag的事件 [(key, state, info)] ."""
+        dag_events = self._dag_events.pop(dag_id, None) or {}
+        return [(key, dict.pop(self, key), info)
+                for key, info in dag_events.items()]
+
+    def pop_all(self):
+        """删除并返回所有的事件 [(key, state, info)] ."""
+        events = [(key, dict.__getitem__(self, key), info)
+                  for dag_events in self._dag_events.values()
+                  for key, info in dag_events.items()]
+        self.clear()
+        return events
+
+    def pop_oldest(self, max_items):
+        """按事件发生的先后顺序（以dag为单位），删除并返回最多 max_items 个事件 ."""
+        events = []
+        while self._dag_events and len(events) < max_items:
+            dag_id, dag_events = next(iter(self._dag_events.items()))
+            while dag_events and len(events) < max_items:
+                key, info = dag_events.popitem(last=False)
+                events.append((key, dict.pop(self, key), info))
+            if not dag_events:
+                del self._dag_events[dag_id]
+        return events
+
+
 class BaseExecutor(LoggingMixin):
 
-    def __init__(self, parallelism=PARALLELISM):
+    # 批量查询任务实例状态时，每条SQL最多包含的任务实例数量
+    max_tis_per_query = 512
+
+    def __init__(self, parallelism=PARALLELISM, queue_weights=None,
+                 queue_slots=None, pool_slots=None, stats_client=None):
         """
         Class to derive in order to interface with executor-type systems
         like Celery, Mesos, Yarn and the likes.
@@ -30,12 +132,38 @@ class BaseExecutor(LoggingMixin):
         :param parallelism: how many jobs should run at one time. Set to
             ``0`` for infinity
         :type parallelism: int
+        :param queue_weights: 队列的权重，空闲的slot按权重在有任务的队列之间公平分配，默认权重是1
+        :type queue_weights: dict[unicode, float]
+        :param queue_slots: 每个队列同时运行的最大任务数量，不在字典中的队列只受 parallelism 限制
+        :type queue_slots: dict[unicode, int]
+        :param pool_slots: 每个池同时运行的最大任务数量，任务实例的池是 task_instance.pool
+        :type pool_slots: dict[unicode, int]
+        :param stats_client: 统计客户端，每次心跳发送每个队列的空闲slot数量
         """
         # 同一时间运行多少个job，0表示无限多
         self.parallelism = parallelism
+        self.queue_weights = dict(queue_weights or {})
+        self.queue_slots = dict(queue_slots or {})
+        self.pool_slots = dict(pool_slots or {})
+        self._stats_client = stats_client or DummyStatsLogger
+        # 等待执行的任务实例 key => (command, priority, queue, task_instance)
         self.queued_tasks = {}
+        # 等待执行的任务实例按 (队列, 池) 分组，每组是按优先级排序的堆，是 queued_tasks 的索引
+        # 入队和出队都是O(log n)，不需要在每次心跳时重新排序
+        # :type : dict[unicode, dict[unicode, PriorityQueue]]
+        self._task_queues = {}
+        # 队列的虚拟时间，每调度一个任务增加 1 / 权重，虚拟时间最小的队列先调度
+        self._queue_pass = {}
+        # 队列创建的顺序，虚拟时间相同时先创建的队列先调度
+        self._queue_order = {}
+        self._queue_counter = itertools.count()
         self.running = {}
-        self.event_buffer = {}
+        # 正在运行的任务实例 key => (队列, 池)
+        self._running_slots = {}
+        self._running_by_queue = defaultdict(int)
+        self._running_by_pool = defaultdict(int)
+        # 任务实例的状态变更事件，同时按 dag_id 建立索引
+        self._event_buffer = EventBuffer()
 
     def start(self):  # pragma: no cover
         """
@@ -52,6 +180,7 @@ class BaseExecutor(LoggingMixin):
         if key not in self.queued_tasks and key not in self.running:
             self.log.info("Adding to queue: %s", command)
             self.queued_tasks[key] = (command, priority, queue, task_instance)
+            self._push_queued_task(key, priority, queue, task_instance)
 
     def queue_task_instance(
             self,
@@ -98,6 +227,184 @@ class BaseExecutor(LoggingMixin):
         if task_instance.key in self.queued_tasks or task_instance.key in self.running:
             return True
 
+    @staticmethod
+    def _get_pool(task_instance):
+        """获得任务实例所属的池 ."""
+        return getattr(task_instance, 'pool', None)
+
+    def _queue_has_tasks(self, queue):
+        """判断队列中是否还有等待执行的任务 ."""
+        return any(self._peek_queued_task(task_queue) is not None
+                   for task_queue in self._task_queues.get(queue, {}).values())
+
+    def _activate_queue(self, queue):
+        """队列从空变为非空时，虚拟时间至少从有任务的队列中最小的虚拟时间开始
+
+        空闲的队列的虚拟时间不会增长，如果保留旧的虚拟时间，重新有任务时会占用所有的slot，
+        直到追上其它队列
+        """
+        active_passes = [self._queue_pass[q] for q in self._task_queues
+                         if q != queue and self._queue_has_tasks(q)]
+        if active_passes:
+            self._queue_pass[queue] = max(self._queue_pass.get(queue, 0),
+                                          min(active_passes))
+        else:
+            self._queue_pass.setdefault(queue, 0)
+
+    def _push_queued_task(self, key, priority, queue, task_instance,
+                          activate=True):
+        """将任务加入 (队列, 池) 对应的堆
+
+        :param activate: 队列从空变为非空时是否调整队列的虚拟时间，重建索引时不需要调整
+        """
+        pools = self._task_queues.get(queue)
+        if pools is None:
+            pools = self._task_queues[queue] = {}
+            self._queue_order[queue] = next(self._queue_counter)
+            self._activate_queue(queue)
+        elif activate and not self._queue_has_tasks(queue):
+            self._activate_queue(queue)
+        pool = self._get_pool(task_instance)
+        task_queue = pools.get(pool)
+        if task_queue is None:
+            task_queue = pools[pool] = PriorityQueue()
+        # 优先级大的任务先出队
+        task_queue.push(key, -priority)
+
+    def _sync_task_queue(self):
+        """queued_tasks 被外部直接修改时，重建优先级队列
+
+        从 queued_tasks 中删除的任务在出队时被丢弃，只有新增的任务需要重建索引
+        """
+        indexed = sum(len(task_queue)
+                      for pools in self._task_queues.values()
+                      for task_queue in pools.values())
+        if indexed == len(self.queued_tasks):
+            return
+        for pools in self._task_queues.values():
+            pools.clear()
+        for key, (_, priority, queue, ti) in self.queued_tasks.items():
+            self._push_queued_task(key, priority, queue, ti, activate=False)
+
+    def _peek_queued_task(self, task_queue):
+        """获得堆中优先级最高且仍在 queued_tasks 中的任务 ."""
+        while task_queue:
+            key, priority = task_queue.peek()
+            # 惰性删除：已经不在 queued_tasks 中的任务直接丢弃
+            if key in self.queued_tasks:
+                return key, priority
+            task_queue.pop()
+        return None
+
+    def _has_open_slots(self, used, running, slots, name):
+        """判断队列或池是否还有空闲的slot ."""
+        limit = slots.get(name)
+        return limit is None or running[name] + used[name] < limit
+
+    def _select_queued_tasks(self, open_slots):
+        """按队列的权重公平地选择最多 open_slots 个任务
+
+        每次选择虚拟时间最小且未达到上限的队列，在该队列中选择所属池未达到上限的、
+        优先级最高的任务。选择k个任务的时间复杂度是 O(k * (队列数 + 池数 + log n))
+
+        :return: [(key, (command, priority, queue, task_instance))]
+        """
+        selected = []
+        queue_used = defaultdict(int)
+        pool_used = defaultdict(int)
+        active_queues = set(self._task_queues)
+        while len(selected) < open_slots and active_queues:
+            queue = min(active_queues,
+                        key=lambda q: (self._queue_pass[q], self._queue_order[q]))
+            if not self._has_open_slots(queue_used, self._running_by_queue,
+                                        self.queue_slots, queue):
+                active_queues.discard(queue)
+                continue
+            # 选择队列中所属池未满的、优先级最高的任务
+            best = None
+            for pool, task_queue in self._task_queues[queue].items():
+                if not self._has_open_slots(pool_used, self._running_by_pool,
+                                            self.pool_slots, pool):
+                    continue
+                top = self._peek_queued_task(task_queue)
+                if top is not None and (best is None or top[1] < best[2]):
+                    best = (pool, task_queue, top[1])
+            if best is None:
+                active_queues.discard(queue)
+                continue
+            pool, task_queue, _ = best
+            key, _ = task_queue.pop()
+            selected.append((key, self.queued_tasks.pop(key)))
+            queue_used[queue] += 1
+            pool_used[pool] += 1
+            self._queue_pass[queue] += 1.0 / self.queue_weights.get(queue, 1)
+        return selected
+
+    def _emit_open_slots(self, open_slots):
+        """发送每个队列的空闲slot数量 ."""
+        self._stats_client.gauge('executor.open_slots', open_slots)
+        self._stats_client.gauge('executor.queued_tasks', len(self.queued_tasks))
+        self._stats_client.gauge('executor.running_tasks', len(self.running))
+        for queue in self._task_queues:
+            queue_open_slots = open_slots
+            if queue in self.queue_slots:
+                queue_open_slots = min(
+                    open_slots,
+                    self.queue_slots[queue] - self._running_by_queue[queue])
+            self._stats_client.gauge(
+                'executor.open_slots.{}'.format(queue or 'default'),
+                max(queue_open_slots, 0))
+
+    def fetch_task_instance_states(self, task_instances):
+        """批量获取任务实例的最新状态，并更新任务实例对象的 state 属性
+
+        任务实例是 SQLAlchemy 模型时，使用分片的 IN 查询一次获取所有任务实例的状态；
+        否则逐个调用 refresh_from_db。没有 ORM 的执行器可以覆盖此方法
+
+        :param task_instances: 任务实例列表
+        :return: dict[key, state]
+        """
+        if not task_instances:
+            return {}
+        if not hasattr(type(task_instances[0]), '__table__'):
+            for ti in task_instances:
+                ti.refresh_from_db()
+            return dict((ti.key, ti.state) for ti in task_instances)
+
+        # 只有使用 ORM 的任务实例才依赖 SQLAlchemy
+        from sqlalchemy import and_, or_
+        TI = type(task_instances[0])
+        states = {}
+        with create_session() as session:
+            def query(result, items):
+                filter_for_tis = ([and_(TI.dag_id == ti.dag_id,
+                                        TI.task_id == ti.task_id,
+                                        TI.execution_date == ti.execution_date)
+                                   for ti in items])
+                rows = (
+                    session
+                    .query(TI.dag_id, TI.task_id, TI.execution_date, TI.state)
+                    .filter(or_(*filter_for_tis))
+                    .all())
+                for dag_id, task_id, execution_date, state in rows:
+                    result[(dag_id, task_id, execution_date)] = state
+                return result
+
+            found = helpers.reduce_in_chunks(query,
+                                             task_instances,
+                                             {},
+                                             self.max_tis_per_query)
+        for ti in task_instances:
+            execution_date = ti.execution_date
+            key = (ti.dag_id, ti.task_id, execution_date)
+            if key not in found and getattr(execution_date, 'tzinfo', None) is not None:
+                # 没有时区的 DateTime 列读取的时间不带时区，与带时区的时间不相等
+                key = (ti.dag_id, ti.task_id, execution_date.replace(tzinfo=None))
+            # 与 refresh_from_db 一致，DB中不存在的任务实例状态为None
+            ti.state = found.get(key)
+            states[ti.key] = ti.state
+        return states
+
     def sync(self):
         """每次心跳都会调用
         Sync will get called periodically by the heartbeat method.
@@ -118,15 +425,17 @@ class BaseExecutor(LoggingMixin):
         self.log.debug("%s in queue", len(self.queued_tasks))
         self.log.debug("%s open slots", open_slots)
 
-        # 按优先级逆序，优先级大的放在前面
-        sorted_queue = sorted(
-            [(k, v) for k, v in self.queued_tasks.items()],
-            key=lambda x: x[1][1],
-            reverse=True)
+        self._sync_task_queue()
+
+        # 在队列之间公平地选择任务，每个队列内按优先级从高到低出队
+        queued_tasks = self._select_queued_tasks(
+            min(open_slots, len(self.queued_tasks)))
+
+        # 从DB中批量获取最新的任务实例状态
+        states = self.fetch_task_instance_states(
+            [ti for _, (_, _, _, ti) in queued_tasks])
 
-        for i in range(min((open_slots, len(self.queued_tasks)))):
-            # 遍历队列
-            key, (command, _, queue, ti) = sorted_queue.pop(0)
+        for key, (command, _, queue, ti) in queued_tasks:
             # TODO(jlowin) without a way to know what Job ran which tasks,
             # there is a danger that another Job started running a task
             # that was also queued to this executor. This is the last chance
@@ -134,12 +443,13 @@ class BaseExecutor(LoggingMixin):
             # Scheduler tried to run a task that was originally queued by a
             # Backfill. This fix reduces the probability of a collision but
             # does NOT eliminate it.
-            self.queued_tasks.pop(key)
-            # 从DB中获取最新的任务实例参数
-            ti.refresh_from_db()
             # 将未运行的任务实例发给执行器处理
-            if ti.state != State.RUNNING:
+            if states.get(key) != State.RUNNING:
                 self.running[key] = command
+                pool = self._get_pool(ti)
+                self._running_slots[key] = (queue, pool)
+                self._running_by_queue[queue] += 1
+                self._running_by_pool[pool] += 1
                 self.execute_async(key, command=command, queue=queue)
             else:
                 self.log.debug(
@@ -147,13 +457,56 @@ class BaseExecutor(LoggingMixin):
                     key
                 )
 
+        if not self.parallelism:
+            self._emit_open_slots(len(self.queued_tasks))
+        else:
+            self._emit_open_slots(self.parallelism - len(self.running))
+
         # Calling child class sync method
         self.log.debug("Calling the %s sync method", self.__class__)
         self.sync()
 
-    def change_state(self, key, state):
+    @property
+    def event_buffer(self):
+        """所有的状态变更事件 key => state，对它的修改会直接生效
+
+        :rtype: EventBuffer
+        """
+        return self._event_buffer
+
+    @event_buffer.setter
+    def event_buffer(self, events):
+        self._event_buffer = (events if isinstance(events, EventBuffer)
+                              else EventBuffer(events))
+
+    def change_state(self, key, state, info=None):
+        """记录任务实例的状态变更
+
+        :param info: 任务的附加信息，例如 ResourceUsage 类型的资源使用情况
+        """
         self.running.pop(key)
-        self.event_buffer[key] = state
+        # 释放任务占用的队列和池的slot
+        slot = self._running_slots.pop(key, None)
+        if slot is not None:
+            queue, pool = slot
+            self._running_by_queue[queue] -= 1
+            self._running_by_pool[pool] -= 1
+        self._event_buffer.add(key, state, info)
+        if isinstance(info, ResourceUsage):
+            self._emit_resource_usage(info)
+
+    def _emit_resource_usage(self, usage):
+        """发送任务的资源使用情况，没有采集到的指标（值为None）不发送 ."""
+        if usage.wall_time is not None:
+            self._stats_client.timing('executor.task.wall_time',
+                                      usage.wall_time * 1000)
+        if usage.user_time is not None and usage.system_time is not None:
+            self._stats_client.timing('executor.task.cpu_time',
+                                      (usage.user_time + usage.system_time) * 1000)
+        if usage.max_rss is not None:
+            self._stats_client.gauge('executor.task.max_rss', usage.max_rss)
+        if usage.exit_signal is not None:
+            self._stats_client.incr('executor.task.killed')
 
     def fail(self, key):
         self.change_state(key, State.FAILED)
@@ -161,27 +514,41 @@ class BaseExecutor(LoggingMixin):
     def success(self, key):
         self.change_state(key, State.SUCCESS)
 
-    def get_event_buffer(self, dag_ids=None):
+    @staticmethod
+    def _format_events(events, with_info):
+        """将 [(key, state, info)] 格式的事件转换为返回值 ."""
+        return dict((key, (state, info) if with_info else state)
+                    for key, state, info in events)
+
+    def get_event_buffer(self, dag_ids=None, with_info=False):
         """
         Returns and flush the event buffer. In case dag_ids is specified
         it will only return and flush events for the given dag_ids. Otherwise
         it returns and flushes all
 
         :param dag_ids: to dag_ids to return events for, if None returns all
+        :param with_info: 为True时事件的值是 (state, info)，info 是任务的附加信息，
+            例如 LocalExecutor 返回的 ResourceUsage
         :return: a dict of events
         """
-        cleared_events = dict()
         if dag_ids is None:
-            cleared_events = self.event_buffer
-            self.event_buffer = dict()
-        else:
-            for key in list(self.event_buffer.keys()):
-                # 任务实例的唯一key是由3部分组成的
-                dag_id, _, _ = key
-                if dag_id in dag_ids:
-                    cleared_events[key] = self.event_buffer.pop(key)
+            return self._format_events(self._event_buffer.pop_all(), with_info)
+        events = []
+        for dag_id in dag_ids:
+            events.extend(self._event_buffer.pop_dag(dag_id))
+        return self._format_events(events, with_info)
 
-        return cleared_events
+    def drain(self, max_items=None, with_info=False):
+        """按事件发生的先后顺序（以dag为单位），返回并清除最多 max_items 个事件
+
+        :param max_items: 最多返回的事件数量，None表示返回全部事件
+        :param with_info: 为True时事件的值是 (state, info)
+        :return: a dict of events
+        """
+        if max_items is None:
+            return self.get_event_buffer(with_info=with_info)
+        return self._format_events(self._event_buffer.pop_oldest(max_items),
+                                   with_info)
 
     def execute_async(self, key, command, queue=None):  # pragma: no cover
         """
@@ -22,6 +22,7 @@ from celery import states as celery_states
 from xTool.config_templates.default_celery import DEFAULT_CELERY_CONFIG
 from xTool.exceptions import XToolException
 from xTool.executors.base_executor import BaseExecutor
+from xTool.executors.celery_state_fetcher import BulkStateFetcher
 from xTool import configuration
 from xTool.utils.log.logging_mixin import LoggingMixin
 from xTool.utils.module_loading import import_string
@@ -59,7 +60,7 @@ def execute_command(command):
         log.exception('execute_command encountered a CalledProcessError')
         log.error(e.output)
 
-        raise AirflowException('Celery command failed')
+        raise XToolException('Celery command failed')
 
 
 class CeleryExecutor(BaseExecutor):
@@ -75,6 +76,8 @@ class CeleryExecutor(BaseExecutor):
     def start(self):
         self.tasks = {}
         self.last_state = {}
+        # 批量获取任务状态，每次心跳只需要少量请求 result backend
+        self.bulk_state_fetcher = BulkStateFetcher()
 
     def execute_async(self, key, command,
                       queue=DEFAULT_CELERY_CONFIG['task_default_queue']):
@@ -88,10 +91,16 @@ class CeleryExecutor(BaseExecutor):
 
     def sync(self):
         self.log.debug("Inquiring about %s celery task(s)", len(self.tasks))
-        for key, async in list(self.tasks.items()):
+        try:
+            # 批量获得异步任务的执行状态
+            states = self.bulk_state_fetcher.get_many(self.tasks)
+        except Exception as e:
+            self.log.error(
+                "Error syncing the celery executor, ignoring it:")
+            self.log.exception(e)
+            return
+        for key, state in states.items():
             try:
-                # 获得异步任务的执行状态
-                state = async.state
                 if self.last_state[key] != state:
                     if state == celery_states.SUCCESS:
                         self.success(key)
@@ -106,8 +115,8 @@ class CeleryExecutor(BaseExecutor):
                         del self.tasks[key]
                         del self.last_state[key]
                     else:
-                        self.log.info("Unexpected state: %s", async.state)
-                    self.last_state[key] = async.state
+                        self.log.info("Unexpected state: %s", state)
+                        self.last_state[key] = state
             except Exception as e:
                 self.log.error(
                     "Error syncing the celery executor, ignoring it:")
@@ -117,7 +126,8 @@ class CeleryExecutor(BaseExecutor):
         if synchronous:
             # 等待所有的任务完成
             while any([
-                    async.state not in celery_states.READY_STATES
-                    for async in self.tasks.values()]):
+                    state not in celery_states.READY_STATES
+                    for state in self.bulk_state_fetcher.get_many(
+                        self.tasks).values()]):
                 time.sleep(5)
         self.sync()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+批量获取 celery 异步任务的状态
+
+AsyncResult.state 每次访问都会请求一次 result backend，
+BulkStateFetcher 根据 backend 的类型一次获取多个任务的状态：
+- 键值存储 backend（例如 Redis, Memcached）：使用 mget 批量获取
+- 数据库 backend：使用 task_id IN (...) 批量查询
+- 其它 backend：使用线程池并发获取
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import states as celery_states
+
+from xTool.utils import helpers
+from xTool.utils.log.logging_mixin import LoggingMixin
+
+
+class BulkStateFetcher(LoggingMixin):
+    """批量获取 celery 异步任务的状态
+
+    :param chunk_size: 每次批量请求最多包含的任务数量
+    :type chunk_size: int
+    :param max_workers: backend 不支持批量请求时，并发获取状态的线程数量
+    :type max_workers: int
+    """
+
+    def __init__(self, chunk_size=1000, max_workers=16):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+
+    def get_many(self, async_results):
+        """获得多个异步任务的状态
+
+        :param async_results: dict[key, AsyncResult]
+        :return: dict[key, state]
+        """
+        if not async_results:
+            return {}
+        backend = next(iter(async_results.values())).backend
+        states = None
+        if hasattr(backend, 'mget') and hasattr(backend, 'get_key_for_task'):
+            try:
+                states = self._get_many_from_kv_backend(backend, async_results)
+            except NotImplementedError:
+                # 键值存储 backend 的基类实现了 mget 方法，但子类不一定支持（例如 S3）
+                self.log.debug("%s does not support mget, fall back to threads",
+                               type(backend).__name__)
+        elif hasattr(backend, 'ResultSession') and hasattr(backend, 'task_cls'):
+            states = self._get_many_from_db_backend(backend, async_results)
+        if states is None:
+            states = self._get_many_using_threads(async_results)
+        self.log.debug("Fetched %s celery task state(s)", len(states))
+        return states
+
+    def _get_many_from_kv_backend(self, backend, async_results):
+        """使用键值存储的 mget 批量获取任务状态 ."""
+        items = list(async_results.items())
+
+        def fetch(result, chunk):
+            keys = [backend.get_key_for_task(async_result.task_id)
+                    for _, async_result in chunk]
+            values = backend.mget(keys)
+            if hasattr(values, 'items'):
+                # memcached 返回 dict，redis 返回与 keys 顺序一致的 list
+                values = [values.get(key) for key in keys]
+            for (key, _), value in zip(chunk, values):
+                if value is None:
+                    # 结果尚未写入 backend
+                    result[key] = celery_states.PENDING
+                else:
+                    result[key] = backend.decode_result(value)['status']
+            return result
+
+        return helpers.reduce_in_chunks(fetch, items, {}, self.chunk_size)
+
+    def _get_many_from_db_backend(self, backend, async_results):
+        """使用 task_id IN (...) 批量查询任务状态 ."""
+        task_cls = backend.task_cls
+        key_by_task_id = dict((async_result.task_id, key)
+                              for key, async_result in async_results.items())
+        task_ids = list(key_by_task_id)
+        session = backend.ResultSession()
+        try:
+            def fetch(result, chunk):
+                rows = (session
+                        .query(task_cls.task_id, task_cls.status)
+                        .filter(task_cls.task_id.in_(chunk))
+                        .all())
+                for task_id, status in rows:
+                    result[key_by_task_id[task_id]] = status
+                return result
+
+            found = helpers.reduce_in_chunks(fetch, task_ids, {}, self.chunk_size)
+        finally:
+            session.close()
+        # 数据库中没有记录的任务尚未开始执行
+        return dict((key, found.get(key, celery_states.PENDING))
+                    for key in async_results)
+
+    def _get_many_using_threads(self, async_results):
+        """backend 不支持批量请求时，使用线程池并发获取任务状态 ."""
+        items = list(async_results.items())
+        max_workers = max(min(self.max_workers, len(items)), 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            states = list(executor.map(lambda item: item[1].state, items))
+        return dict((key, state) for (key, _), state in zip(items, states))
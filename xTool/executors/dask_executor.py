@@ -12,10 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import distributed
+from collections import deque
 import subprocess
+import threading
 import warnings
 
+import distributed
+
 from xTool import configuration
 from xTool.executors.base_executor import BaseExecutor
 
@@ -23,6 +26,9 @@ from xTool.executors.base_executor import BaseExecutor
 class DaskExecutor(BaseExecutor):
     """
     DaskExecutor submits tasks to a Dask Distributed cluster.
+
+    后台线程迭代 distributed.as_completed，把已完成的 future 放到 deque 中，
+    sync() 只处理已完成的 future，耗时与完成的任务数量成正比，与执行中的任务数量无关
     """
 
     def __init__(self, cluster_address=None):
@@ -38,6 +44,28 @@ class DaskExecutor(BaseExecutor):
         # 连接远程dask集群
         self.client = distributed.Client(self.cluster_address)
         self.futures = {}
+        # 已完成的 future，由后台线程写入，sync() 取出
+        self._completed = deque()
+        self._as_completed = distributed.as_completed()
+        # 有新的 future 需要等待，或需要停止后台线程
+        self._submitted = threading.Event()
+        self._stopped = False
+        self._watcher = threading.Thread(target=self._watch_futures,
+                                         name='DaskExecutorWatcher')
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def _watch_futures(self):
+        """在后台线程中按完成的顺序收集 future ."""
+        while True:
+            self._submitted.wait()
+            if self._stopped:
+                return
+            # 先清除事件，迭代期间新提交的 future 会再次设置事件
+            self._submitted.clear()
+            # 没有需要等待的 future 时迭代结束
+            for future in self._as_completed:
+                self._completed.append(future)
 
     def execute_async(self, key, command, queue=None):
         if queue is not None:
@@ -51,31 +79,45 @@ class DaskExecutor(BaseExecutor):
         # 将命令发送到dask集群中执行
         future = self.client.submit(airflow_run, pure=False)
         self.futures[future] = key
+        self._as_completed.add(future)
+        self._submitted.set()
 
     def _process_future(self, future):
-        if future.done():
-            key = self.futures[future]
-            if future.exception():
-                self.log.error("Failed to execute task: %s",
-                               repr(future.exception()))
-                self.fail(key)
-            elif future.cancelled():
-                self.log.error("Failed to execute task")
-                self.fail(key)
-            else:
-                self.success(key)
-            self.futures.pop(future)
+        key = self.futures.pop(future, None)
+        if key is None:
+            return
+        # 被取消的 future 调用 exception() 会抛出 CancelledError
+        if future.cancelled():
+            self.log.error("Failed to execute task")
+            self.fail(key)
+        elif future.exception():
+            self.log.error("Failed to execute task: %s",
+                           repr(future.exception()))
+            self.fail(key)
+        else:
+            self.success(key)
 
     def sync(self):
-        # make a copy so futures can be popped during iteration
-        for future in self.futures.copy():
+        """处理后台线程收集到的已完成的 future，不会阻塞 ."""
+        while True:
+            try:
+                future = self._completed.popleft()
+            except IndexError:
+                break
             self._process_future(future)
 
     def end(self):
-        # 按执行完成的顺序返回futures
-        for future in distributed.as_completed(self.futures.copy()):
-            self._process_future(future)
+        # 等待所有的任务完成，被取消的 future 不需要等待
+        distributed.wait([future for future in self.futures
+                          if not future.cancelled()])
+        # 后台线程可能还没有收集到最后完成的 future
+        for future in list(self.futures):
+            self._completed.append(future)
+        self.sync()
+        self._stopped = True
+        self._submitted.set()
+        self._watcher.join()
 
     def terminate(self):
-        self.client.cancel(self.futures.keys())
+        self.client.cancel(list(self.futures.keys()))
         self.end()
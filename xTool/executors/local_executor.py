@@ -39,29 +39,240 @@ This option could lead to the unification of the executor implementations, runni
 locally, into just one `LocalExecutor` with multiple modes.
 """
 
+import importlib
 import multiprocessing
+from multiprocessing.connection import wait
+import os
+import runpy
 import subprocess
+import sys
 import time
+import traceback
 
 from builtins import range
+from six.moves import queue as Queue
 
 from xTool.executors.base_executor import BaseExecutor
+from xTool.executors.base_executor import PARALLELISM
 from xTool.utils.log.logging_mixin import LoggingMixin
+from xTool.utils.processes import ResourceUsage
+from xTool.utils.processes import wait_for_pid
+from xTool.utils.processes import which
 from xTool.utils.state import State
 
 
+def preload_modules(module_names):
+    """预先导入模块，之后从当前进程 fork 出的子进程不需要再次导入 ."""
+    log = LoggingMixin().log
+    for module_name in module_names:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            log.exception("Failed to preload module %s", module_name)
+
+
+def is_current_interpreter(executable):
+    """判断命令中的解释器是否就是当前进程的解释器 sys.executable
+
+    不包含路径的命令从环境变量 PATH 中查找，
+    要求与 sys.executable 在同一个目录且指向同一个文件，避免虚拟环境与系统解释器混淆
+    """
+    if os.sep not in executable:
+        executable = next(which(executable), None)
+        if executable is None:
+            return False
+    executable = os.path.abspath(executable)
+    current = os.path.abspath(sys.executable)
+    return (os.path.dirname(executable) == os.path.dirname(current) and
+            os.path.realpath(executable) == os.path.realpath(current))
+
+
+def parse_python_command(argv):
+    """判断 argv 是否是使用当前解释器执行 python 代码的命令
+
+    支持 python -m module、python script.py 和 python -c code 三种形式，
+    其它解释器（例如其它版本或其它虚拟环境的 python）执行的命令返回None
+
+    :return: (类型, 模块名/脚本路径/代码, sys.argv)，不是 python 命令时返回None
+    """
+    if len(argv) < 2:
+        return None
+    if not is_current_interpreter(argv[0]):
+        return None
+    if argv[1] == '-m' and len(argv) > 2:
+        return 'module', argv[2], [argv[2]] + list(argv[3:])
+    if argv[1] == '-c' and len(argv) > 2:
+        return 'code', argv[2], ['-c'] + list(argv[3:])
+    if not argv[1].startswith('-'):
+        return 'path', argv[1], list(argv[1:])
+    return None
+
+
+def fork_python_command(python_command):
+    """从当前进程 fork 出子进程执行 python 代码，子进程继承已经导入的模块
+
+    :param python_command: parse_python_command 的返回值
+    :return: 子进程ID，由调用方等待子进程结束
+    """
+    kind, target, argv = python_command
+    pid = os.fork()
+    if pid == 0:
+        # 子进程
+        exit_code = 0
+        try:
+            sys.argv = argv
+            if kind == 'module':
+                runpy.run_module(target, run_name='__main__', alter_sys=True)
+            elif kind == 'path':
+                runpy.run_path(target, run_name='__main__')
+            else:
+                exec(compile(target, '<string>', 'exec'), {'__name__': '__main__'})
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                sys.stderr.write("{}\n".format(e.code))
+                exit_code = 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            # 不执行父进程注册的清理函数
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+    return pid
+
+
+class PythonZygote(LoggingMixin):
+    """单线程的 zygote 进程，从中 fork 执行 python 命令
+
+    从多线程的进程 fork 时，子进程可能继承其它线程持有的锁（例如日志和队列的锁）导致死锁。
+    QueuedLocalWorker 向结果队列写入结果后会启动队列的后台线程，
+    所以在工作进程使用队列之前 fork 出只有一个线程的 zygote 进程，
+    由 zygote 进程 fork 执行 python 命令，等待命令结束后把资源使用情况发送给工作进程。
+    zygote 进程每次只执行一个命令，工作进程退出后 zygote 进程随之退出。
+    """
+
+    def __init__(self, preload_modules=()):
+        """
+        :param preload_modules: zygote 进程启动时预先导入的模块
+        :type preload_modules: list[string]
+        """
+        self.preload_modules = list(preload_modules)
+        self.pid = None
+        self.child_pid = None
+        self._conn = None
+
+    def start(self):
+        """fork 出 zygote 进程，必须在当前进程只有一个线程时调用 ."""
+        parent_conn, child_conn = multiprocessing.Pipe()
+        pid = os.fork()
+        if pid == 0:
+            # zygote 进程
+            parent_conn.close()
+            exit_code = 0
+            try:
+                self._serve(child_conn)
+            except BaseException:
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        child_conn.close()
+        self.pid = pid
+        self._conn = parent_conn
+
+    def _serve(self, conn):
+        """zygote 进程的主循环，收到 None 或者工作进程退出后结束 ."""
+        preload_modules(self.preload_modules)
+        while True:
+            try:
+                python_command = conn.recv()
+            except EOFError:
+                # 工作进程已经退出
+                return
+            if python_command is None:
+                return
+            start_time = time.time()
+            try:
+                pid = fork_python_command(python_command)
+            except OSError as e:
+                conn.send(('error', str(e)))
+                continue
+            conn.send(('started', pid))
+            conn.send(('finished', wait_for_pid(pid, start_time)))
+
+    def _recv(self, expected):
+        """接收 zygote 进程的消息，zygote 进程异常时抛出 OSError ."""
+        try:
+            kind, value = self._conn.recv()
+        except (EOFError, OSError) as e:
+            raise OSError("zygote process {} exited: {}".format(self.pid, e))
+        if kind != expected:
+            raise OSError(value)
+        return value
+
+    def spawn(self, python_command):
+        """由 zygote 进程 fork 执行 python 命令
+
+        :param python_command: parse_python_command 的返回值
+        :return: 子进程ID，子进程是 zygote 进程的子进程，调用 wait 等待结束
+        """
+        try:
+            self._conn.send(python_command)
+        except (EOFError, OSError) as e:
+            raise OSError("zygote process {} exited: {}".format(self.pid, e))
+        self.child_pid = self._recv('started')
+        return self.child_pid
+
+    def wait(self):
+        """等待 spawn 启动的子进程结束
+
+        :rtype: ResourceUsage
+        """
+        try:
+            return self._recv('finished')
+        finally:
+            self.child_pid = None
+
+    def stop(self):
+        """通知 zygote 进程退出，并回收 zygote 进程 ."""
+        if self._conn is None:
+            return
+        try:
+            self._conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self._conn.close()
+        self._conn = None
+        try:
+            os.waitpid(self.pid, 0)
+        except OSError:
+            pass
+
+
 class LocalWorker(multiprocessing.Process, LoggingMixin):
     """LocalWorker Process implementation to run airflow commands. Executes the given
     command and puts the result into a result queue when done, terminating execution."""
 
-    def __init__(self, result_queue):
+    def __init__(self, result_queue, worker_delay=0, fork_python=False):
         """
-        :param result_queue: the queue to store result states tuples (key, State)
+        :param result_queue: the queue to store result tuples (key, State, ResourceUsage)
         :type result_queue: multiprocessing.Queue
+        :param worker_delay: 每执行完一个命令后的休眠时间，单位是秒
+        :type worker_delay: float
+        :param fork_python: argv 形式的 python 命令是否从工作进程直接 fork 执行，
+            不再启动新的 python 解释器
+        :type fork_python: bool
         """
         super(LocalWorker, self).__init__()
         self.daemon = True
         self.result_queue = result_queue
+        self.worker_delay = worker_delay
+        self.fork_python = fork_python
         self.key = None
         self.command = None
 
@@ -70,28 +281,86 @@ class LocalWorker(multiprocessing.Process, LoggingMixin):
         Executes command received and stores result state in queue.
         :param key: the key to identify the TI
         :type key: Tuple(dag_id, task_id, execution_date)
-        :param command: the command to execute
-        :type command: string
+        :param command: the command to execute, argv 列表形式的命令不经过shell直接执行
+        :type command: string | list[string]
         """
         if key is None:
             return
         self.log.info("%s running %s", self.__class__.__name__, command)
-        # shell 的内件命令exec执行命令时，不启用新的shell进程【注： source 和 . 不启用新的shell，在当前shell中执行，设定的局部变量在执行完命令后仍然有效；bash或sh 或shell script执行时，另起一个子shell,其继承父shell的环境变量，其子shelll的变量执行完后不影响父shell，注意三类的区别】exec是用被执行的命令行替换掉当前的shell进程，且exec命令后的其他命令将不再执行。例如在当前shell中执行 exec ls 表示执行ls这条命令来替换当前的shell  即为执行完后会退出当前shell。为了避免这个结果的影响，一般将exec命令放到一个shell脚本中，用主脚本调用这个脚本，调用处可以用bash  xx.sh(xx.sh为存放exec命令的脚本)。这样会为xx.sh建立一个子shell去执行，当执行exec后该子脚本进程就被替换成相应的exec的命令
-        # 其中有一个例外：当exec命令对文件描述符操作的时候，就不会替换shell，而是操作完成后还会继续执行后面的命令
-        command = "exec bash -c '{0}'".format(command)
+        start_time = time.time()
         try:
-            subprocess.check_call(command, shell=True, close_fds=True)
+            if isinstance(command, (list, tuple)):
+                pid, process = self.spawn_argv(list(command))
+            else:
+                pid, process = self.spawn_shell(command)
+        except OSError as e:
+            self.log.error("Failed to execute task %s: %s", command, e)
+            self.result_queue.put((key, State.FAILED))
+            return
+        usage = self.wait_for_command(pid, process, start_time)
+        if usage.exit_code == 0:
             state = State.SUCCESS
-        except subprocess.CalledProcessError as e:
+        else:
             state = State.FAILED
-            self.log.error("Failed to execute task %s.", str(e))
-            # TODO: Why is this commented out?
-            # raise e
-        self.result_queue.put((key, state))
+            self.log.error("Failed to execute task %s, return code %s.",
+                           command, usage.exit_code)
+        self.result_queue.put((key, state, usage))
+
+    def spawn_shell(self, command):
+        """经过 shell 执行字符串形式的命令
+
+        :return: (子进程ID, Popen对象)
+        """
+        # shell 的内件命令exec执行命令时，不启用新的shell进程【注： source 和 . 不启用新的shell，在当前shell中执行，设定的局部变量在执行完命令后仍然有效；bash或sh 或shell script执行时，另起一个子shell,其继承父shell的环境变量，其子shelll的变量执行完后不影响父shell，注意三类的区别】exec是用被执行的命令行替换掉当前的shell进程，且exec命令后的其他命令将不再执行。例如在当前shell中执行 exec ls 表示执行ls这条命令来替换当前的shell  即为执行完后会退出当前shell。为了避免这个结果的影响，一般将exec命令放到一个shell脚本中，用主脚本调用这个脚本，调用处可以用bash  xx.sh(xx.sh为存放exec命令的脚本)。这样会为xx.sh建立一个子shell去执行，当执行exec后该子脚本进程就被替换成相应的exec的命令
+        # 其中有一个例外：当exec命令对文件描述符操作的时候，就不会替换shell，而是操作完成后还会继续执行后面的命令
+        command = "exec bash -c '{0}'".format(command)
+        process = subprocess.Popen(command, shell=True, close_fds=True)
+        return process.pid, process
+
+    def spawn_argv(self, argv):
+        """不经过shell执行 argv 形式的命令
+
+        开启 fork_python 时，python 命令从已经导入了常用模块的进程 fork 执行；
+        其它命令或者无法 fork 时使用 subprocess 执行，
+        不关闭文件描述符时 subprocess 会使用 posix_spawn
+        （python3 创建的文件描述符默认不会被子进程继承）
+
+        :return: (子进程ID, Popen对象)，fork 执行时 Popen对象是None
+        """
+        python_command = parse_python_command(argv) if self.fork_python else None
+        if python_command is not None:
+            pid = self.fork_python_command(python_command)
+            if pid is not None:
+                return pid, None
+        process = subprocess.Popen(argv, close_fds=False)
+        return process.pid, process
+
+    def fork_python_command(self, python_command):
+        """从工作进程 fork 执行 python 命令
+
+        LocalWorker 只执行一个命令，fork 时工作进程只有一个线程
+
+        :return: 子进程ID，不能 fork 时返回None
+        """
+        return fork_python_command(python_command)
+
+    def wait_for_command(self, pid, process, start_time):
+        """等待命令的子进程结束
+
+        :return: 子进程的资源使用情况
+        :rtype: ResourceUsage
+        """
+        # 使用 wait4 等待子进程结束，同时获得子进程的资源使用情况
+        usage = wait_for_pid(pid, start_time)
+        if process is not None:
+            # 子进程已经被回收，避免 Popen 再次等待
+            process.returncode = usage.exit_code
+        return usage
 
     def run(self):
         self.execute_work(self.key, self.command)
-        time.sleep(1)
+        if self.worker_delay > 0:
+            time.sleep(self.worker_delay)
 
 
 class QueuedLocalWorker(LocalWorker):
@@ -100,20 +369,169 @@ class QueuedLocalWorker(LocalWorker):
     continue executing commands as they become available in the queue. It will terminate
     execution once the poison token is found."""
 
-    def __init__(self, task_queue, result_queue):
-        super(QueuedLocalWorker, self).__init__(result_queue=result_queue)
+    def __init__(self, task_queue, result_queue, worker_delay=0, batch_size=1,
+                 fork_python=False, preload_modules=(), idle_workers=None,
+                 batch_lock=None):
+        """
+        :param batch_size: 每次唤醒时最多从任务队列中获取的命令数量
+        :type batch_size: int
+        :param preload_modules: 开启 fork_python 时，zygote 进程启动时预先导入的模块
+        :type preload_modules: list[string]
+        :param idle_workers: 所有工作进程共享的空闲工作进程计数，
+            有其它空闲的工作进程时不批量获取命令
+        :type idle_workers: multiprocessing.Value
+        :param batch_lock: 所有工作进程共享的锁，保证获取命令和判断是否批量获取是原子操作
+        :type batch_lock: multiprocessing.Lock
+        """
+        super(QueuedLocalWorker, self).__init__(result_queue=result_queue,
+                                                worker_delay=worker_delay,
+                                                fork_python=fork_python)
         self.task_queue = task_queue
+        self.batch_size = max(batch_size, 1)
+        self.preload_modules = list(preload_modules)
+        self.idle_workers = idle_workers
+        self.batch_lock = batch_lock
+        self.zygote = None
+
+    def _add_idle_workers(self, delta):
+        """修改空闲工作进程的数量 ."""
+        if self.idle_workers is None:
+            return
+        with self.idle_workers.get_lock():
+            self.idle_workers.value += delta
+
+    def _has_idle_workers(self):
+        """是否有其它工作进程正在等待命令 ."""
+        return self.idle_workers is not None and self.idle_workers.value > 0
+
+    def _get_batch(self):
+        """阻塞获取一个命令，然后不阻塞地获取队列中已有的命令，最多 batch_size 个
+
+        批量获取的命令在当前工作进程中依次执行，有其它空闲的工作进程时不批量获取，
+        避免一个耗时长的命令阻塞同一批次的其它命令。
+        获取到毒丸后不再获取，保证每个工作进程只消费一个毒丸
+        """
+        self._add_idle_workers(1)
+        # 持有锁期间其它工作进程无法获取命令，避免判断空闲的工作进程后，
+        # 其它工作进程恰好取走命令，导致剩余的命令都被当前工作进程批量获取
+        if self.batch_lock is not None:
+            self.batch_lock.acquire()
+        try:
+            try:
+                batch = [self.task_queue.get()]
+            finally:
+                self._add_idle_workers(-1)
+            while (len(batch) < self.batch_size and batch[-1][0] is not None and
+                   not self._has_idle_workers()):
+                try:
+                    batch.append(self.task_queue.get_nowait())
+                except Queue.Empty:
+                    break
+        finally:
+            if self.batch_lock is not None:
+                self.batch_lock.release()
+        return batch
+
+    def start_zygote(self):
+        """启动 zygote 进程，必须在使用队列之前调用，此时工作进程只有一个线程
+
+        无法启动时不使用 zygote，python 命令使用 subprocess 执行
+        """
+        zygote = PythonZygote(self.preload_modules)
+        try:
+            zygote.start()
+        except OSError as e:
+            self.log.error("Failed to start zygote process: %s", e)
+            return
+        self.zygote = zygote
+
+    def stop_zygote(self):
+        if self.zygote is not None:
+            self.zygote.stop()
+            self.zygote = None
+
+    def fork_python_command(self, python_command):
+        """工作进程使用队列后是多线程的，由 zygote 进程 fork 执行 python 命令
+
+        zygote 进程不可用时返回None，使用 subprocess 执行
+        """
+        if self.zygote is None:
+            return None
+        try:
+            return self.zygote.spawn(python_command)
+        except OSError as e:
+            self.log.error("Failed to fork from zygote process, fall back to "
+                           "subprocess: %s", e)
+            self.stop_zygote()
+            return None
+
+    def wait_for_command(self, pid, process, start_time):
+        if self.zygote is None or pid != self.zygote.child_pid:
+            return super(QueuedLocalWorker, self).wait_for_command(
+                pid, process, start_time)
+        try:
+            return self.zygote.wait()
+        except OSError as e:
+            self.log.error("Lost the result of process %s: %s", pid, e)
+            self.stop_zygote()
+            # 子进程的资源使用情况未知
+            return ResourceUsage(time.time() - start_time, None, None, None, 1, None)
 
     def run(self):
-        while True:
-            key, command = self.task_queue.get()
-            if key is None:
-                # Received poison pill, no more tasks to run
-                self.task_queue.task_done()
-                break
-            self.execute_work(key, command)
-            self.task_queue.task_done()
-            time.sleep(1)
+        if self.fork_python:
+            # 在使用队列之前启动 zygote 进程，预先导入模块后再 fork 执行 python 命令
+            self.start_zygote()
+        try:
+            while True:
+                for key, command in self._get_batch():
+                    if key is None:
+                        # Received poison pill, no more tasks to run
+                        self.task_queue.task_done()
+                        return
+                    self.execute_work(key, command)
+                    self.task_queue.task_done()
+                    if self.worker_delay > 0:
+                        time.sleep(self.worker_delay)
+        finally:
+            self.stop_zygote()
+
+
+def drain_results(executor):
+    """不阻塞地取出结果队列中所有的执行结果，并更新任务状态
+
+    multiprocessing.Queue.empty() 在多进程下不可靠，使用 get_nowait 直到队列为空
+
+    :return: 取出的结果数量
+    """
+    count = 0
+    while True:
+        try:
+            results = executor.result_queue.get_nowait()
+        except Queue.Empty:
+            break
+        executor.change_state(*results)
+        count += 1
+    return count
+
+
+def wait_for_workers(executor, workers, poll_interval=0.1):
+    """阻塞等待工作进程退出，等待期间持续取出执行结果
+
+    工作进程退出前需要把结果写入管道，管道写满时父进程必须同时读取结果，否则会死锁。
+    multiprocessing.Queue 没有公开可等待的读端，所以等待工作进程退出时最多等待
+    poll_interval 秒就取出一次结果
+
+    :param poll_interval: 取出执行结果的最大间隔，单位是秒
+    :type poll_interval: float
+    """
+    live_workers = [w for w in workers if w.is_alive()]
+    while live_workers:
+        wait([w.sentinel for w in live_workers], timeout=poll_interval)
+        executor.sync()
+        live_workers = [w for w in live_workers if w.is_alive()]
+    for w in workers:
+        w.join()
+    executor.sync()
 
 
 class LocalExecutor(BaseExecutor):
@@ -137,6 +555,8 @@ class LocalExecutor(BaseExecutor):
         def start(self):
             self.executor.workers_used = 0
             self.executor.workers_active = 0
+            # 每个命令的工作进程都是从执行器进程 fork 的，在执行器进程中预先导入模块
+            preload_modules(self.executor.preload_modules)
 
         def execute_async(self, key, command):
             """
@@ -146,26 +566,36 @@ class LocalExecutor(BaseExecutor):
             :type command: string
             """
             # 创建一个子进程
-            local_worker = LocalWorker(self.executor.result_queue)
+            local_worker = LocalWorker(self.executor.result_queue,
+                                       worker_delay=self.executor.worker_delay,
+                                       fork_python=self.executor.fork_python)
             local_worker.key = key
             local_worker.command = command
             self.executor.workers_used += 1
             self.executor.workers_active += 1
             # 启动子进程执行命令
             local_worker.start()
+            self.executor.workers.append(local_worker)
 
         def sync(self):
             """每次心跳都需要检查结果队列 . """
-            while not self.executor.result_queue.empty():
-                results = self.executor.result_queue.get()
-                self.executor.change_state(*results)
-                self.executor.workers_active -= 1
+            self.executor.workers_active -= drain_results(self.executor)
+            # 回收已经退出的子进程
+            workers = []
+            for w in self.executor.workers:
+                if w.is_alive():
+                    workers.append(w)
+                else:
+                    w.join()
+            self.executor.workers = workers
 
         def end(self):
             """调度器结束时，需要保证所有的子进程都执行完毕 ."""
-            while self.executor.workers_active > 0:
-                self.executor.sync()
-                time.sleep(0.5)
+            wait_for_workers(self.executor, list(self.executor.workers))
+            if self.executor.workers_active > 0:
+                self.executor.log.warning(
+                    "%s workers exited without reporting a result",
+                    self.executor.workers_active)
 
     class _LimitedParallelism(object):
         """Implements LocalExecutor with limited parallelism using a task queue to
@@ -176,10 +606,18 @@ class LocalExecutor(BaseExecutor):
 
         def start(self):
             self.executor.queue = multiprocessing.JoinableQueue()
+            self.executor.idle_workers = multiprocessing.Value('i', 0)
+            batch_lock = multiprocessing.Lock()
             # 启动指定数量的进程
             self.executor.workers = [
                 QueuedLocalWorker(self.executor.queue,
-                                  self.executor.result_queue)
+                                  self.executor.result_queue,
+                                  worker_delay=self.executor.worker_delay,
+                                  batch_size=self.executor.batch_size,
+                                  fork_python=self.executor.fork_python,
+                                  preload_modules=self.executor.preload_modules,
+                                  idle_workers=self.executor.idle_workers,
+                                  batch_lock=batch_lock)
                 for _ in range(self.executor.parallelism)
             ]
 
@@ -198,9 +636,7 @@ class LocalExecutor(BaseExecutor):
             self.executor.queue.put((key, command))
 
         def sync(self):
-            while not self.executor.result_queue.empty():
-                results = self.executor.result_queue.get()
-                self.executor.change_state(*results)
+            drain_results(self.executor)
 
         def end(self):
             # Sending poison pill to all worker
@@ -208,12 +644,34 @@ class LocalExecutor(BaseExecutor):
                 self.executor.queue.put((None, None))
 
             # Wait for commands to finish
-            self.executor.queue.join()
-            self.executor.sync()
+            wait_for_workers(self.executor, self.executor.workers)
+
+    def __init__(self, parallelism=PARALLELISM, worker_delay=0, batch_size=1,
+                 fork_python=False, preload_modules=(), **kwargs):
+        """
+        :param worker_delay: 工作进程每执行完一个命令后的休眠时间，单位是秒，默认不休眠
+        :type worker_delay: float
+        :param batch_size: 有限并发模式下，工作进程每次唤醒时最多获取的命令数量，
+            只有所有工作进程都在忙碌时才批量获取
+        :type batch_size: int
+        :param fork_python: 使用当前解释器的 argv 形式的 python 命令是否 fork 执行，
+            子进程继承已经导入的模块，不需要启动新的解释器；
+            有限并发模式下从每个工作进程的单线程 zygote 进程 fork
+        :type fork_python: bool
+        :param preload_modules: 预先导入的模块，有限并发模式下在 zygote 进程中导入，
+            无限并发模式下在执行器进程中导入
+        :type preload_modules: list[string]
+        """
+        super(LocalExecutor, self).__init__(parallelism=parallelism, **kwargs)
+        self.worker_delay = worker_delay
+        self.batch_size = batch_size
+        self.fork_python = fork_python
+        self.preload_modules = list(preload_modules)
 
     def start(self):
         self.result_queue = multiprocessing.Queue()
         self.queue = None
+        self.idle_workers = None
         self.workers = []
         self.workers_used = 0
         self.workers_active = 0
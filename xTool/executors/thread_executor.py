@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+ThreadExecutor 在执行器进程的线程池中执行任务，适用于不需要进程隔离的 I/O 密集型任务，
+与 LocalExecutor 相比没有创建进程和跨进程队列的开销。
+
+任务可以是：
+- python 可调用对象：在线程中直接调用，抛出异常表示失败
+- argv 列表：不经过 shell 执行命令
+- 字符串：经过 shell 执行命令
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import subprocess
+
+from xTool.executors.base_executor import BaseExecutor
+from xTool.executors.base_executor import PARALLELISM
+from xTool.utils.state import State
+
+
+class ThreadExecutor(BaseExecutor):
+    """线程池执行器
+
+    工作线程把执行结果放到线程安全的 deque 中，sync() 在调用线程中取出结果并调用 change_state，
+    BaseExecutor 的状态只会在调用线程中被修改
+    """
+
+    def __init__(self, parallelism=PARALLELISM, max_workers=None, **kwargs):
+        """
+        :param max_workers: 线程池的线程数量，默认等于 parallelism，
+            parallelism 为0时使用 ThreadPoolExecutor 的默认值
+        :type max_workers: int
+        """
+        super(ThreadExecutor, self).__init__(parallelism=parallelism, **kwargs)
+        if max_workers is None and parallelism:
+            max_workers = parallelism
+        self.max_workers = max_workers
+        self._pool = None
+        # 正在执行的任务 key => future
+        self._futures = {}
+        # 已完成的任务 (key, state)，由工作线程写入
+        self._results = deque()
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers or
+                                        multiprocessing.cpu_count() * 5)
+
+    def _run(self, key, command):
+        """在工作线程中执行任务，返回任务的状态 ."""
+        self.log.info("%s running %s", self.__class__.__name__, command)
+        try:
+            if callable(command):
+                command()
+            elif isinstance(command, (list, tuple)):
+                subprocess.check_call(list(command), close_fds=False)
+            else:
+                subprocess.check_call(command, shell=True, close_fds=True)
+            return State.SUCCESS
+        except Exception as e:
+            self.log.error("Failed to execute task %s: %s", key, e)
+            return State.FAILED
+
+    def execute_async(self, key, command, queue=None):
+        future = self._pool.submit(self._run, key, command)
+        self._futures[key] = future
+        future.add_done_callback(
+            lambda f: self._results.append(
+                (key, State.FAILED if f.cancelled() else f.result())))
+
+    def sync(self):
+        """取出所有已完成的任务，不会阻塞 ."""
+        while True:
+            try:
+                key, state = self._results.popleft()
+            except IndexError:
+                break
+            self._futures.pop(key, None)
+            self.change_state(key, state)
+
+    def end(self):
+        """等待所有的任务执行完成 ."""
+        # future 完成时先唤醒等待者再调用回调函数，等待线程退出后所有的结果才都已写入
+        self._pool.shutdown(wait=True)
+        self.sync()
+
+    def terminate(self):
+        """取消尚未开始执行的任务，正在执行的线程无法被终止 ."""
+        for future in self._futures.values():
+            future.cancel()
+        self._pool.shutdown(wait=False)
+        self.sync()
@@ -8,10 +8,13 @@ from __future__ import unicode_literals
 from past.builtins import basestring
 
 import getpass
+import threading
+from time import sleep
 
 from sqlalchemy import (
-    Column, Integer, DateTime, String, func, Index, or_, and_, not_)
+    Column, Integer, DateTime, String, func, Index, or_, and_, not_, case)
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import make_transient
 from sqlalchemy_utc import UtcDateTime
 
@@ -63,6 +66,8 @@ class BaseJob(Base, LoggingMixin):
             executor,
             heartrate=5,
             max_tis_per_query=512,
+            coalesce_heartbeat=False,
+            heartbeat_aggregator=None,
             *args, **kwargs):
         # 当前机器的主机名
         self.hostname = get_hostname()
@@ -80,6 +85,11 @@ class BaseJob(Base, LoggingMixin):
         # 因为需要批量更新任务实例的状态，为了防止SQL过长
         # 需要设置每批更新的任务实例的数量
         self.max_tis_per_query = max_tis_per_query
+        # 心跳时使用一条 UPDATE 语句更新心跳时间并获取job状态，减少DB的访问次数
+        # 开启后睡眠期间被外部关闭的job要在睡眠结束写入心跳时才会被发现，默认不开启
+        self.coalesce_heartbeat = coalesce_heartbeat
+        # 同一进程中的多个job可以共用一个心跳聚合器，由聚合器批量写入心跳
+        self.heartbeat_aggregator = heartbeat_aggregator
         super(BaseJob, self).__init__(*args, **kwargs)
 
     def is_alive(self):
@@ -115,7 +125,87 @@ class BaseJob(Base, LoggingMixin):
     def heartbeat_callback(self, session=None):
         pass
 
+    @staticmethod
+    def _supports_update_returning(dialect):
+        """判断数据库是否支持 UPDATE ... RETURNING ."""
+        returning = getattr(dialect, 'update_returning', None)
+        if returning is None:
+            # SQLAlchemy 2.0 之前的版本
+            returning = (getattr(dialect, 'full_returning', False) or
+                         dialect.name == 'postgresql')
+        return returning
+
+    def _update_heartbeat(self, session, latest_heartbeat):
+        """更新job的心跳时间，并返回job的最新状态
+
+        支持 RETURNING 的数据库只执行一条 UPDATE ... RETURNING state 语句，
+        否则在同一个session中执行 UPDATE 和 SELECT 两条语句
+        """
+        table = BaseJob.__table__
+        stmt = (table.update()
+                .where(table.c.id == self.id)
+                .values(latest_heartbeat=latest_heartbeat))
+        if self._supports_update_returning(session.get_bind(BaseJob).dialect):
+            row = session.execute(stmt.returning(table.c.state)).fetchone()
+            if row is None:
+                raise NoResultFound("Job {} not found".format(self.id))
+            return row[0]
+        session.execute(stmt)
+        return session.query(BaseJob.state).filter(BaseJob.id == self.id).one()[0]
+
     def heartbeat(self):
+        """上报job的心跳，如果job被外部关闭则执行kill操作 ."""
+        if self.heartbeat_aggregator is not None:
+            return self._heartbeat_with_aggregator()
+        if not self.coalesce_heartbeat:
+            return self._heartbeat_with_orm()
+
+        # 根据上次心跳的时间计算需要睡眠的时间间隔，不需要查询DB
+        sleep_for = 0
+        if self.latest_heartbeat:
+            sleep_for = max(
+                0,
+                self.heartrate - (timezone.system_now() - self.latest_heartbeat).total_seconds())
+        sleep(sleep_for)
+
+        with create_session() as session:
+            latest_heartbeat = timezone.system_now()
+            self.state = self._update_heartbeat(session, latest_heartbeat)
+            session.commit()
+            self.latest_heartbeat = latest_heartbeat
+            if self.state != State.SHUTDOWN:
+                # 执行心跳处理函数
+                self.heartbeat_callback(session=session)
+                self.log.debug('[heartbeat]')
+
+        # 如果job是关闭状态，则执行kill操作
+        if self.state == State.SHUTDOWN:
+            # 关闭job，抛出 XToolException
+            self.kill()
+
+    def _heartbeat_with_aggregator(self):
+        """把心跳交给聚合器批量写入，聚合器发现job被关闭时会把 state 设置为 SHUTDOWN ."""
+        # 如果job是关闭状态，则执行kill操作
+        if self.state == State.SHUTDOWN:
+            # 关闭job，抛出 XToolException
+            self.kill()
+
+        sleep_for = 0
+        if self.latest_heartbeat:
+            sleep_for = max(
+                0,
+                self.heartrate - (timezone.system_now() - self.latest_heartbeat).total_seconds())
+        sleep(sleep_for)
+
+        self.latest_heartbeat = timezone.system_now()
+        self.heartbeat_aggregator.beat(self, self.latest_heartbeat)
+
+        # 执行心跳处理函数
+        self.heartbeat_callback()
+        self.log.debug('[heartbeat]')
+
+    def _heartbeat_with_orm(self):
+        """使用 ORM 查询和更新job的心跳 ."""
         # 每次心跳获得最新的job状态
         with create_session() as session:
             # 如果只能查询到一个结果，返回它，否则抛出异常。 
@@ -164,7 +254,13 @@ class BaseJob(Base, LoggingMixin):
             self.id = id_
 
             # 运行job
-            self._execute()
+            if self.heartbeat_aggregator is not None:
+                self.heartbeat_aggregator.register(self)
+            try:
+                self._execute()
+            finally:
+                if self.heartbeat_aggregator is not None:
+                    self.heartbeat_aggregator.unregister(self)
 
             # job执行完成后，记录完成时间和状态
             self.end_date = timezone.system_now()
@@ -265,3 +361,146 @@ class BaseJob(Base, LoggingMixin):
         )
         # 返回设置状态为None之后的任务实例列表
         return reset_tis
+
+
+class HeartbeatAggregator(LoggingMixin):
+    """心跳聚合器
+
+    同一进程中有多个job时，每个job不再单独写入心跳，而是由聚合器线程每隔 interval 秒
+    收集所有job的心跳，使用一条 UPDATE ... SET latest_heartbeat = CASE id ... 语句批量写入，
+    并把被外部关闭的job的状态设置为 SHUTDOWN，job在下次心跳时执行kill操作。
+    第一次注册job时自动启动聚合器线程，写入失败的心跳在下次写入时重试。
+
+    :param interval: 批量写入心跳的时间间隔（秒）
+    :type interval: float
+    :param max_jobs_per_query: 每条 UPDATE 语句最多更新的job数量
+    :type max_jobs_per_query: int
+    """
+
+    def __init__(self, interval=5, max_jobs_per_query=512):
+        self.interval = interval
+        self.max_jobs_per_query = max_jobs_per_query
+        self._lock = threading.Lock()
+        # 已注册的job id => job
+        self._jobs = {}
+        # 等待写入的心跳 job id => 心跳时间
+        self._pending = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def register(self, job):
+        """注册job，job必须已经保存到DB中，第一次注册时启动聚合器线程 ."""
+        with self._lock:
+            self._jobs[job.id] = job
+        self.start()
+
+    def unregister(self, job):
+        """注销job，写入job尚未写入的心跳 ."""
+        with self._lock:
+            heartbeat = self._pending.pop(job.id, None)
+            self._jobs.pop(job.id, None)
+        if heartbeat is not None:
+            try:
+                self._flush({job.id: heartbeat}, {job.id: job})
+            except Exception as e:
+                self.log.exception("Failed to flush heartbeat of job %s: %s",
+                                   job.id, e)
+
+    def beat(self, job, latest_heartbeat):
+        """记录job的心跳，在下次 flush 时写入DB ."""
+        with self._lock:
+            if job.id in self._jobs:
+                self._pending[job.id] = latest_heartbeat
+
+    def start(self):
+        """启动聚合器线程，线程已经启动时不做任何操作 ."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='HeartbeatAggregator')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """停止聚合器线程，并写入剩余的心跳 ."""
+        self._stopped.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.log.exception("Failed to flush heartbeats: %s", e)
+
+    def flush(self):
+        """批量写入所有等待写入的心跳
+
+        写入失败时把心跳重新放回等待队列，同一个job只保留最新的心跳时间，在下次 flush 时重试
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            jobs = dict((job_id, self._jobs[job_id]) for job_id in pending)
+        if not pending:
+            return
+        try:
+            self._flush(pending, jobs)
+        except Exception:
+            self._requeue(pending)
+            raise
+
+    def _requeue(self, pending):
+        """把写入失败的心跳放回等待队列，已经注销的job的心跳被丢弃 ."""
+        with self._lock:
+            for job_id, latest_heartbeat in pending.items():
+                if job_id not in self._jobs:
+                    continue
+                current = self._pending.get(job_id)
+                if current is None or current < latest_heartbeat:
+                    self._pending[job_id] = latest_heartbeat
+
+    def _flush(self, pending, jobs):
+        """在一个事务中写入心跳并获取job状态，把 SHUTDOWN 状态通知给job ."""
+        table = BaseJob.__table__
+        job_ids = sorted(pending)
+        with create_session() as session:
+            # 按模型绑定数据库时 session.bind 是 None
+            dialect = session.get_bind(BaseJob).dialect
+            returning = BaseJob._supports_update_returning(dialect)
+
+            def update(result, ids):
+                stmt = (table.update()
+                        .where(table.c.id.in_(ids))
+                        .values(latest_heartbeat=case(
+                            dict((job_id, pending[job_id]) for job_id in ids),
+                            value=table.c.id)))
+                if returning:
+                    rows = session.execute(
+                        stmt.returning(table.c.id, table.c.state)).fetchall()
+                else:
+                    session.execute(stmt)
+                    rows = (session
+                            .query(BaseJob.id, BaseJob.state)
+                            .filter(BaseJob.id.in_(ids))
+                            .all())
+                result.update(rows)
+                return result
+
+            states = helpers.reduce_in_chunks(update,
+                                              job_ids,
+                                              {},
+                                              self.max_jobs_per_query)
+            session.commit()
+
+        for job_id, state in states.items():
+            if state == State.SHUTDOWN:
+                self.log.info("Job %s was shut down externally", job_id)
+                jobs[job_id].state = state
+        self.log.debug("Flushed %s heartbeat(s)", len(job_ids))
+
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import time
+
+from xTool.utils.log.logging_mixin import LoggingMixin
+
+
+class FileChangeDetector(LoggingMixin):
+    """文件变更检测器
+
+    记录每个文件的指纹 (mtime, size, 可选的内容哈希)，
+    只有文件指纹发生变化，或者距离上一次记录超过了ttl，文件才需要被再次处理
+
+    :param ttl: 文件指纹的有效期，单位是秒，超过有效期的文件即使没有变化也需要处理，
+        None 表示永不过期
+    :type ttl: float
+    :param use_hash: mtime和size没有变化时，是否继续比较文件内容的哈希值
+    :type use_hash: bool
+    """
+
+    # 计算哈希时每次读取的字节数
+    hash_block_size = 64 * 1024
+
+    def __init__(self, ttl=None, use_hash=False):
+        self._ttl = ttl
+        self._use_hash = use_hash
+        # 记录文件的指纹和记录时间
+        # :type : dict[unicode, (tuple, float)]
+        self._fingerprints = {}
+        # 因文件未变化而跳过处理的次数
+        self.skipped_count = 0
+        # 文件需要处理的次数
+        self.processed_count = 0
+
+    @property
+    def counters(self):
+        """返回跳过和处理的计数 ."""
+        return {
+            'skipped': self.skipped_count,
+            'processed': self.processed_count,
+        }
+
+    def _stat(self, file_path):
+        """获得文件的 (mtime, size)，文件不存在时返回None ."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size
+
+    def _hash(self, file_path):
+        """计算文件内容的哈希值 ."""
+        digest = hashlib.md5()
+        try:
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(self.hash_block_size), b''):
+                    digest.update(block)
+        except (IOError, OSError):
+            return None
+        return digest.hexdigest()
+
+    def fingerprint(self, file_path):
+        """获得文件的指纹 ."""
+        stat = self._stat(file_path)
+        if stat is None:
+            return None
+        if self._use_hash:
+            return stat + (self._hash(file_path),)
+        return stat
+
+    def has_changed(self, file_path):
+        """判断文件自上一次记录后是否发生了变化或已经过期 ."""
+        record = self._fingerprints.get(file_path)
+        if record is None:
+            return True
+        fingerprint, recorded_at = record
+        if self._ttl is not None and time.time() - recorded_at >= self._ttl:
+            return True
+        stat = self._stat(file_path)
+        if stat is None or stat != fingerprint[:2]:
+            return True
+        if self._use_hash:
+            # mtime和size没有变化，比较文件内容
+            return self._hash(file_path) != fingerprint[2]
+        return False
+
+    def should_process(self, file_path):
+        """判断文件是否需要处理，并更新计数 ."""
+        if self.has_changed(file_path):
+            self.processed_count += 1
+            return True
+        self.skipped_count += 1
+        return False
+
+    def record(self, file_path):
+        """记录文件当前的指纹 ."""
+        fingerprint = self.fingerprint(file_path)
+        if fingerprint is None:
+            self._fingerprints.pop(file_path, None)
+        else:
+            self._fingerprints[file_path] = (fingerprint, time.time())
+
+    def forget(self, file_path):
+        """删除文件的指纹，下一次检测时文件一定需要处理 ."""
+        self._fingerprints.pop(file_path, None)
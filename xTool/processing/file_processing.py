@@ -8,14 +8,20 @@ from __future__ import unicode_literals
 import logging
 import os
 import re
+import signal
 import sys
 import time
 import zipfile
 from abc import ABCMeta, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from datetime import timedelta
 import multiprocessing
+from multiprocessing.connection import wait
 
 
+from xTool.collections.priority_queue import PriorityQueue
+from xTool.processing.runtime_stats import FileRuntimeStats
+from xTool.stats.stats_logger import DummyStatsLogger
 from xTool.utils import timezone
 from xTool.utils.log.logging_mixin import LoggingMixin
 from xTool.utils.log.logging_mixin import set_context
@@ -23,6 +29,30 @@ from xTool.utils.log.logging_mixin import StreamLogWriter
 from xTool.exceptions import XToolException
 
 
+# 子进程发送给父进程的消息类型：部分结果，以及最后一批结果
+RESULT_PARTIAL = 'partial'
+RESULT_DONE = 'done'
+
+
+def send_result(result_channel, result, batch_size):
+    """将文件处理函数的返回值发送给父进程
+
+    如果返回值是列表或None，一次性发送；
+    如果返回值是生成器等可迭代对象，则每batch_size个结果发送一次，
+    管道写满时会阻塞，直到父进程取走结果
+    """
+    if result is None or isinstance(result, (list, tuple)):
+        result_channel.send((RESULT_DONE, result))
+        return
+    batch = []
+    for value in result:
+        batch.append(value)
+        if len(batch) >= batch_size:
+            result_channel.send((RESULT_PARTIAL, batch))
+            batch = []
+    result_channel.send((RESULT_DONE, batch))
+
+
 class AbstractFileProcessor(object):
     """文件处理器抽象类 ."""
     __metaclass__ = ABCMeta
@@ -73,22 +103,53 @@ class AbstractFileProcessor(object):
         """获得处理器处理的文件路径 ."""
         raise NotImplementedError()
 
+    @property
+    def waitables(self):
+        """获得可以被 multiprocessing.connection.wait 等待的对象列表，
+        例如进程的sentinel和结果管道，当处理器执行完成时这些对象会变为就绪状态
+
+        返回空列表表示处理器不支持事件通知，管理器会在每次心跳时轮询 done 属性
+        """
+        return []
+
+    def drain_results(self, max_items=None):
+        """取走处理器在运行过程中已经返回的部分结果
+
+        :param max_items: 最多取走的结果数量，None表示全部取走
+        :rtype: list
+        """
+        return []
+
 
 class BaseMultiprocessFileProcessor(AbstractFileProcessor, LoggingMixin):
-    """文件处理器基类 ."""
+    """文件处理器基类
+
+    process_file 可以返回结果数组，也可以是一个生成器，
+    生成器产生的结果会分批发送给父进程，父进程通过 drain_results 在子进程运行过程中取走结果
+    """
 
     # 记录这个类实例的创建数量
     class_creation_counter = 0
+    # 流式返回结果时，每批发送给父进程的结果数量
+    result_batch_size = 100
+    # 父进程缓存的部分结果的最大数量，超过后不再从管道中读取，子进程的发送会被阻塞
+    max_buffered_results = 10000
 
     def __init__(self, file_path, *args, **kwargs):
         # 文件的路径
         self._file_path = file_path
-        # 创建一个多进程队列
-        self._result_queue = multiprocessing.Queue()
+        # 创建一个单向管道，子进程通过写端返回结果，父进程可以等待读端就绪
+        self._result_reader, self._result_writer = multiprocessing.Pipe(duplex=False)
         # 文件处理进程对象
         self._process = None
         # 文件处理进程返回的结果
         self._result = None
+        # 文件处理进程返回的尚未被取走的部分结果
+        self._partial_results = []
+        # 是否已经收到了最后一批结果
+        self._result_received = False
+        # 结果管道是否已经关闭
+        self._channel_closed = False
         # 文件处理进程是否完成的标识
         self._done = False
         # 文件处理进程的开始时间
@@ -109,11 +170,11 @@ class BaseMultiprocessFileProcessor(AbstractFileProcessor, LoggingMixin):
         """子进程文件处理函数 .
         
         Returns:
-            返回结果数组
+            返回结果数组，或者逐个产生结果的生成器
         """
         raise NotImplementedError()
 
-    def _handler(self, result_queue, file_path, *args, **kwargs):
+    def _handler(self, result_channel, file_path, *args, **kwargs):
         log = logging.getLogger("xTool.processor")
         # 设置日志处理器上下文，例如日志handler初始化时创建日志目录
         set_context(log, file_path)
@@ -125,8 +186,8 @@ class BaseMultiprocessFileProcessor(AbstractFileProcessor, LoggingMixin):
             log.info("Started process (PID=%s) to work on %s", os.getpid(), file_path)
             # 执行文件处理
             result = self.process_file(file_path)
-            # 将执行结果保存到结果队列
-            result_queue.put(result)
+            # 将执行结果发送给父进程
+            send_result(result_channel, result, self.result_batch_size)
             end_time = time.time()
             log.info(
                 "Processing %s took %.3f seconds", file_path, end_time - start_time
@@ -137,17 +198,19 @@ class BaseMultiprocessFileProcessor(AbstractFileProcessor, LoggingMixin):
 
     def start(self):
         """创建一个文件处理子进程，
-        并将结果保存到self._result_queue结果队列
+        并将结果通过self._result_writer管道发送给父进程
         """
         thread_name = "{}_{}-Process".format(self.__class__.__name__, self._instance_id)
         self._process = multiprocessing.Process(
             target=self._handler,
-            args=(self._result_queue,
+            args=(self._result_writer,
                   self.file_path,
                   self.args,
                   self.kwargs),
             name=thread_name)
         self._process.start()
+        # 关闭父进程持有的写端，子进程异常退出时读端能够收到EOF
+        self._result_writer.close()
         # 记录子进程启动时间
         self._start_time = timezone.system_now()
         return self._process
@@ -156,8 +219,9 @@ class BaseMultiprocessFileProcessor(AbstractFileProcessor, LoggingMixin):
         """终止文件处理子进程 ."""
         if self._process is None:
             raise XToolException("Tried to call stop before starting!")
-        # 删除结果队列
-        self._result_queue = None
+        # 关闭结果管道
+        self._result_reader.close()
+        self._channel_closed = True
         # 终止进程
         self._process.terminate()
         # 等待进程被杀死
@@ -191,30 +255,65 @@ class BaseMultiprocessFileProcessor(AbstractFileProcessor, LoggingMixin):
         if self._done:
             return True
 
-        # 如果子进程有结果返回
-        if not self._result_queue.empty():
-            # 获得执行结果
-            self._result = self._result_queue.get_nowait()
-            self._done = True
-            self.log.debug("Waiting for %s", self._process)
-            # 等待子进程释放资源并结束
-            self._process.join()
-            return True
+        # 读取子进程返回的结果，缓存的部分结果过多时暂停读取
+        self._receive_results(self.max_buffered_results)
 
-        # 如果子进程已经执行完成
-        if not self._process.is_alive():
+        # 如果子进程已经返回了最后一批结果，或子进程已经关闭了管道
+        # 或者子进程已经执行完成
+        if (self._result_received or self._channel_closed or
+                not self._process.is_alive()):
             # 设置完成标记
             self._done = True
-            # 获得子进程执行结果
-            if not self._result_queue.empty():
-                self._result = self._result_queue.get_nowait()
-            # 等待子进程资源释放
+            # 获得子进程尚未读取的执行结果
+            self._receive_results()
             self.log.debug("Waiting for %s", self._process)
+            # 等待子进程释放资源并结束
             self._process.join()
             return True
 
         return False
 
+    def _receive_results(self, max_items=None):
+        """从结果管道中读取子进程发送的结果
+
+        :param max_items: 缓存的部分结果达到此数量时停止读取，None表示读取全部
+        """
+        while not (self._result_received or self._channel_closed):
+            if max_items is not None and len(self._partial_results) >= max_items:
+                break
+            if not self._result_reader.poll():
+                break
+            try:
+                kind, items = self._result_reader.recv()
+            except EOFError:
+                # 子进程没有发送最后一批结果就退出了
+                self._channel_closed = True
+                break
+            if kind == RESULT_PARTIAL:
+                self._partial_results.extend(items)
+            else:
+                self._result = items
+                self._result_received = True
+
+    def drain_results(self, max_items=None):
+        """取走子进程在运行过程中已经返回的部分结果 ."""
+        if self._process is None:
+            return []
+        self._receive_results(max_items)
+        if max_items is None:
+            items, self._partial_results = self._partial_results, []
+        else:
+            items = self._partial_results[:max_items]
+            del self._partial_results[:max_items]
+        return items
+
+    @property
+    def waitables(self):
+        """子进程的结果管道和进程sentinel ."""
+        if self._process is None or self._done:
+            return []
+        return [self._result_reader, self._process.sentinel]
+
     @property
     def result(self):
         """获得文件处理子进程的执行结果 ."""
@@ -230,6 +329,352 @@ class BaseMultiprocessFileProcessor(AbstractFileProcessor, LoggingMixin):
         return self._start_time
 
 
+def _pool_worker_loop(process_file, task_channel, batch_size):
+    """进程池工作进程的主循环，从管道中获取文件路径并返回处理结果 ."""
+    log = logging.getLogger("xTool.processor")
+    while True:
+        try:
+            file_path = task_channel.recv()
+        except EOFError:
+            break
+        # 收到None表示进程池关闭
+        if file_path is None:
+            break
+        # 设置日志处理器上下文
+        set_context(log, file_path)
+        start_time = time.time()
+        log.info("Started process (PID=%s) to work on %s", os.getpid(), file_path)
+        try:
+            send_result(task_channel, process_file(file_path), batch_size)
+        except Exception:
+            log.exception("Got an exception while processing %s", file_path)
+            task_channel.send((RESULT_DONE, None))
+        log.info(
+            "Processing %s took %.3f seconds", file_path, time.time() - start_time
+        )
+
+
+class _PoolWorker(object):
+    """进程池中的常驻工作进程 ."""
+
+    def __init__(self, process, channel):
+        # 工作进程对象
+        self.process = process
+        # 父进程与工作进程通信的管道
+        self.channel = channel
+        # 工作进程正在执行的文件处理器
+        self.processor = None
+
+
+class FileProcessorPool(LoggingMixin):
+    """常驻文件处理进程池
+
+    启动固定数量的常驻工作进程，文件处理器不再为每个文件创建子进程，
+    而是将文件路径放到进程池的任务队列中，由空闲的工作进程处理并通过管道返回结果。
+    工作进程异常退出时会被自动重启。
+
+    pool = FileProcessorPool(process_file, size=4)
+    pool.start()
+    manager = FileProcessorManager(..., parallelism=4, ...,
+                                   processor_factory=pool.processor_factory)
+    ...
+    pool.close()
+
+    :param process_file: 文件处理函数，接受一个文件路径，返回结果数组
+    :type process_file: (unicode) -> list
+    :param size: 工作进程的数量
+    :type size: int
+    :param result_batch_size: 文件处理函数返回生成器时，每批发送给父进程的结果数量
+    :type result_batch_size: int
+    """
+
+    def __init__(self, process_file, size, result_batch_size=100):
+        if size < 1:
+            raise XToolException("FileProcessorPool size must be positive")
+        self._process_file = process_file
+        self._size = size
+        self._result_batch_size = result_batch_size
+        # 常驻工作进程
+        # :type : list[_PoolWorker]
+        self._workers = []
+        # 等待分配工作进程的文件处理器
+        self._pending = deque()
+        # 工作进程创建次数，用于进程命名
+        self._spawn_count = 0
+
+    @property
+    def size(self):
+        """工作进程的数量 ."""
+        return self._size
+
+    @property
+    def waitables(self):
+        """所有工作进程的通信管道，工作进程返回结果或退出时管道会变为就绪状态 ."""
+        return [worker.channel for worker in self._workers]
+
+    def start(self):
+        """启动所有的工作进程 ."""
+        if self._workers:
+            raise XToolException("FileProcessorPool already started!")
+        for _ in range(self._size):
+            self._workers.append(self._spawn_worker())
+
+    def _spawn_worker(self):
+        """创建并启动一个工作进程 ."""
+        channel, task_channel = multiprocessing.Pipe()
+        name = "{}_{}-Process".format(self.__class__.__name__, self._spawn_count)
+        self._spawn_count += 1
+        process = multiprocessing.Process(
+            target=_pool_worker_loop,
+            args=(self._process_file, task_channel, self._result_batch_size),
+            name=name)
+        process.daemon = True
+        process.start()
+        # 关闭父进程持有的子进程端，工作进程退出时父进程能够收到EOF
+        task_channel.close()
+        return _PoolWorker(process, channel)
+
+    def _respawn_worker(self, worker):
+        """重启工作进程，旧的管道由垃圾回收关闭 ."""
+        new_worker = self._spawn_worker()
+        worker.process = new_worker.process
+        worker.channel = new_worker.channel
+        worker.processor = None
+
+    def processor_factory(self, file_path):
+        """创建使用此进程池的文件处理器，可作为 FileProcessorManager 的 processor_factory ."""
+        return PooledFileProcessor(file_path, self)
+
+    def submit(self, processor):
+        """提交文件处理器，等待空闲的工作进程处理 ."""
+        if not self._workers:
+            raise XToolException("Tried to submit before the pool started!")
+        self._pending.append(processor)
+        self._dispatch()
+
+    def cancel(self, processor, sigkill=False):
+        """取消文件处理器，如果正在执行则重启对应的工作进程 ."""
+        try:
+            self._pending.remove(processor)
+            return
+        except ValueError:
+            pass
+        for worker in self._workers:
+            if worker.processor is processor:
+                self._kill_worker(worker, sigkill)
+                self._respawn_worker(worker)
+                self._dispatch()
+                return
+
+    def _kill_worker(self, worker, sigkill=False):
+        """终止工作进程 ."""
+        worker.process.terminate()
+        worker.process.join(5)
+        if sigkill and worker.process.is_alive():
+            self.log.warning("Killing PID %s", worker.process.pid)
+            os.kill(worker.process.pid, signal.SIGKILL)
+            worker.process.join()
+
+    def poll(self):
+        """接收工作进程返回的结果，并将等待中的文件处理器分配给空闲的工作进程 ."""
+        channels = self.waitables
+        if channels:
+            ready = set(wait(channels, 0))
+            for worker in self._workers:
+                if worker.channel in ready:
+                    self._receive(worker)
+        self._dispatch()
+
+    def poll_processor(self, processor):
+        """只接收文件处理器所在工作进程返回的结果，不会取走其它处理器的消息
+
+        处理器的可等待对象只包含它所在工作进程的管道，如果在检查一个处理器时取走其它处理器的消息，
+        其它处理器的管道不再就绪，管理器就无法及时发现它们已经完成
+        """
+        for worker in self._workers:
+            if worker.processor is processor:
+                # 取走管道中已经到达的所有消息，直到处理完成
+                while worker.processor is processor and worker.channel.poll(0):
+                    self._receive(worker)
+                break
+        # 工作进程空闲后分配给等待中的文件处理器
+        self._dispatch()
+
+    def waitables_of(self, processor):
+        """获得文件处理器所在工作进程的管道，尚未分配工作进程时返回空列表 ."""
+        for worker in self._workers:
+            if worker.processor is processor:
+                return [worker.channel]
+        return []
+
+    def _receive(self, worker):
+        """接收工作进程返回的结果 ."""
+        processor = worker.processor
+        try:
+            kind, result = worker.channel.recv()
+            if kind == RESULT_PARTIAL:
+                # 文件尚未处理完成，工作进程继续处理当前文件
+                if processor is not None:
+                    processor._add_partial_results(result)
+                return
+            worker.processor = None
+            exit_code = 0
+        except EOFError:
+            worker.processor = None
+            # 工作进程异常退出，重启工作进程
+            worker.process.join()
+            exit_code = worker.process.exitcode
+            self.log.warning("Pool worker (PID=%s) exited with return code %s",
+                             worker.process.pid, exit_code)
+            result = None
+            self._respawn_worker(worker)
+        if processor is not None:
+            processor._finish(result, exit_code)
+
+    def _dispatch(self):
+        """将等待中的文件处理器分配给空闲的工作进程 ."""
+        for worker in self._workers:
+            if not self._pending:
+                break
+            if worker.processor is not None:
+                continue
+            processor = self._pending.popleft()
+            try:
+                worker.channel.send(processor.file_path)
+            except (IOError, OSError):
+                # 空闲的工作进程已经退出
+                self._pending.appendleft(processor)
+                self._respawn_worker(worker)
+                continue
+            worker.processor = processor
+            processor._assign(worker.process.pid)
+
+    def close(self):
+        """关闭进程池，等待工作进程退出 ."""
+        for worker in self._workers:
+            try:
+                worker.channel.send(None)
+            except (IOError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                self._kill_worker(worker, sigkill=True)
+        self._workers = []
+        self._pending.clear()
+
+
+class PooledFileProcessor(AbstractFileProcessor, LoggingMixin):
+    """使用常驻进程池处理文件的处理器 ."""
+
+    def __init__(self, file_path, pool):
+        # 文件的路径
+        self._file_path = file_path
+        # 文件处理进程池
+        self._pool = pool
+        # 是否已经提交到进程池
+        self._started = False
+        # 处理文件的工作进程ID
+        self._pid = None
+        # 文件处理的结果
+        self._result = None
+        # 尚未被取走的部分结果
+        self._partial_results = []
+        # 工作进程的退出码，正常处理完成为0
+        self._exit_code = None
+        # 文件处理是否完成的标识
+        self._done = False
+        # 文件处理的开始时间
+        self._start_time = None
+
+    @property
+    def file_path(self):
+        """返回文件的路径 ."""
+        return self._file_path
+
+    def start(self):
+        """将文件提交到进程池 ."""
+        self._start_time = timezone.system_now()
+        self._started = True
+        self._pool.submit(self)
+
+    def _assign(self, pid):
+        """文件被分配给工作进程时由进程池调用 ."""
+        self._pid = pid
+        self._start_time = timezone.system_now()
+
+    def _add_partial_results(self, items):
+        """收到部分结果时由进程池调用 ."""
+        self._partial_results.extend(items)
+
+    def drain_results(self, max_items=None):
+        """取走已经返回的部分结果 ."""
+        if self._started and not self._done:
+            self._pool.poll_processor(self)
+        if max_items is None:
+            items, self._partial_results = self._partial_results, []
+        else:
+            items = self._partial_results[:max_items]
+            del self._partial_results[:max_items]
+        return items
+
+    def _finish(self, result, exit_code):
+        """文件处理完成时由进程池调用 ."""
+        self._result = result
+        self._exit_code = exit_code
+        self._done = True
+
+    def terminate(self, sigkill=False):
+        """取消文件处理 ."""
+        if not self._started:
+            raise XToolException("Tried to call stop before starting!")
+        self._pool.cancel(self, sigkill=sigkill)
+
+    @property
+    def pid(self):
+        """获得处理文件的工作进程ID，尚未分配工作进程时返回None ."""
+        if not self._started:
+            raise XToolException("Tried to get PID before starting!")
+        return self._pid
+
+    @property
+    def exit_code(self):
+        """获得处理文件的工作进程的退出码 ."""
+        if not self._done:
+            raise XToolException("Tried to call retcode before process was finished!")
+        return self._exit_code
+
+    @property
+    def done(self):
+        """判断文件是否已经处理完成 ."""
+        if not self._started:
+            raise XToolException("Tried to see if it's done before starting!")
+        if not self._done:
+            self._pool.poll_processor(self)
+        return self._done
+
+    @property
+    def result(self):
+        """获得文件处理的结果 ."""
+        if not self.done:
+            raise XToolException("Tried to get the result before it's done!")
+        return self._result
+
+    @property
+    def start_time(self):
+        """获得文件处理的开始时间 ."""
+        if self._start_time is None:
+            raise XToolException("Tried to get start time before it started!")
+        return self._start_time
+
+    @property
+    def waitables(self):
+        """处理文件的工作进程的通信管道，尚未分配工作进程时返回空列表，由管理器轮询 ."""
+        if not self._started or self._done:
+            return []
+        return self._pool.waitables_of(self)
+
+
 class FileProcessorManager(LoggingMixin):
     """文件处理器进程管理类
 
@@ -238,13 +683,20 @@ class FileProcessorManager(LoggingMixin):
     - 支持并发控制
     - 支持同一个文件在多次调度之间的间隔设置
     - 支持对进程池输入参数的动态改变
-    - 支持以心跳的形式返还进程的部分处理结果
+    - 支持以心跳的形式返还进程的部分处理结果，包括正在运行的处理器流式返回的结果
+    - 支持按到期时间、上次执行时长或自定义优先级调度文件
 
-    :type _file_path_queue: list[unicode]
+    :type _file_path_queue: PriorityQueue
+    :type _file_path_schedule: PriorityQueue
     :type _processors: dict[unicode, AbstractFileProcessor]
+    :type _waitables: dict[object, set[unicode]]
     :type _last_runtime: dict[unicode, float]
     :type _last_finish_time: dict[unicode, datetime]
     """
+
+    # 存在不支持事件通知的处理器时，轮询 done 属性的时间间隔
+    poll_interval = 0.1
+
     def __init__(self,
                  file_directory,
                  file_paths,
@@ -252,20 +704,73 @@ class FileProcessorManager(LoggingMixin):
                  process_file_interval,
                  min_file_parsing_loop_time,
                  max_runs,
-                 processor_factory):
+                 processor_factory,
+                 file_priority=None,
+                 change_detector=None,
+                 result_batch_size=1000,
+                 parallelism_controller=None,
+                 stats_client=None,
+                 stats_interval=60,
+                 runtime_stats_window=100,
+                 file_timeout=None,
+                 file_timeout_overrides=None,
+                 max_timeout_backoff=3600):
         """
         :param processor_factory: function that creates processors for file definition files.
         :type processor_factory: (unicode, unicode) -> (AbstractFileProcessor)
+        :param file_priority: 就绪文件的启动顺序
+            None: 最早到期的文件优先处理
+            'runtime': 上一次执行时间最长的文件优先处理
+            callable: 接受文件路径，返回优先级，值越大越先处理
+        :type file_priority: None | unicode | (unicode) -> (float)
+        :param change_detector: 文件变更检测器，未变化的文件到期后不再处理
+        :type change_detector: FileChangeDetector
+        :param result_batch_size: 每次心跳从每个正在运行的处理器中最多取走的部分结果数量
+        :type result_batch_size: int
+        :param parallelism_controller: 并发度控制器，每次心跳时调整并发度，
+            parallelism 作为初始并发度
+        :type parallelism_controller: xTool.processing.parallelism.ParallelismController
+        :param stats_client: 统计客户端
+        :param stats_interval: 发送文件执行时长统计值的间隔，单位是秒
+        :type stats_interval: float
+        :param runtime_stats_window: 每个文件保留的执行时长样本数量
+        :type runtime_stats_window: int
+        :param file_timeout: 文件处理器的最长执行时间，单位是秒，超时的处理器会被强制杀死，
+            None 表示不限制
+        :type file_timeout: float
+        :param file_timeout_overrides: 指定文件的最长执行时间，覆盖 file_timeout
+        :type file_timeout_overrides: dict[unicode, float]
+        :param max_timeout_backoff: 超时的文件再次调度的最长间隔，单位是秒，
+            文件连续超时时，调度间隔按 max(process_file_interval, 文件的最长执行时间) * 2^超时次数
+            指数增长，process_file_interval 为0时也会退避
+        :type max_timeout_backoff: float
         """
+        if not (file_priority is None or file_priority == 'runtime' or
+                callable(file_priority)):
+            raise XToolException(
+                "Invalid file_priority {!r}".format(file_priority))
         # 文件的目录
         self._file_directory = file_directory
         # 需要处理的文件，每个文件启动一个文件处理器进程
         # file_paths 是 file_directory 目录下的有效文件路径
-        self._file_paths = file_paths
-        # 文件队列
-        self._file_path_queue = []
+        # 使用有序字典保存文件路径，增删文件都是O(1)
+        self._file_paths = OrderedDict((file_path, None) for file_path in file_paths)
+        # 已到调度时间的文件队列，按优先级出队
+        self._file_path_queue = PriorityQueue()
+        # 尚未到调度时间的文件队列，按下一次调度时间出队
+        self._file_path_schedule = PriorityQueue()
+        # 就绪文件的启动顺序
+        self._file_priority = file_priority
+        # 文件变更检测器
+        self._change_detector = change_detector
+        # 每次心跳从正在运行的处理器中最多取走的结果数量
+        self._result_batch_size = result_batch_size
         # 文件处理器进程的最大数量，即能够同时处理多少个文件
         self._parallelism = parallelism
+        # 并发度控制器
+        self._parallelism_controller = parallelism_controller
+        if parallelism_controller is not None:
+            self._parallelism = parallelism_controller.clamp(parallelism)
         # job运行的最大次数，默认是-1
         # 如果是>0，则运行指定次数后，调用进程就会停止
         self._max_runs = max_runs
@@ -277,20 +782,71 @@ class FileProcessorManager(LoggingMixin):
         self._processor_factory = processor_factory
         # 记录正在运行的处理器
         self._processors = {}
+        # 记录处理器可等待对象与文件路径的映射，用于等待处理器完成
+        self._waitables = {}
+        # 记录每个文件处理器登记的可等待对象
+        self._processor_waitables = {}
+        # 记录不支持事件通知，需要轮询的文件处理器
+        self._polled_file_paths = set()
+        # 记录在心跳之外已经确认完成的文件处理器
+        self._finished_file_paths = set()
+        # 记录还有部分结果没有被取走的文件处理器
+        self._streaming_file_paths = set()
         # 记录文件处理器执行完成后的执行时长
         self._last_runtime = {}
+        # 需要处理的文件最近一次执行时长的总和与数量，调整并发度时不需要遍历所有文件
+        self._runtime_sum = 0.0
+        self._runtime_count = 0
         # 记录文件处理器执行完成后的结束时间
         self._last_finish_time = {}
+        # 文件处理器的最长执行时间
+        self._file_timeout = file_timeout
+        self._file_timeout_overrides = dict(file_timeout_overrides or {})
+        self._max_timeout_backoff = max_timeout_backoff
+        # 记录文件连续超时的次数
+        self._timeout_count = defaultdict(int)
+        # 记录已被杀死、尚未在心跳中处理的超时处理器
+        # :type : dict[unicode, AbstractFileProcessor]
+        self._timed_out_processors = {}
+        # 设置了最长执行时间的处理器按超时时间排序，心跳时只检查已经超时的处理器
+        self._processor_deadlines = PriorityQueue()
+        # 记录文件最近多次的执行时长
+        self._runtime_stats = FileRuntimeStats(runtime_stats_window)
+        # 统计客户端
+        self._stats_client = stats_client or DummyStatsLogger
+        # 发送执行时长统计值的间隔和上一次发送的时间
+        self._stats_interval = stats_interval
+        self._last_stats_time = time.time()
         # 处理器运行次数
         self._run_count = defaultdict(int)
         # Scheduler heartbeat key.
         # 记录心跳的次数
         self._heart_beat_key = 'heart-beat'
+        # 新的文件需要立即调度
+        for file_path in self._file_paths:
+            self._file_path_schedule.push(file_path, 0)
+
+    @property
+    def parallelism(self):
+        """当前的并发度 ."""
+        return self._parallelism
+
+    @property
+    def runtime_stats(self):
+        """文件执行时长的滚动统计
+
+        :rtype: FileRuntimeStats
+        """
+        return self._runtime_stats
+
+    def slowest(self, n=10, key='mean'):
+        """获得执行时长最长的n个文件及其统计值 ."""
+        return self._runtime_stats.slowest(n, key)
 
     @property
     def file_paths(self):
         """返回需要处理的文件列表 ."""
-        return self._file_paths
+        return list(self._file_paths)
 
     def get_pid(self, file_path):
         """获得文件所在处理器的进程ID ."""
@@ -299,8 +855,8 @@ class FileProcessorManager(LoggingMixin):
         return None
 
     def get_all_pids(self):
-        """获得所有文件处理器的进程ID列表 ."""
-        return [x.pid for x in self._processors.values()]
+        """获得所有文件处理器的进程ID列表，不包含尚未分配进程的处理器 ."""
+        return [x.pid for x in self._processors.values() if x.pid is not None]
 
     def get_runtime(self, file_path):
         """获得文件处理器的运行时长，单位是秒 ."""
@@ -313,10 +869,74 @@ class FileProcessorManager(LoggingMixin):
         """文件处理器执行完成后，获得执行的时长，单位是秒 ."""
         return self._last_runtime.get(file_path)
 
+    def _set_last_runtime(self, file_path, runtime):
+        """记录文件最近一次的执行时长，并更新执行时长的总和 ."""
+        last_runtime = self._last_runtime.get(file_path)
+        self._last_runtime[file_path] = runtime
+        if file_path in self._file_paths:
+            if last_runtime is None:
+                self._runtime_count += 1
+            else:
+                self._runtime_sum -= last_runtime
+            self._runtime_sum += runtime
+
+    def _total_runtime(self):
+        """获得需要处理的文件最近一次执行时长的总和，没有执行过的文件时返回None ."""
+        if not self._runtime_count:
+            return None
+        return max(self._runtime_sum, 0.0)
+
     def get_last_finish_time(self, file_path):
         """文件处理器执行完成后，获得的执行完成时间，单位是秒 ."""
         return self._last_finish_time.get(file_path)
 
+    def get_timeout_count(self, file_path):
+        """获得文件连续超时的次数 ."""
+        return self._timeout_count.get(file_path, 0)
+
+    def _get_file_timeout(self, file_path):
+        """获得文件处理器的最长执行时间 ."""
+        return self._file_timeout_overrides.get(file_path, self._file_timeout)
+
+    def _get_deadline(self, file_path, processor):
+        """获得文件处理器的超时时间，没有设置最长执行时间时返回None ."""
+        file_timeout = self._get_file_timeout(file_path)
+        if file_timeout is None:
+            return None
+        return processor.start_time + timedelta(seconds=file_timeout)
+
+    def _kill_overdue_processors(self):
+        """杀死超时的文件处理器
+
+        只检查超时时间已到的处理器，时间复杂度与超时的处理器数量成正比
+
+        :return: 距离下一个处理器超时的秒数，没有设置超时的处理器时返回None
+        """
+        now = timezone.system_now()
+        while self._processor_deadlines:
+            file_path, deadline = self._processor_deadlines.peek()
+            if deadline > now:
+                return (deadline - now).total_seconds()
+            self._processor_deadlines.pop()
+            processor = self._processors[file_path]
+            # 进程池中的处理器分配到工作进程时会更新开始时间，需要重新计算超时时间
+            deadline = self._get_deadline(file_path, processor)
+            if deadline > now:
+                self._processor_deadlines.push(file_path, deadline)
+                continue
+            if processor.done:
+                # 共享管道的处理器（例如进程池）完成后管道不再就绪，需要记录下来在心跳时处理
+                self._finished_file_paths.add(file_path)
+                continue
+            file_timeout = self._get_file_timeout(file_path)
+            self.log.error("Processor for %s (PID: %s) timed out after %s seconds, "
+                           "killing it", file_path, processor.pid, file_timeout)
+            # 先从管理器中注销，被终止的处理器的管道不能再被等待
+            self._unregister_processor(file_path)
+            processor.terminate(sigkill=True)
+            self._timed_out_processors[file_path] = processor
+        return None
+
     def get_start_time(self, file_path):
         """获得文件处理器的开始时间 ."""
         if file_path in self._processors:
@@ -325,110 +945,310 @@ class FileProcessorManager(LoggingMixin):
 
     def set_file_paths(self, new_file_paths):
         """根据文件处理器需要处理的新的文件列表 ."""
-        # 设置目录下最新的文件路径数组
-        self._file_paths = new_file_paths
-        # 获得 self._file_path_queue 和  new_file_paths的交集
-        # 即从文件队列中删除不存在的文件
-        self._file_path_queue = [x for x in self._file_path_queue
-                                 if x in new_file_paths]
-        # 已删除的文件关联的处理器停止运行
-        filtered_processors = {}
-        for file_path, processor in self._processors.items():
-            if file_path in new_file_paths:
-                filtered_processors[file_path] = processor
-            else:
+        new_file_path_set = set(new_file_paths)
+        # 获得已删除的文件
+        self.remove_file_paths([file_path for file_path in self._file_paths
+                                if file_path not in new_file_path_set])
+        # 获得新增的文件
+        self.add_file_paths(new_file_paths)
+
+    def add_file_paths(self, file_paths):
+        """新增需要处理的文件，新增的文件需要立即调度，时间复杂度与新增文件的数量成正比 ."""
+        for file_path in file_paths:
+            if file_path in self._file_paths:
+                continue
+            self._file_paths[file_path] = None
+            if file_path in self._last_runtime:
+                self._runtime_sum += self._last_runtime[file_path]
+                self._runtime_count += 1
+            if (file_path not in self._processors and
+                    self._run_count[file_path] != self._max_runs):
+                self._file_path_schedule.push(file_path, 0)
+
+    def remove_file_paths(self, file_paths):
+        """删除不再需要处理的文件，时间复杂度与删除文件的数量成正比 ."""
+        for file_path in file_paths:
+            if self._file_paths.pop(file_path, False) is False:
+                continue
+            if file_path in self._last_runtime:
+                self._runtime_sum -= self._last_runtime[file_path]
+                self._runtime_count -= 1
+                if not self._runtime_count:
+                    # 消除浮点数累加的误差
+                    self._runtime_sum = 0.0
+            # 从文件队列中删除不存在的文件
+            self._file_path_queue.discard(file_path)
+            self._file_path_schedule.discard(file_path)
+            if self._change_detector is not None:
+                self._change_detector.forget(file_path)
+            self._runtime_stats.forget(file_path)
+            # 已删除的文件关联的处理器停止运行
+            if file_path in self._processors:
+                processor = self._unregister_processor(file_path)
                 # 如果正在执行的处理器文件不存在，则停止处理器
                 self.log.warning("Stopping processor for %s", file_path)
                 # 将被删除的文件关联的文件处理器进程，停止执行
                 processor.terminate()
-        self._processors = filtered_processors
+
+    def _get_file_priority(self, file_path, due_time):
+        """获得文件在就绪队列中的排序值，值越小越先被处理 ."""
+        if self._file_priority is None:
+            return due_time
+        if self._file_priority == 'runtime':
+            # 执行时间最长的文件优先处理，从未处理过的文件最先处理
+            return -self._last_runtime.get(file_path, float('inf'))
+        return -self._file_priority(file_path)
+
+    def _enqueue_due_file_paths(self, now):
+        """将已到调度时间的文件从调度队列移到就绪队列 ."""
+        file_paths_to_queue = []
+        while self._file_path_schedule:
+            file_path, due_time = self._file_path_schedule.peek()
+            if due_time > now:
+                break
+            self._file_path_schedule.pop()
+            self._file_path_queue.push(
+                file_path, self._get_file_priority(file_path, due_time))
+            file_paths_to_queue.append(file_path)
+        return file_paths_to_queue
+
+    def _register_processor(self, file_path, processor):
+        """记录已启动的文件处理器，并登记它的可等待对象 ."""
+        self._processors[file_path] = processor
+        self._register_waitables(file_path, processor)
+        deadline = self._get_deadline(file_path, processor)
+        if deadline is not None:
+            self._processor_deadlines.push(file_path, deadline)
+
+    def _unregister_processor(self, file_path):
+        """删除文件处理器，并注销它的可等待对象 ."""
+        processor = self._processors.pop(file_path)
+        self._unregister_waitables(file_path)
+        self._processor_deadlines.discard(file_path)
+        self._finished_file_paths.discard(file_path)
+        self._streaming_file_paths.discard(file_path)
+        return processor
+
+    def _register_waitables(self, file_path, processor):
+        """登记文件处理器的可等待对象 ."""
+        waitables = list(processor.waitables)
+        self._processor_waitables[file_path] = waitables
+        if not waitables:
+            self._polled_file_paths.add(file_path)
+        for waitable in waitables:
+            self._waitables.setdefault(waitable, set()).add(file_path)
+
+    def _unregister_waitables(self, file_path):
+        """注销文件处理器的可等待对象 ."""
+        self._polled_file_paths.discard(file_path)
+        for waitable in self._processor_waitables.pop(file_path, []):
+            file_paths = self._waitables.get(waitable)
+            if file_paths is not None:
+                file_paths.discard(file_path)
+                if not file_paths:
+                    del self._waitables[waitable]
+
+    def _refresh_waitables(self, file_path, processor):
+        """可等待对象就绪但处理器尚未完成时，重新登记处理器的可等待对象，
+        例如进程池中的工作进程被重启后，管道会发生变化
+        """
+        if list(processor.waitables) != self._processor_waitables[file_path]:
+            self._unregister_waitables(file_path)
+            self._register_waitables(file_path, processor)
+
+    def _collect_finished_processors(self, timeout=0):
+        """获得已完成的文件处理器，以及正在运行的处理器返回的部分结果
+
+        只检查可等待对象已就绪的处理器，以及不支持事件通知的处理器，
+        不需要在每次心跳时遍历所有正在运行的处理器
+
+        :param timeout: 没有处理器完成且没有部分结果时，最多阻塞等待的秒数
+        :return: (dict[unicode, AbstractFileProcessor], list)
+        """
+        deadline = time.time() + timeout
+        block_for = 0
+        while True:
+            ready_file_paths = (self._polled_file_paths |
+                                self._finished_file_paths |
+                                self._streaming_file_paths)
+            self._streaming_file_paths = set()
+            if self._waitables:
+                # 阻塞等待任意一个处理器的管道或进程就绪
+                for waitable in wait(list(self._waitables), block_for):
+                    ready_file_paths.update(self._waitables[waitable])
+            elif block_for > 0:
+                time.sleep(block_for)
+
+            finished_processors = {}
+            partial_results = []
+            for file_path in ready_file_paths:
+                processor = self._processors[file_path]
+                if processor.done:
+                    finished_processors[file_path] = processor
+                    continue
+                # 取走正在运行的处理器已经返回的部分结果，每次心跳的数量有上限
+                items = processor.drain_results(self._result_batch_size)
+                partial_results.extend(items)
+                if len(items) >= self._result_batch_size:
+                    # 可能还有缓存的结果，下一次心跳继续取
+                    self._streaming_file_paths.add(file_path)
+                # 等待进程池分配工作进程的处理器，分配之后不再需要轮询
+                self._refresh_waitables(file_path, processor)
+
+            remaining = deadline - time.time()
+            if (finished_processors or partial_results or remaining <= 0 or
+                    not self._processors):
+                return finished_processors, partial_results
+            block_for = remaining
+            if self._polled_file_paths:
+                block_for = min(block_for, self.poll_interval)
 
     def processing_count(self):
         """获得文件处理器的数量 ."""
         return len(self._processors)
 
     def wait_until_finished(self):
-        """阻塞等待所有的文件处理器执行完成 ."""
-        for file_path, processor in self._processors.items():
-            while not processor.done:
-                time.sleep(0.1)
+        """阻塞等待所有的文件处理器执行完成，超时的处理器会被杀死 ."""
+        pending = set(self._processors)
+        while True:
+            next_timeout = self._kill_overdue_processors()
+            pending &= set(self._processors)
+            finished = set(file_path for file_path in pending
+                           if self._processors[file_path].done)
+            # 共享管道的处理器（例如进程池）完成后管道不再就绪，需要记录下来在心跳时处理
+            self._finished_file_paths |= finished
+            pending -= finished
+            if not pending:
+                break
+            waitables = list(set(waitable
+                                 for file_path in pending
+                                 for waitable in self._processors[file_path].waitables))
+            if pending & self._polled_file_paths or not waitables:
+                block_for = self.poll_interval
+            else:
+                block_for = None
+            if next_timeout is not None:
+                block_for = next_timeout if block_for is None else min(block_for,
+                                                                       next_timeout)
+            if waitables:
+                wait(waitables, block_for)
+            else:
+                time.sleep(block_for)
 
-    def heartbeat(self):
+    def _handle_timed_out_processors(self):
+        """处理被杀死的超时处理器，返回它们在超时之前返回的部分结果 ."""
+        result = []
+        now = timezone.system_now()
+        for file_path, processor in self._timed_out_processors.items():
+            self._set_last_runtime(file_path,
+                                   (now - processor.start_time).total_seconds())
+            self._last_finish_time[file_path] = now
+            self._run_count[file_path] += 1
+            self._timeout_count[file_path] += 1
+            self._stats_client.incr('file_processor.timeout')
+            result.extend(processor.drain_results())
+            # 超时的文件下一次需要重新处理
+            if self._change_detector is not None:
+                self._change_detector.forget(file_path)
+            # 连续超时的文件按指数退避再次调度，防止一个文件长期占用处理器
+            if (file_path in self._file_paths and
+                    self._run_count[file_path] != self._max_runs):
+                # 调度间隔为0时使用文件的最长执行时间作为退避的基数
+                base = max(self._process_file_interval,
+                           self._get_file_timeout(file_path) or 0)
+                backoff = min(base * 2 ** self._timeout_count[file_path],
+                              self._max_timeout_backoff)
+                self._file_path_schedule.push(file_path, time.time() + backoff)
+        self._timed_out_processors = {}
+        return result
+
+    def _skip_unchanged_file(self, file_path):
+        """跳过没有变化的文件，并在间隔时间之后再次检测 ."""
+        if self._change_detector is None:
+            return False
+        if self._change_detector.should_process(file_path):
+            # 在处理之前记录指纹，处理过程中文件发生的变化会在下一次被检测到
+            self._change_detector.record(file_path)
+            return False
+        self.log.debug("File %s has not changed, skipping", file_path)
+        # 跳过的文件也计入运行次数，保证 max_runs 的语义不变
+        self._run_count[file_path] += 1
+        if self._run_count[file_path] != self._max_runs:
+            self._file_path_schedule.push(
+                file_path, time.time() + self._process_file_interval)
+        return True
+
+    def heartbeat(self, timeout=0):
         """心跳
         
         - 处理执行完毕的处理器
         - 将任务加入队列
         - 执行队列中的进程
+
+        :param timeout: 没有处理器完成时，最多阻塞等待的秒数，默认不阻塞
         """
-        # 已完成的文件处理器
-        # :type : dict[unicode, AbstractFileProcessor]
-        finished_processors = {}
-        # 正在运行的文件处理器
+        # 阻塞等待的时间不超过下一个处理器的超时时间
+        next_timeout = self._kill_overdue_processors()
+        if next_timeout is not None:
+            timeout = min(timeout, next_timeout)
+        # 已完成的文件处理器，以及正在运行的处理器返回的部分结果
         # :type : dict[unicode, AbstractFileProcessor]
-        running_processors = {}
-
-        # 遍历所有的文件处理器
-        result = []
-        for file_path, processor in self._processors.items():
-            if processor.done:
-                self.log.info("Processor for %s finished", file_path)
-                # 获得已完成的文件处理器进程
-                finished_processors[file_path] = processor
-                # 文件处理器运行时间
-                now = timezone.system_now()
-                # 记录文件处理器的的执行时长
-                self._last_runtime[file_path] = (now -
-                                                 processor.start_time).total_seconds()
-                # 记录文件处理器的结束时间
-                self._last_finish_time[file_path] = now
-                # 记录文件被处理的次数
-                self._run_count[file_path] += 1
-                # 收集已完成处理器的执行结果
-                if processor.result is None:
-                    self.log.warning(
-                        "Processor for %s exited with return code %s.",
-                        processor.file_path, processor.exit_code
-                    )
-                else:
-                    for value in processor.result:
-                        result.append(value)
+        finished_processors, result = self._collect_finished_processors(timeout)
+        self._kill_overdue_processors()
+        result.extend(self._handle_timed_out_processors())
+
+        # 遍历已完成的文件处理器
+        for file_path, processor in finished_processors.items():
+            self.log.info("Processor for %s finished", file_path)
+            # 每一次心跳，剔除已完成的处理器
+            self._unregister_processor(file_path)
+            # 文件处理器运行时间
+            now = timezone.system_now()
+            # 记录文件处理器的的执行时长
+            self._set_last_runtime(file_path,
+                                   (now - processor.start_time).total_seconds())
+            if file_path in self._file_paths:
+                self._runtime_stats.record(file_path, self._last_runtime[file_path])
+            # 记录文件处理器的结束时间
+            self._last_finish_time[file_path] = now
+            # 记录文件被处理的次数
+            self._run_count[file_path] += 1
+            # 正常结束的文件重置连续超时的次数
+            self._timeout_count.pop(file_path, None)
+            # 收集已完成处理器尚未被取走的部分结果
+            result.extend(processor.drain_results())
+            # 收集已完成处理器的执行结果
+            if processor.result is None:
+                self.log.warning(
+                    "Processor for %s exited with return code %s.",
+                    processor.file_path, processor.exit_code
+                )
+                # 处理失败的文件下一次需要重新处理
+                if self._change_detector is not None:
+                    self._change_detector.forget(file_path)
             else:
-                # 记录正在运行的文件处理器进程
-                running_processors[file_path] = processor
-
-        # 每一次心跳，剔除已完成的处理器
-        self._processors = running_processors
+                for value in processor.result:
+                    result.append(value)
+            # 没有达到最大运行次数的文件，在间隔时间之后再次调度
+            if (file_path in self._file_paths and
+                    self._run_count[file_path] != self._max_runs):
+                self._file_path_schedule.push(
+                    file_path, time.time() + self._process_file_interval)
 
         self.log.debug("%s/%s scheduler processes running",
                        len(self._processors), self._parallelism)
 
-        self.log.debug("%s file paths queued for processing",
-                       len(self._file_path_queue))
+        # 获得已到调度时间的文件
+        files_paths_to_queue = self._enqueue_due_file_paths(time.time())
 
-        # 如果队列为空，设置需要入队的文件
+        # 如果没有需要处理的文件，休眠一段时间，防止频繁的处理文件
         if not self._file_path_queue:
-            # 可能存在正在运行的文件处理器进程尚未执行完成
-            # 在下一次心跳处理
-            file_paths_in_progress = self._processors.keys()
-
-            # 记录下尚未到调度时间的文件
-            file_paths_recently_processed = []
+            # 获得所有文件中最长的等待时间，即最早到期的文件距离上一次完成的时长
             longest_parse_duration = 0
-            now = timezone.system_now()
-
-            # 遍历需要处理的文件列表
-            for file_path in self._file_paths:
-                # 获得文件处理器上一次执行完成的时间
-                last_finish_time = self.get_last_finish_time(file_path)
-                # 如果文件曾经处理过
-                if last_finish_time is not None:
-                    duration = now - last_finish_time
-                    # 如果文件尚未到调度时间，则记录在指定数组中
-                    if duration.total_seconds() < self._process_file_interval:
-                        file_paths_recently_processed.append(file_path)
-                    # 获得所有文件中最长的等待时间
-                    longest_parse_duration = max(duration.total_seconds(),
-                                                 longest_parse_duration)
+            if self._file_path_schedule:
+                _, due_time = self._file_path_schedule.peek()
+                longest_parse_duration = max(
+                    time.time() - (due_time - self._process_file_interval), 0)
 
             # 获得每次心跳的休眠时间
             sleep_length = max(self._min_file_parsing_loop_time - longest_parse_duration,
@@ -440,49 +1260,50 @@ class FileProcessorManager(LoggingMixin):
                                sleep_length)
                 time.sleep(sleep_length)
 
-            # 获得处理器已经执行完成的文件列表，且这些文件的执行次数已经达到了最大阈值
-            files_paths_at_run_limit = [file_path
-                                        for file_path, num_runs in self._run_count.items()
-                                        if num_runs == self._max_runs]
-
-            # 获得需要入队的文件，新增的文件在此入库
-            # 去掉正在运行的文件
-            # 去掉最近需要运行的文件
-            # 去掉运行次数已经达到阈值的文件
-            files_paths_to_queue = list(set(self._file_paths) -
-                                        set(file_paths_in_progress) -
-                                        set(file_paths_recently_processed) -
-                                        set(files_paths_at_run_limit))
-
-            # 遍历正在运行的处理器进程
-            for file_path, processor in self._processors.items():
-                self.log.debug(
-                    "File path %s is still being processed (started: %s)",
-                    processor.file_path, processor.start_time.isoformat()
-                )
+        if files_paths_to_queue:
             self.log.debug(
                 "Queuing the following files for processing:\n\t%s",
                 "\n\t".join(files_paths_to_queue)
             )
 
-            # 将任务加入队列
-            self._file_path_queue.extend(files_paths_to_queue)
+        self.log.debug("%s file paths queued for processing",
+                       len(self._file_path_queue))
+
+        # 根据系统资源和文件的执行时长调整并发度
+        if self._parallelism_controller is not None:
+            self._parallelism = self._parallelism_controller.adjust(
+                self._parallelism,
+                len(self._file_path_queue),
+                self._total_runtime(),
+                max(self._process_file_interval, self._min_file_parsing_loop_time))
 
         # 处理器并发性阈值验证
         while (self._parallelism - len(self._processors) > 0 and
                self._file_path_queue):
-            # 从队列中出队一个文件
-            file_path = self._file_path_queue.pop(0)
+            # 从队列中出队一个优先级最高的文件
+            file_path, _ = self._file_path_queue.pop()
+            if self._skip_unchanged_file(file_path):
+                continue
             # 创建文件处理器子进程
             processor = self._processor_factory(file_path)
             # 启动文件处理器子进程
             processor.start()
-            self.log.info(
-                "Started a process (PID: %s) to generate tasks for %s",
-                processor.pid, file_path
-            )
+            if processor.pid is None:
+                # 进程池中没有空闲的工作进程，等待分配
+                self.log.info("Queued %s for processing", file_path)
+            else:
+                self.log.info(
+                    "Started a process (PID: %s) to generate tasks for %s",
+                    processor.pid, file_path
+                )
             # 记录文件子进程
-            self._processors[file_path] = processor
+            self._register_processor(file_path, processor)
+
+        # 定期发送文件执行时长的统计值
+        if time.time() - self._last_stats_time >= self._stats_interval:
+            self._runtime_stats.emit(self._stats_client,
+                                     base_directory=self._file_directory)
+            self._last_stats_time = time.time()
 
         # 记录心跳的次数
         self._run_count[self._heart_beat_key] += 1
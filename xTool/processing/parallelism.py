@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import math
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from xTool.stats.stats_logger import DummyStatsLogger
+from xTool.utils.log.logging_mixin import LoggingMixin
+from xTool.exceptions import XToolException
+
+
+# 一次并发度调整的决策
+# reason: 'memory' 内存不足, 'load' 系统负载过高, 'backlog' 有积压的文件,
+#         'idle' 并发度超过了需求, 'cooldown' 距离上一次调整的时间太短, 'steady' 保持不变
+ParallelismDecision = namedtuple(
+    'ParallelismDecision',
+    ['parallelism', 'reason', 'load_per_cpu', 'memory_percent', 'demand'])
+
+
+class ParallelismController(LoggingMixin):
+    """文件处理器的自适应并发度控制器
+
+    在每次心跳时根据系统负载、内存使用率和文件的历史执行时长，
+    在 [min_parallelism, max_parallelism] 之间调整并发度，每次最多调整 step
+
+    - 内存使用率超过 max_memory_percent，或每个CPU的负载超过 max_load_per_cpu 时降低并发度
+    - 有积压的文件，且并发度小于需求时提高并发度
+    - 没有积压的文件，且并发度大于需求时降低并发度
+
+    需求是在调度间隔内处理完所有文件需要的处理器数量，即 sum(执行时长) / 调度间隔
+
+    系统负载是最近1分钟的平均值，调整并发度之后需要一段时间才能反映出来，
+    所以两次调整之间至少间隔 cooldown 秒，防止并发度来回振荡；内存不足时不受此限制
+
+    :param min_parallelism: 最小并发度
+    :param max_parallelism: 最大并发度，默认是CPU的数量
+    :param max_load_per_cpu: 每个CPU的平均负载上限
+    :param max_memory_percent: 内存使用率上限
+    :param step: 每次心跳的最大调整幅度
+    :param cooldown: 两次调整之间的最小间隔，单位是秒
+    :param stats_client: 统计客户端，每次决策都会发送指标
+    :param stats_prefix: 指标名称的前缀
+    """
+
+    def __init__(self,
+                 min_parallelism=1,
+                 max_parallelism=None,
+                 max_load_per_cpu=1.0,
+                 max_memory_percent=80,
+                 step=1,
+                 cooldown=10,
+                 stats_client=None,
+                 stats_prefix='file_processor'):
+        if max_parallelism is None:
+            max_parallelism = multiprocessing.cpu_count()
+        if min_parallelism < 1 or max_parallelism < min_parallelism:
+            raise XToolException(
+                "Invalid parallelism range [{}, {}]".format(
+                    min_parallelism, max_parallelism))
+        self.min_parallelism = min_parallelism
+        self.max_parallelism = max_parallelism
+        self.max_load_per_cpu = max_load_per_cpu
+        self.max_memory_percent = max_memory_percent
+        self.step = step
+        self.cooldown = cooldown
+        # 上一次调整并发度的时间
+        self._last_adjust_time = None
+        self._stats_client = stats_client or DummyStatsLogger
+        self._stats_prefix = stats_prefix
+        self._cpu_count = multiprocessing.cpu_count()
+        # 最近一次的决策
+        # :type : ParallelismDecision
+        self.last_decision = None
+
+    def load_per_cpu(self):
+        """获得每个CPU最近1分钟的平均负载，不支持的平台返回None ."""
+        try:
+            return os.getloadavg()[0] / self._cpu_count
+        except (AttributeError, OSError):
+            return None
+
+    def memory_percent(self):
+        """获得内存使用率，没有安装psutil时返回None ."""
+        if psutil is None:
+            return None
+        return psutil.virtual_memory().percent
+
+    def clamp(self, parallelism):
+        """将并发度限制在 [min_parallelism, max_parallelism] 之间 ."""
+        return max(self.min_parallelism, min(self.max_parallelism, parallelism))
+
+    @staticmethod
+    def estimate_demand(total_runtime, interval):
+        """估算在调度间隔内处理完所有文件需要的处理器数量
+
+        :param total_runtime: 所有文件最近一次执行时长的总和，None 表示没有历史执行时长
+        :param interval: 调度间隔，单位是秒
+        :return: 没有历史执行时长时返回None
+        """
+        if total_runtime is None:
+            return None
+        return int(math.ceil(total_runtime / max(interval, 1e-3)))
+
+    def adjust(self, parallelism, backlog, total_runtime, interval):
+        """计算新的并发度
+
+        :param parallelism: 当前的并发度
+        :param backlog: 已到调度时间但是还没有处理器的文件数量
+        :param total_runtime: 所有文件最近一次执行时长的总和，None 表示没有历史执行时长
+        :param interval: 调度间隔，单位是秒
+        :rtype: int
+        """
+        load_per_cpu = self.load_per_cpu()
+        memory_percent = self.memory_percent()
+        demand = self.estimate_demand(total_runtime, interval)
+        now = time.time()
+
+        if memory_percent is not None and memory_percent > self.max_memory_percent:
+            new_parallelism, reason = parallelism - self.step, 'memory'
+        elif load_per_cpu is not None and load_per_cpu > self.max_load_per_cpu:
+            new_parallelism, reason = parallelism - self.step, 'load'
+        elif backlog > 0 and (demand is None or parallelism < demand):
+            new_parallelism, reason = parallelism + min(self.step, backlog), 'backlog'
+        elif backlog == 0 and demand is not None and parallelism > demand:
+            new_parallelism, reason = max(parallelism - self.step, demand), 'idle'
+        else:
+            new_parallelism, reason = parallelism, 'steady'
+        new_parallelism = self.clamp(new_parallelism)
+        if new_parallelism == parallelism:
+            reason = 'steady'
+        elif (reason != 'memory' and self._last_adjust_time is not None and
+                now - self._last_adjust_time < self.cooldown):
+            # 上一次调整的效果还没有反映到系统负载中
+            new_parallelism, reason = parallelism, 'cooldown'
+        else:
+            self._last_adjust_time = now
+
+        self.last_decision = ParallelismDecision(
+            new_parallelism, reason, load_per_cpu, memory_percent, demand)
+        self._emit(self.last_decision)
+        if new_parallelism != parallelism:
+            self.log.info("Adjusting parallelism from %s to %s (%s)",
+                          parallelism, new_parallelism, reason)
+        return new_parallelism
+
+    def _emit(self, decision):
+        """发送决策的指标 ."""
+        prefix = self._stats_prefix
+        self._stats_client.gauge(prefix + '.parallelism', decision.parallelism)
+        self._stats_client.incr('{}.parallelism_decision.{}'.format(
+            prefix, decision.reason))
+        if decision.load_per_cpu is not None:
+            self._stats_client.gauge(prefix + '.load_per_cpu', decision.load_per_cpu)
+        if decision.memory_percent is not None:
+            self._stats_client.gauge(prefix + '.memory_percent',
+                                     decision.memory_percent)
+        if decision.demand is not None:
+            self._stats_client.gauge(prefix + '.parallelism_demand', decision.demand)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import math
+import os
+import re
+from array import array
+
+from xTool.stats.stats_logger import DummyStatsLogger
+
+
+class _RuntimeWindow(object):
+    """单个文件最近 window 次执行时长的环形缓冲区 ."""
+
+    __slots__ = ('samples', 'next_index', 'size', 'runs')
+
+    def __init__(self, window):
+        # 使用 array 存储浮点数，每个样本只占用8个字节
+        self.samples = array(str('d'), [0.0]) * window
+        # 下一个样本写入的位置
+        self.next_index = 0
+        # 缓冲区中的样本数量
+        self.size = 0
+        # 累计执行次数
+        self.runs = 0
+
+    def add(self, runtime):
+        self.samples[self.next_index] = runtime
+        self.next_index = (self.next_index + 1) % len(self.samples)
+        self.size = min(self.size + 1, len(self.samples))
+        self.runs += 1
+
+    def values(self):
+        return self.samples[:self.size]
+
+
+def _percentile(sorted_values, percent):
+    """使用 nearest-rank 方法计算百分位数 ."""
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+class FileRuntimeStats(object):
+    """文件执行时长的滚动统计
+
+    每个文件保留最近 window 次的执行时长，统计值包括
+    - count: 窗口内的样本数量
+    - runs: 累计执行次数
+    - mean, p50, p95, p99, max: 窗口内执行时长的统计值，单位是秒
+
+    :param window: 每个文件保留的样本数量
+    :type window: int
+    """
+
+    def __init__(self, window=100):
+        if window < 1:
+            raise ValueError("window must be positive")
+        self._window = window
+        # 文件路径 => 执行时长的环形缓冲区
+        # :type : dict[unicode, _RuntimeWindow]
+        self._runtimes = {}
+
+    def __len__(self):
+        return len(self._runtimes)
+
+    def __contains__(self, file_path):
+        return file_path in self._runtimes
+
+    def record(self, file_path, runtime):
+        """记录文件的一次执行时长 ."""
+        runtime_window = self._runtimes.get(file_path)
+        if runtime_window is None:
+            runtime_window = self._runtimes[file_path] = _RuntimeWindow(self._window)
+        runtime_window.add(runtime)
+
+    def forget(self, file_path):
+        """删除文件的统计数据 ."""
+        self._runtimes.pop(file_path, None)
+
+    def file_stats(self, file_path):
+        """获得单个文件的统计值，没有数据时返回None ."""
+        runtime_window = self._runtimes.get(file_path)
+        if runtime_window is None or not runtime_window.size:
+            return None
+        values = sorted(runtime_window.values())
+        return {
+            'count': len(values),
+            'runs': runtime_window.runs,
+            'mean': sum(values) / len(values),
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'p99': _percentile(values, 99),
+            'max': values[-1],
+        }
+
+    def stats(self):
+        """获得所有文件的统计值
+
+        :rtype: dict[unicode, dict]
+        """
+        return dict((file_path, self.file_stats(file_path))
+                    for file_path in self._runtimes)
+
+    def slowest(self, n=10, key='mean'):
+        """获得执行时长最长的n个文件
+
+        :param key: 排序使用的统计值，例如 mean, p95, max
+        :return: [(文件路径, 统计值)]，按执行时长降序排列
+        """
+        all_stats = self.stats()
+        return sorted(all_stats.items(),
+                      key=lambda item: item[1][key],
+                      reverse=True)[:n]
+
+    def emit(self, stats_client=None, prefix='file_processor', n=10,
+             base_directory=None):
+        """将统计值发送给统计客户端
+
+        发送所有文件平均执行时长的总和，即处理一遍所有文件的时间，
+        以及最慢的n个文件的 mean, p95, max
+
+        :param base_directory: 文件的根目录，指标名称使用文件相对于根目录的路径
+        """
+        stats_client = stats_client or DummyStatsLogger
+        all_stats = self.stats()
+        stats_client.gauge(prefix + '.runtime.files', len(all_stats))
+        stats_client.gauge(prefix + '.runtime.total_mean',
+                           sum(s['mean'] for s in all_stats.values()))
+        for file_path, file_stats in self.slowest(n):
+            name = _stat_name(file_path, base_directory)
+            for field in ('mean', 'p95', 'max'):
+                stats_client.gauge('{}.runtime.{}.{}'.format(prefix, name, field),
+                                   file_stats[field])
+
+
+def _stat_name(file_path, base_directory=None):
+    """将文件路径转换为合法的指标名称
+
+    使用去掉扩展名的相对路径，目录之间用 . 分隔，不同目录下的同名文件不会使用相同的指标，
+    例如 a/dag.py => a.dag
+    """
+    if base_directory:
+        file_path = os.path.relpath(file_path, base_directory)
+    path = os.path.splitext(os.path.normpath(file_path))[0]
+    parts = [part for part in re.split(r'[\\/]+', path) if part]
+    return '.'.join(re.sub(r'[^0-9A-Za-z_-]', '_', part) for part in parts)
@@ -20,6 +20,12 @@ from abc import ABCMeta, abstractmethod
 from collections import defaultdict
 
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
 
 
 from xTool.utils.log.logging_mixin import LoggingMixin
@@ -91,7 +97,125 @@ def rm_f(path):
             raise
 
 
-def list_py_file_paths(directory, followlinks=True, ignore_filename='.ignore', file_ext='.py', safe_mode=False, safe_filters=(b'xTool', b'XTool')):
+def read_ignore_patterns(ignore_file_path):
+    """读取忽略文件中的正则表达式 ."""
+    with open(ignore_file_path, 'r') as f:
+        return [p.strip() for p in f.read().split('\n') if p]
+
+
+def compile_ignore_patterns(patterns):
+    """将多个忽略规则编译为一个正则表达式，无效的规则会被忽略
+
+    :return: 编译后的正则表达式，没有规则时返回None
+    """
+    valid_patterns = []
+    for pattern in patterns:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            LoggingMixin().log.warning("Invalid ignore pattern %r: %s", pattern, e)
+            continue
+        valid_patterns.append(pattern)
+    if not valid_patterns:
+        return None
+    return re.compile('|'.join('(?:{})'.format(p) for p in valid_patterns))
+
+
+def _check_file(file_path, file_ext, ignore_regex, safe_mode, safe_filters,
+                safe_mode_max_bytes, check_io=True):
+    """判断已知是文件的路径是否满足匹配规则
+
+    :param check_io: 为False时只执行不需要读文件的检查，需要读文件才能判断时返回None
+    """
+    # 验证文件后缀
+    mod_name, file_extension = os.path.splitext(
+        os.path.split(file_path)[-1])
+    # 验证忽略规则，在打开文件之前先执行开销较小的检查
+    if ignore_regex is not None and ignore_regex.search(file_path):
+        return False
+    is_zip = False
+    if file_extension != file_ext:
+        if not check_io:
+            return None
+        if not zipfile.is_zipfile(file_path):
+            return False
+        is_zip = True
+
+    # 使用启发式方式猜测是否是一个DAG文件，DAG文件需要包含DAG 或 airflow
+    # Heuristic that guesses whether a Python file contains an
+    # Airflow DAG definition.
+    if safe_mode and not is_zip:
+        if not check_io:
+            return None
+        with open(file_path, 'rb') as f:
+            if safe_mode_max_bytes is None:
+                content = f.read()
+            else:
+                content = f.read(safe_mode_max_bytes)
+            return all([s in content for s in safe_filters])
+    return True
+
+
+def might_contain_file(file_path, file_ext='.py', ignore_regex=None, safe_mode=False,
+                       safe_filters=(b'xTool', b'XTool'), safe_mode_max_bytes=None):
+    """判断文件是否满足 list_py_file_paths 的匹配规则
+
+    :param file_path: 文件的路径
+    :param ignore_regex: 编译后的忽略规则，匹配的文件被忽略
+    :param safe_mode_max_bytes: safe_mode 时最多读取文件的字节数，None 表示读取整个文件
+    :rtype: bool
+    """
+    if not os.path.isfile(file_path):
+        return False
+    return _check_file(file_path, file_ext, ignore_regex, safe_mode, safe_filters,
+                       safe_mode_max_bytes)
+
+
+def walk_file_entries(directory, followlinks=True, ignore_filename='.ignore', patterns=()):
+    """使用 os.scandir 递归遍历目录，遍历顺序与 os.walk 相同
+
+    每个目录的忽略规则作用于该目录及其子目录，被忽略的子目录不会被遍历
+
+    :param patterns: 从上级目录继承的忽略规则
+    :return: 生成器，每个元素是 (目录, 目录下的文件 DirEntry 列表, 忽略规则, 编译后的忽略规则)
+    """
+    # 栈中的元素是 (目录, 从父目录继承的忽略规则)
+    stack = [(directory, list(patterns))]
+    while stack:
+        root, patterns = stack.pop()
+        try:
+            entries = list(scandir(root))
+        except OSError as e:
+            LoggingMixin().log.warning("Failed to list %s: %s", root, e)
+            continue
+        dir_entries = []
+        file_entries = []
+        for entry in entries:
+            try:
+                # DirEntry 缓存了文件类型，不需要额外的 stat 调用
+                if entry.is_dir():
+                    if followlinks or not entry.is_symlink():
+                        dir_entries.append(entry)
+                elif entry.is_file():
+                    file_entries.append(entry)
+            except OSError:
+                continue
+        for entry in file_entries:
+            if entry.name == ignore_filename:
+                patterns = patterns + read_ignore_patterns(entry.path)
+                break
+        ignore_regex = compile_ignore_patterns(patterns)
+        yield root, file_entries, patterns, ignore_regex
+        # 在遍历之前剪枝被忽略的子目录
+        sub_directories = [entry.path for entry in dir_entries
+                           if ignore_regex is None or
+                           not ignore_regex.search(entry.path)]
+        for sub_directory in reversed(sub_directories):
+            stack.append((sub_directory, patterns))
+
+
+def list_py_file_paths(directory, followlinks=True, ignore_filename='.ignore', file_ext='.py', safe_mode=False, safe_filters=(b'xTool', b'XTool'),
+                       safe_mode_max_bytes=None, max_workers=None):
     """递归遍历目录，返回匹配规则的文件列表
     Traverse a directory and look for Python files.
 
@@ -99,57 +223,51 @@ def list_py_file_paths(directory, followlinks=True, ignore_filename='.ignore', f
     :type directory: unicode
     :param safe_mode: whether to use a heuristic to determine whether a file
     contains Airflow DAG definitions
+    :param safe_mode_max_bytes: safe_mode 时最多读取文件的字节数，None 表示读取整个文件
+    :param max_workers: 大于1时使用线程池并发执行需要读文件的检查
     :return: a list of paths to Python files in the specified directory
     :rtype: list[unicode]
     """
-    file_paths = []
     if directory is None:
         return []
     elif os.path.isfile(directory):
         return [directory]
-    elif os.path.isdir(directory):
-        patterns = []
-        # 递归遍历目录，包含链接文件
-        for root, dirs, files in os.walk(directory, followlinks=followlinks):
-            # 获得需要忽略的文件
-            ignore_file = [f for f in files if f == ignore_filename]
-            if ignore_file:
-                f = open(os.path.join(root, ignore_file[0]), 'r')
-                patterns += [p.strip() for p in f.read().split('\n') if p]
-                f.close()
-            for f in files:
-                try:
-                    # 获得文件的绝对路径
-                    file_path = os.path.join(root, f)
-                    if not os.path.isfile(file_path):
-                        continue
-                    # 验证文件后缀
-                    mod_name, file_extension = os.path.splitext(
-                        os.path.split(file_path)[-1])
-                    if file_extension != file_ext and not zipfile.is_zipfile(file_path):
-                        continue
-                    # 验证忽略规则
-                    if any([re.findall(p, file_path) for p in patterns]):
-                        continue
-
-                    # 使用启发式方式猜测是否是一个DAG文件，DAG文件需要包含DAG 或 airflow
-                    # Heuristic that guesses whether a Python file contains an
-                    # Airflow DAG definition.
-                    might_contain_dag = True
-                    if safe_mode and not zipfile.is_zipfile(file_path):
-                        with open(file_path, 'rb') as f:
-                            content = f.read()
-                            might_contain_dag = all(
-                                [s in content for s in safe_filters])
-
-                    if not might_contain_dag:
-                        continue
-
-                    file_paths.append(file_path)
-                except Exception:
-                    log = LoggingMixin().log
-                    log.exception("Error while examining %s", f)
-    return file_paths
+    elif not os.path.isdir(directory):
+        return []
+
+    log = LoggingMixin().log
+
+    def check(file_path, ignore_regex, check_io=True):
+        try:
+            return _check_file(file_path, file_ext, ignore_regex, safe_mode,
+                               safe_filters, safe_mode_max_bytes, check_io)
+        except Exception:
+            log.exception("Error while examining %s", file_path)
+            return False
+
+    # 先执行不需要读文件的检查，需要读文件的检查可以并发执行
+    results = []
+    io_checks = []
+    for root, file_entries, _, ignore_regex in walk_file_entries(
+            directory, followlinks, ignore_filename):
+        for entry in file_entries:
+            matched = check(entry.path, ignore_regex, check_io=False)
+            if matched is None:
+                io_checks.append((len(results), entry.path, ignore_regex))
+            results.append((entry.path, matched))
+
+    if io_checks:
+        if max_workers and max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                matches = list(executor.map(lambda args: check(args[1], args[2]),
+                                            io_checks))
+        else:
+            matches = [check(file_path, ignore_regex)
+                       for _, file_path, ignore_regex in io_checks]
+        for (index, file_path, _), matched in zip(io_checks, matches):
+            results[index] = (file_path, matched)
+
+    return [file_path for file_path, matched in results if matched]
 
 
 def ensure_file_exists(filename):
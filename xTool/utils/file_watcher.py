@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+"""
+目录监控
+
+基于 Linux inotify 增量维护目录下满足 list_py_file_paths 规则的文件集合，
+每次刷新的开销与变化的文件数量成正比，而不是与目录下的文件总数成正比。
+不支持 inotify 的平台退化为全量扫描并比较差异。
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+
+from xTool.utils.file import list_py_file_paths
+from xTool.utils.file import might_contain_file
+from xTool.utils.file import walk_file_entries
+from xTool.utils.log.logging_mixin import LoggingMixin
+
+
+# inotify 事件类型，参考 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+# 需要监听的事件
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct(str('iIII'))
+
+
+class Inotify(object):
+    """inotify 系统调用的封装 ."""
+
+    # 每次读取事件的缓冲区大小
+    read_size = 64 * 1024
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, "libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        # 非阻塞模式，没有事件时 read 立即返回
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        """监听目录，返回监听描述符 ."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd):
+        """取消监听，目录已经被删除时忽略错误 ."""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """读取所有就绪的事件，返回 [(wd, mask, name)] ."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, self.read_size)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class DirectoryWatcher(LoggingMixin):
+    """增量维护目录下匹配规则的文件集合
+
+    参数与 list_py_file_paths 相同，poll() 返回自上一次调用后新增和删除的文件，
+    sync() 将变化同步给 FileProcessorManager
+
+    watcher = DirectoryWatcher(directory)
+    manager = FileProcessorManager(directory, sorted(watcher.file_paths), ...)
+    while True:
+        watcher.sync(manager)
+        manager.heartbeat()
+
+    :param use_inotify: 是否使用 inotify，不可用时退化为全量扫描
+    :type use_inotify: bool
+    """
+
+    def __init__(self,
+                 directory,
+                 followlinks=True,
+                 ignore_filename='.ignore',
+                 file_ext='.py',
+                 safe_mode=False,
+                 safe_filters=(b'xTool', b'XTool'),
+                 use_inotify=True):
+        self._directory = directory
+        self._followlinks = followlinks
+        self._ignore_filename = ignore_filename
+        self._file_ext = file_ext
+        self._safe_mode = safe_mode
+        self._safe_filters = safe_filters
+        # 当前匹配规则的文件集合
+        self._file_paths = set()
+        # 目录 => (忽略规则, 编译后的忽略规则)
+        self._dir_patterns = {}
+        # 监听描述符 => 目录
+        self._watches = {}
+        # 目录 => 监听描述符
+        self._watched_dirs = {}
+        self._inotify = None
+        if use_inotify and os.path.isdir(directory):
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                self.log.warning("inotify is not available, falling back to "
+                                 "polling: %s", e)
+        self._rescan()
+
+    @property
+    def file_paths(self):
+        """当前匹配规则的文件集合，调用方不能修改 ."""
+        return self._file_paths
+
+    @property
+    def using_inotify(self):
+        """是否使用 inotify 监听目录 ."""
+        return self._inotify is not None
+
+    def fileno(self):
+        """inotify 的文件描述符，有事件时可读，可用于 select ."""
+        if self._inotify is None:
+            return None
+        return self._inotify.fileno()
+
+    def _watch(self, directory):
+        """监听目录 ."""
+        if self._inotify is None or directory in self._watched_dirs:
+            return
+        try:
+            wd = self._inotify.add_watch(directory)
+        except OSError as e:
+            self.log.warning("Failed to watch %s: %s", directory, e)
+            return
+        self._watches[wd] = directory
+        self._watched_dirs[directory] = wd
+
+    def _unwatch(self, directory):
+        """取消监听目录及其子目录 ."""
+        prefix = directory + os.sep
+        for patterns_dir in list(self._dir_patterns):
+            if patterns_dir == directory or patterns_dir.startswith(prefix):
+                del self._dir_patterns[patterns_dir]
+        for watched_dir in list(self._watched_dirs):
+            if watched_dir == directory or watched_dir.startswith(prefix):
+                wd = self._watched_dirs.pop(watched_dir)
+                self._watches.pop(wd, None)
+                self._inotify.rm_watch(wd)
+
+    def _walk(self, directory, patterns=()):
+        """遍历目录，监听所有未被忽略的子目录，返回匹配规则的文件 ."""
+        file_paths = []
+        # 先监听目录再遍历文件，遍历过程中新增的文件也会产生事件
+        for root, file_entries, root_patterns, ignore_regex in walk_file_entries(
+                directory, self._followlinks, self._ignore_filename, patterns):
+            self._watch(root)
+            self._dir_patterns[root] = (root_patterns, ignore_regex)
+            for entry in file_entries:
+                if self._matches(entry.path, ignore_regex):
+                    file_paths.append(entry.path)
+        return file_paths
+
+    def _matches(self, file_path, ignore_regex=None):
+        """判断文件是否满足匹配规则 ."""
+        if ignore_regex is None:
+            _, ignore_regex = self._dir_patterns.get(
+                os.path.dirname(file_path), ((), None))
+        try:
+            return might_contain_file(file_path, self._file_ext, ignore_regex,
+                                      self._safe_mode, self._safe_filters)
+        except Exception:
+            self.log.exception("Error while examining %s", file_path)
+            return False
+
+    def _rescan(self):
+        """全量扫描目录，返回 (新增的文件, 删除的文件) ."""
+        self._dir_patterns = {}
+        if self._inotify is not None:
+            file_paths = set(self._walk(self._directory))
+        else:
+            file_paths = set(list_py_file_paths(
+                self._directory,
+                followlinks=self._followlinks,
+                ignore_filename=self._ignore_filename,
+                file_ext=self._file_ext,
+                safe_mode=self._safe_mode,
+                safe_filters=self._safe_filters))
+        added = file_paths - self._file_paths
+        removed = self._file_paths - file_paths
+        self._file_paths = file_paths
+        return added, removed
+
+    def poll(self):
+        """获得自上一次调用后 (新增的文件集合, 删除的文件集合) ."""
+        if self._inotify is None:
+            return self._rescan()
+
+        # 记录发生变化的文件在本次调用之前是否存在
+        changes = {}
+
+        def update(file_path, present):
+            changes.setdefault(file_path, file_path in self._file_paths)
+            if present:
+                self._file_paths.add(file_path)
+            else:
+                self._file_paths.discard(file_path)
+
+        def remove_directory(directory):
+            prefix = directory + os.sep
+            for file_path in [f for f in self._file_paths if f.startswith(prefix)]:
+                update(file_path, False)
+            self._unwatch(directory)
+
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，丢失了部分事件，需要全量扫描
+                self.log.warning("inotify event queue overflowed, rescanning %s",
+                                 self._directory)
+                return self._rescan_with_changes(changes)
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                self._watched_dirs.pop(directory, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                remove_directory(directory)
+                continue
+            path = os.path.join(directory, name)
+            if name == self._ignore_filename:
+                # 忽略规则发生变化，需要全量扫描
+                return self._rescan_with_changes(changes)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    patterns, ignore_regex = self._dir_patterns.get(
+                        directory, ((), None))
+                    # 被忽略的子目录不需要监听
+                    if ignore_regex is not None and ignore_regex.search(path):
+                        continue
+                    for file_path in self._walk(path, patterns):
+                        update(file_path, True)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    remove_directory(path)
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                update(path, False)
+            elif mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE):
+                # 文件内容的变化可能影响 safe_mode 的判断结果
+                update(path, self._matches(path))
+
+        added = set(f for f, existed in changes.items()
+                    if not existed and f in self._file_paths)
+        removed = set(f for f, existed in changes.items()
+                      if existed and f not in self._file_paths)
+        return added, removed
+
+    def _rescan_with_changes(self, changes):
+        """全量扫描，并合并本次调用中已经处理的变化 ."""
+        # 丢弃尚未读取的事件，全量扫描会包含这些变化
+        self._inotify.read_events()
+        before = set(self._file_paths)
+        for file_path, existed in changes.items():
+            if existed:
+                before.add(file_path)
+            else:
+                before.discard(file_path)
+        self._rescan()
+        return self._file_paths - before, before - self._file_paths
+
+    def sync(self, manager):
+        """将文件的变化同步给文件处理器管理器 .
+
+        :type manager: xTool.processing.file_processing.FileProcessorManager
+        """
+        added, removed = self.poll()
+        if removed:
+            manager.remove_file_paths(removed)
+        if added:
+            manager.add_file_paths(sorted(added))
+        return added, removed
+
+    def close(self):
+        """关闭 inotify ."""
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+            self._watches = {}
+            self._watched_dirs = {}
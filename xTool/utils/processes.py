@@ -1,6 +1,9 @@
 #coding: utf-8
 
 import os
+import sys
+import time
+from collections import namedtuple
 try:
     import pwd
     import grp
@@ -62,3 +65,37 @@ def which(name, path=None):
         executable_path = os.path.join(bin_dir, name)
         if os.access(executable_path, os.X_OK):
             yield executable_path
+
+
+# 子进程的资源使用情况
+# wall_time: 执行时长，单位是秒
+# user_time, system_time: 用户态和内核态CPU时间，单位是秒
+# max_rss: 最大常驻内存，单位是字节
+# exit_code: 返回码，被信号杀死时是负的信号值
+# exit_signal: 杀死进程的信号，正常退出时是None
+ResourceUsage = namedtuple(
+    'ResourceUsage',
+    ['wall_time', 'user_time', 'system_time', 'max_rss', 'exit_code', 'exit_signal'])
+
+
+def wait_for_pid(pid, start_time=None):
+    """使用 os.wait4 等待子进程结束，并获得子进程的资源使用情况
+
+    :param pid: 子进程ID
+    :param start_time: 子进程的启动时间 time.time()，用于计算执行时长
+    :rtype: ResourceUsage
+    """
+    _, status, rusage = os.wait4(pid, 0)
+    wall_time = time.time() - start_time if start_time is not None else None
+    if os.WIFSIGNALED(status):
+        exit_signal = os.WTERMSIG(status)
+        exit_code = -exit_signal
+    else:
+        exit_signal = None
+        exit_code = os.WEXITSTATUS(status)
+    # Linux 下 ru_maxrss 的单位是KB，macOS 下是字节
+    max_rss = rusage.ru_maxrss
+    if sys.platform != 'darwin':
+        max_rss *= 1024
+    return ResourceUsage(wall_time, rusage.ru_utime, rusage.ru_stime, max_rss,
+                         exit_code, exit_signal)